@@ -2,16 +2,41 @@ from flask import Flask, request, jsonify, render_template, session, g, abort, r
 from werkzeug.security import generate_password_hash
 import sqlite3
 import os
+import sys
 import logging
 from datetime import datetime
 import functools
+import time
+import statistics
+import tempfile
+import shutil
+import click
 
 # Import helpers
-from db_helpers import get_db, close_db
+from db_helpers import get_db, get_read_db, close_db, pool_stats
 from auth_helpers import login_required, admin_required
 from config import config
+from migrations import run_migrations, find_full_scans
+import trace_helpers
+from settings_helpers import settings_cache, get_user_theme
+from backup_helpers import backup_manager
+from media_tasks import scan_tasks
+from watch_helpers import media_watcher
+from dlna_helpers import dlna_server
+from transcode_helpers import transcode_queue, transcode_cache, live_transcoder
+from hls_helpers import hls_manager
+from prefetch_helpers import playlist_prefetcher, PlaylistPrefetcher
+from cache_helpers import source_fingerprint
+from thumbnail_helpers import thumbnail_store, create_synthetic_photos, scale_image_native, scale_image_convert
+from counter_helpers import counter_buffer, play_sessions
 from routes.media_center import media_center_bp
-from media_helpers import init_dlna_server
+from media_helpers import discover_media_files, get_media_formats, ffprobe_media, create_scan_executor
+from audio_helpers import read_audio_info
+from search_helpers import rebuild_media_search, search_media, create_synthetic_library, MEDIA_SEARCH_TYPES
+
+# Rozmiar strony list w panelu administratora
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 200
 
 # Inicjalizacja aplikacji
 app = Flask(__name__, static_folder='static', template_folder='templates')
@@ -33,13 +58,42 @@ if not app.debug:
 # Rejestracja funkcji zamykającej bazę danych
 app.teardown_appcontext(close_db)
 
+# Bufor liczników dostępu/odtworzeń zapisywanych partiami
+counter_buffer.init_app(app)
+play_sessions.init_app(app)
+
+# Pamięć podręczna ustawień użytkowników
+settings_cache.init_app(app)
+
+# Kopie zapasowe bazy danych
+backup_manager.init_app(app)
+
+# Zadania skanowania mediów w tle
+scan_tasks.init_app(app)
+media_watcher.init_app(app)
+
+# Magazyn miniatur mediów
+thumbnail_store.init_app(app)
+
+# Kolejka transkodowania i strumieniowanie HLS
+transcode_queue.init_app(app)
+transcode_cache.init_app(app)
+live_transcoder.init_app(app)
+hls_manager.init_app(app)
+playlist_prefetcher.init_app(app)
+
+# Wbudowany serwer multimediów DLNA/UPnP (katalog z media_items)
+dlna_server.init_app(app)
+
+# Śledzenie zapytań SQL w żądaniach (nagłówek Server-Timing, wykrywanie N+1)
+trace_helpers.init_app(app)
+
 # Inicjalizacja bazy danych
 def init_db():
     with app.app_context():
         db = get_db()
-        with app.open_resource('schema.sql', mode='r') as f:
-            db.cursor().executescript(f.read())
-        db.commit()
+        # Migracje schematu (wersja zapisana w PRAGMA user_version)
+        run_migrations(db, app.logger)
         
         # Sprawdzenie czy istnieje użytkownik admin
         admin = db.execute('SELECT id FROM users WHERE username = ?', ('admin',)).fetchone()
@@ -60,6 +114,222 @@ def init_db_command():
     init_db()
     print('Baza danych została zainicjalizowana.')
 
+# Komenda do wykonania kopii zapasowej bazy danych (w trakcie pracy aplikacji)
+@app.cli.command('backup-db')
+def backup_db_command():
+    record = backup_manager.run(verify_in_background=False)
+    if record['status'] != 'completed':
+        print(f"Błąd kopii zapasowej: {record.get('error')}")
+        raise SystemExit(1)
+    print(f"Kopia zapisana: {record['path']}")
+    print(f"Skopiowano {record['bytes']} bajtów w {record['duration_ms']} ms "
+          f"({record['steps']} kroków, najdłuższy krok {record['max_step_ms']} ms, "
+          f"restarty: {record['restarts']})")
+    print(f"Najdłuższe oczekiwanie zapisu w trakcie kopii: {record['max_writer_wait_ms']} ms "
+          f"({record['writer_probes']} pomiarów)")
+    print(f"Integralność: {record['integrity']}")
+    if record['integrity'] != 'ok':
+        raise SystemExit(1)
+
+# Komenda do sprawdzenia planów zapytań (błąd przy pełnym skanie tabeli)
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    with app.app_context():
+        scans = find_full_scans(get_db())
+    if scans:
+        for name, detail in scans:
+            print(f'{name}: {detail}')
+        raise SystemExit(1)
+    print('Brak pełnych skanów tabel w znanych zapytaniach.')
+
+# Komenda przebudowująca indeks wyszukiwania mediów (np. po ręcznych zmianach w bazie)
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    with app.app_context():
+        db = get_db()
+        start = time.perf_counter()
+        count = rebuild_media_search(db)
+        db.commit()
+    print(f'Zaindeksowano {count} elementów w {(time.perf_counter() - start) * 1000:.0f} ms')
+
+# Zapytania mierzone przez benchmark-search: krótkie prefiksy wpisywane w polu wyszukiwania,
+# częste słowa i zapytanie bez wyników
+SEARCH_BENCHMARK_QUERIES = ('lo', 'lo so', 'love', 'love song', 'the', 'night li', 'da', 'he bl',
+                            'ma', 'remix live', 'so', 'zzzq')
+
+# Komenda mierząca czas wyszukiwania na syntetycznej bibliotece w tymczasowej bazie
+@app.cli.command('benchmark-search')
+@click.option('--count', default=100000, help='Liczba elementów biblioteki')
+@click.option('--repeat', default=5, help='Liczba powtórzeń każdego zapytania')
+def benchmark_search_command(count, repeat):
+    directory = tempfile.mkdtemp(prefix='homehub-search-')
+    try:
+        db = sqlite3.connect(os.path.join(directory, 'search.db'))
+        db.row_factory = sqlite3.Row
+        run_migrations(db)
+        start = time.perf_counter()
+        create_synthetic_library(db, count)
+        db.commit()
+        print(f'Biblioteka: {count} elementów w {time.perf_counter() - start:.0f} s')
+        
+        # Dla każdego zapytania mediana z repeat pomiarów; raportujemy średnią i najgorsze zapytanie
+        for media_type in (None,) + MEDIA_SEARCH_TYPES:
+            medians = {}
+            for text in SEARCH_BENCHMARK_QUERIES:
+                search_media(db, text, media_type)
+                times = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    search_media(db, text, media_type)
+                    times.append((time.perf_counter() - start) * 1000)
+                medians[text] = statistics.median(times)
+            worst = max(medians, key=medians.get)
+            print(f"{media_type or 'wszystkie'}: średnio {statistics.mean(medians.values()):.2f} ms, "
+                  f"najwolniejsze '{worst}' {medians[worst]:.2f} ms")
+        db.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+# Komenda porównująca odczyt tagów audio w procesie z FFprobe
+@app.cli.command('benchmark-audio-tags')
+@click.argument('directory')
+@click.option('--limit', default=500, help='Maksymalna liczba plików w próbie')
+def benchmark_audio_tags_command(directory, limit):
+    formats = {'audio': get_media_formats(app.config).get('audio', [])}
+    files = [path for path, _ in discover_media_files(directory, formats)][:limit]
+    if not files:
+        print('Brak plików audio w katalogu.')
+        return
+    
+    results = {}
+    for name, reader in (('tagi', read_audio_info), ('ffprobe', ffprobe_media)):
+        parsed = 0
+        start = time.perf_counter()
+        for file_path in files:
+            if reader(file_path) is not None:
+                parsed += 1
+        elapsed = time.perf_counter() - start
+        results[name] = len(files) / elapsed if elapsed else 0
+        print(f"{name}: {parsed}/{len(files)} plików, {elapsed:.2f} s, {results[name]:.1f} utworów/s")
+    
+    if results['ffprobe']:
+        print(f"Przyspieszenie: {results['tagi'] / results['ffprobe']:.1f}x")
+
+# Komenda porównująca miniatury tworzone przez Pillow i ImageMagick na syntetycznych zdjęciach
+@app.cli.command('benchmark-thumbnails')
+@click.option('--count', default=40, help='Liczba syntetycznych zdjęć')
+@click.option('--size', default='4000x3000', help='Rozmiar zdjęć (SZERxWYS)')
+@click.option('--width', default=320, help='Szerokość miniatury')
+@click.option('--workers', default=None, type=int, help='Liczba procesów roboczych')
+def benchmark_thumbnails_command(count, size, width, workers):
+    workers = workers or app.config.get('MEDIA_SCAN_WORKERS') or os.cpu_count() or 2
+    directory = tempfile.mkdtemp(prefix='homehub-thumbnails-')
+    try:
+        try:
+            photos = create_synthetic_photos(directory, count, tuple(int(v) for v in size.split('x')))
+        except RuntimeError as e:
+            print(f'Błąd: {e}')
+            raise SystemExit(1)
+        
+        results = {}
+        for name, scale in (('pillow', scale_image_native), ('convert', scale_image_convert)):
+            outputs = [f'{path}.{name}.jpg' for path in photos]
+            start = time.perf_counter()
+            try:
+                with create_scan_executor(workers) as executor:
+                    list(executor.map(scale, photos, outputs, [width] * len(photos)))
+            except Exception as e:
+                print(f'{name}: błąd - {e}')
+                continue
+            elapsed = time.perf_counter() - start
+            results[name] = len(photos) / elapsed
+            print(f"{name}: {len(photos)} zdjęć {size}, {workers} procesów, {elapsed:.2f} s, "
+                  f"{results[name]:.1f} zdjęć/s")
+        
+        if len(results) == 2:
+            print(f"Przyspieszenie: {results['pillow'] / results['convert']:.1f}x")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+# Komenda mierząca przerwy między utworami playlisty bez i z przygotowaniem z wyprzedzeniem
+@app.cli.command('benchmark-prefetch')
+@click.argument('playlist_id', type=int)
+@click.option('--mode', type=click.Choice(['transcode', 'hls']), default='transcode', help='Tryb odtwarzania')
+@click.option('--format', 'format_', default='mp4', help='Format transkodowania')
+@click.option('--resolution', default='480p', help='Rozdzielczość')
+@click.option('--tracks', default=4, help='Liczba odtwarzanych elementów playlisty')
+@click.option('--play-seconds', default=15.0, help='Czas "odtwarzania" każdego elementu')
+def benchmark_prefetch_command(playlist_id, mode, format_, resolution, tracks, play_seconds):
+    with app.app_context():
+        db = get_db()
+        owner = db.execute('SELECT user_id FROM playlists WHERE id = ?', (playlist_id,)).fetchone()
+        if owner is None:
+            print('Playlista nie istnieje.')
+            raise SystemExit(1)
+        items = [dict(row) for row in db.execute(
+            '''SELECT m.id, m.file_path, m.media_type, m.duration FROM playlist_items p 
+            CROSS JOIN media_items m ON m.id = p.media_id 
+            WHERE p.playlist_id = ? ORDER BY p.position, p.media_id LIMIT ?''',
+            (playlist_id, tracks)
+        ).fetchall()]
+        if len(items) < 2:
+            print('Playlista musi mieć co najmniej 2 elementy.')
+            raise SystemExit(1)
+        
+        # Pomiar na pustej pamięci podręcznej w katalogu tymczasowym
+        saved_roots = (transcode_cache.root, hls_manager.root)
+        try:
+            results = {}
+            for enabled in (False, True):
+                directory = tempfile.mkdtemp(prefix='homehub-prefetch-')
+                transcode_cache.root = directory
+                hls_manager.root = os.path.join(directory, 'hls')
+                prefetcher = PlaylistPrefetcher()
+                prefetcher.init_app(app)
+                prefetcher.enabled = enabled
+                gaps = []
+                hits = 0
+                try:
+                    for number, item in enumerate(items):
+                        start = time.perf_counter()
+                        if mode == 'transcode':
+                            prefetcher.notify(db, owner['user_id'], playlist_id, item['id'], mode,
+                                              format_, resolution)
+                            output_file, hit = transcode_cache.lookup(item['id'], item['file_path'],
+                                                                      format_, resolution)
+                            if not hit:
+                                job, _ = transcode_queue.submit(item['id'], item['file_path'], output_file,
+                                                                format_, resolution, item['duration'])
+                                while job.active:
+                                    time.sleep(0.05)
+                        else:
+                            prefetcher.notify(db, owner['user_id'], playlist_id, item['id'], mode,
+                                              resolution=resolution)
+                            fingerprint = source_fingerprint(item['file_path'])
+                            first = os.path.join(hls_manager.cache_dir(item['id'], fingerprint, resolution),
+                                                 '00000.ts')
+                            hit = os.path.exists(first)
+                            hls_manager.get_segment(item['id'], item['file_path'], resolution,
+                                                    item['duration'], 0)
+                        gaps.append(time.perf_counter() - start)
+                        # Pierwszy element zawsze startuje bez przygotowania - liczymy przejścia
+                        hits += bool(hit) and number > 0
+                        time.sleep(play_seconds)
+                finally:
+                    shutil.rmtree(directory, ignore_errors=True)
+                
+                transitions = gaps[1:]
+                name = 'z wyprzedzeniem' if enabled else 'bez wyprzedzenia'
+                results[name] = sum(transitions) / len(transitions)
+                print(f"{name}: trafienia {hits}/{len(transitions)} ({hits / len(transitions):.0%}), "
+                      f"średnia przerwa {results[name] * 1000:.0f} ms, "
+                      f"najdłuższa {max(transitions) * 1000:.0f} ms")
+            
+            if results['z wyprzedzeniem']:
+                print(f"Skrócenie przerwy: {results['bez wyprzedzenia'] / results['z wyprzedzeniem']:.1f}x")
+        finally:
+            transcode_cache.root, hls_manager.root = saved_roots
+
 # Załadowanie użytkownika przed każdym żądaniem
 @app.before_request
 def load_logged_in_user():
@@ -78,21 +348,8 @@ def index():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Pobieranie preferencji użytkownika
-    db = get_db()
-    settings = db.execute('SELECT default_city, theme FROM user_settings WHERE user_id = ?',
-                          (g.user_id,)).fetchone()
-    
-    if settings is None:
-        # Utwórz domyślne ustawienia
-        db.execute(
-            'INSERT INTO user_settings (user_id, default_city, theme) VALUES (?, ?, ?)',
-            (g.user_id, 'Warsaw', 'light')
-        )
-        db.commit()
-        theme = 'light'
-    else:
-        theme = settings['theme']
+    # Pobieranie preferencji użytkownika (pamięć podręczna ustawień)
+    theme = get_user_theme(g.user_id)
     
     return render_template('dashboard.html', 
                            app_name=app.config['APP_NAME'], 
@@ -104,38 +361,123 @@ def dashboard():
 @app.route('/admin')
 @admin_required
 def admin_panel():
-    db = get_db()
-    
-    # Pobierz liczbę użytkowników
-    total_users = db.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    db = get_read_db()
     
-    # Pobierz liczbę administratorów
-    admin_users = db.execute('SELECT COUNT(*) FROM users WHERE role = "admin"').fetchone()[0]
-    
-    # Pobierz liczbę urządzeń
-    device_count = db.execute('SELECT COUNT(*) FROM devices').fetchone()[0]
-    
-    # Pobierz liczbę logów dostępu
-    log_count = db.execute('SELECT COUNT(*) FROM access_logs').fetchone()[0]
-    
-    # Pobierz listę użytkowników
-    users = db.execute('SELECT * FROM users ORDER BY created_at DESC').fetchall()
+    # Liczniki utrzymywane przez wyzwalacze (tabela stats_counters, migracja 3)
+    counters = dict(db.execute(
+        'SELECT name, value FROM stats_counters WHERE name IN (?, ?, ?, ?)',
+        ('users', 'admins', 'devices', 'access_logs')
+    ).fetchall())
     
     # Pobierz motyw użytkownika
-    settings = db.execute('SELECT theme FROM user_settings WHERE user_id = ?',
-                          (g.user_id,)).fetchone()
-    theme = settings['theme'] if settings else 'light'
+    theme = get_user_theme(g.user_id)
     
     return render_template('admin.html', 
                            app_name=app.config['APP_NAME'], 
                            username=g.username,
                            role=g.role,
                            theme=theme,
-                           total_users=total_users,
-                           admin_users=admin_users,
-                           device_count=device_count,
-                           log_count=log_count,
-                           users=users)
+                           total_users=counters.get('users', 0),
+                           admin_users=counters.get('admins', 0),
+                           device_count=counters.get('devices', 0),
+                           log_count=counters.get('access_logs', 0),
+                           page_size=ADMIN_PAGE_SIZE)
+
+# API - lista użytkowników ze stronicowaniem kursorowym (created_at, id)
+@app.route('/api/admin/users')
+@admin_required
+def admin_list_users():
+    limit = min(request.args.get('limit', ADMIN_PAGE_SIZE, type=int), ADMIN_MAX_PAGE_SIZE)
+    after_created = request.args.get('after_created')
+    after_id = request.args.get('after_id', type=int)
+    
+    db = get_read_db()
+    if after_created is not None and after_id is not None:
+        rows = db.execute(
+            'SELECT id, username, email, role, created_at, last_login FROM users '
+            'WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?',
+            (after_created, after_id, limit + 1)
+        ).fetchall()
+    else:
+        rows = db.execute(
+            'SELECT id, username, email, role, created_at, last_login FROM users '
+            'ORDER BY created_at DESC, id DESC LIMIT ?',
+            (limit + 1,)
+        ).fetchall()
+    
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = {'after_created': last['created_at'], 'after_id': last['id']}
+    
+    return jsonify({'items': items, 'next': next_cursor})
+
+# API - logi dostępu ze stronicowaniem kursorowym (id malejąco)
+@app.route('/api/admin/logs')
+@admin_required
+def admin_list_logs():
+    limit = min(request.args.get('limit', ADMIN_PAGE_SIZE, type=int), ADMIN_MAX_PAGE_SIZE)
+    before_id = request.args.get('before_id', type=int)
+    
+    db = get_read_db()
+    if before_id is not None:
+        rows = db.execute(
+            'SELECT l.*, u.username FROM access_logs l LEFT JOIN users u ON u.id = l.user_id '
+            'WHERE l.id < ? ORDER BY l.id DESC LIMIT ?',
+            (before_id, limit + 1)
+        ).fetchall()
+    else:
+        rows = db.execute(
+            'SELECT l.*, u.username FROM access_logs l LEFT JOIN users u ON u.id = l.user_id '
+            'ORDER BY l.id DESC LIMIT ?',
+            (limit + 1,)
+        ).fetchall()
+    
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = {'before_id': items[-1]['id']} if len(rows) > limit else None
+    
+    return jsonify({'items': items, 'next': next_cursor})
+
+# API - statystyki puli połączeń z bazą danych
+@app.route('/api/admin/db/stats')
+@admin_required
+def db_stats():
+    return jsonify({'pools': pool_stats(),
+                    'counter_buffer': dict(counter_buffer.stats),
+                    'settings_cache': dict(settings_cache.stats)})
+
+# API - statystyki zapytań SQL per endpoint i ostatnie ślady żądań
+@app.route('/api/admin/db/queries')
+@admin_required
+def db_query_stats():
+    return jsonify(trace_helpers.trace_report())
+
+# API - kopie zapasowe bazy danych
+@app.route('/api/admin/backup', methods=['GET', 'POST'])
+@admin_required
+def admin_backup():
+    if request.method == 'POST':
+        try:
+            backup_manager.start()
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 409
+        return jsonify({'success': True, 'message': 'Rozpoczęto tworzenie kopii zapasowej'}), 202
+    
+    return jsonify(backup_manager.status())
+
+# API - stan kolejki transkodowania, pamięci podręcznych mediów i sesji HLS
+@app.route('/api/admin/media/stats')
+@admin_required
+def media_stats():
+    return jsonify({'transcode_cache': transcode_cache.metrics(),
+                    'transcode_queue': transcode_queue.status(),
+                    'live_transcode': live_transcoder.status(),
+                    'hls': hls_manager.status(),
+                    'prefetch': playlist_prefetcher.metrics(),
+                    'watcher': media_watcher.status(),
+                    'dlna': dlna_server.status(),
+                    'thumbnails': dict(thumbnail_store.stats, **thumbnail_store.usage())})
 
 # Obsługa błędów
 @app.errorhandler(403)
@@ -153,17 +495,28 @@ def internal_server_error(e):
     return render_template('error.html', error='Błąd serwera', 
                           app_name=app.config['APP_NAME']), 500
 
-# Inicjalizacja bazy przy pierwszym uruchomieniu
-with app.app_context():
-    if not os.path.exists(app.config['DATABASE']):
+# Czy ten proces obsługuje żądania - tylko wtedy uruchamiamy usługi w tle
+def serving_requests():
+    # Polecenia CLI (flask backup-db, check-query-plans, ...) poza `flask run`
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true' and 'run' not in sys.argv[1:]:
+        return False
+    # Przy przeładowaniu w trybie debug serwer działa tylko w procesie potomnym
+    if app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return False
+    return True
+
+# Inicjalizacja bazy i migracje schematu przy uruchomieniu. Przy `python app.py` procesy
+# robocze skanera (forkserver/spawn) importują ten moduł ponownie jako __mp_main__ -
+# nie inicjalizują bazy ani nie uruchamiają usług w tle.
+if __name__ != '__mp_main__':
+    with app.app_context():
         init_db()
-        app.logger.info("Inicjalizacja bazy danych przy pierwszym uruchomieniu")
-    if not app.debug:
-        try:
-            init_dlna_server(app.config)
-            app.logger.info("DLNA/UPnP Media Server initialized")
-        except Exception as e:
-            app.logger.error(f"Failed to initialize DLNA/UPnP Media Server: {str(e)}")
+        if serving_requests():
+            # Obserwator katalogów mediów zapisuje do bazy, więc startuje po migracjach
+            if media_watcher.start():
+                app.logger.info(f"Media watcher started ({len(media_watcher.directories)} directories)")
+            if dlna_server.start():
+                app.logger.info(f"DLNA/UPnP Media Server listening on port {dlna_server.port}")
 
 # Importy blueprintów na końcu, aby uniknąć cyklicznych importów
 from routes.network import network_bp
@@ -171,6 +524,7 @@ from routes.auth import auth_bp
 from routes.user import user_bp
 from routes.weather import weather_bp
 from routes.file_sharing import file_sharing_bp  # Dodaj import blueprintu do udostępniania plików
+from routes.dlna import dlna_bp
 
 # Rejestracja blueprintów
 app.register_blueprint(network_bp)
@@ -179,6 +533,7 @@ app.register_blueprint(media_center_bp)
 app.register_blueprint(user_bp)
 app.register_blueprint(weather_bp)
 app.register_blueprint(file_sharing_bp)  # Zarejestruj blueprint do udostępniania plików
+app.register_blueprint(dlna_bp)
 
 # Uruchomienie aplikacji
 if __name__ == '__main__':
@@ -0,0 +1,574 @@
+# audio_helpers.py
+import base64
+import os
+import re
+import struct
+
+# Odczyt nagłówków i tagów plików audio bez uruchamiania FFprobe.
+# Obsługiwane: MP3 (ID3v1/ID3v2, Xing/Info/VBRI), FLAC, Ogg Vorbis/Opus, WAV (PCM).
+# Funkcja read_audio_info zwraca słownik w tym samym kształcie co probe_media,
+# a dla plików, których nie potrafi odczytać - None (wtedy używany jest FFprobe).
+
+# Maksymalna liczba bajtów przeszukiwanych w poszukiwaniu pierwszej ramki MPEG
+MPEG_SYNC_SEARCH = 64 * 1024
+# Maksymalna liczba bajtów nagłówków Ogg czytanych w poszukiwaniu komentarzy
+OGG_HEADER_LIMIT = 16 * 1024 * 1024
+# Rozmiar końcówki pliku Ogg przeszukiwanej w poszukiwaniu ostatniej strony
+OGG_TAIL_SIZE = 64 * 1024
+
+# Standardowe gatunki ID3v1 (numery używane także w TCON jako "(17)")
+ID3V1_GENRES = [
+    'Blues', 'Classic Rock', 'Country', 'Dance', 'Disco', 'Funk', 'Grunge', 'Hip-Hop',
+    'Jazz', 'Metal', 'New Age', 'Oldies', 'Other', 'Pop', 'R&B', 'Rap', 'Reggae', 'Rock',
+    'Techno', 'Industrial', 'Alternative', 'Ska', 'Death Metal', 'Pranks', 'Soundtrack',
+    'Euro-Techno', 'Ambient', 'Trip-Hop', 'Vocal', 'Jazz+Funk', 'Fusion', 'Trance',
+    'Classical', 'Instrumental', 'Acid', 'House', 'Game', 'Sound Clip', 'Gospel', 'Noise',
+    'AlternRock', 'Bass', 'Soul', 'Punk', 'Space', 'Meditative', 'Instrumental Pop',
+    'Instrumental Rock', 'Ethnic', 'Gothic', 'Darkwave', 'Techno-Industrial', 'Electronic',
+    'Pop-Folk', 'Eurodance', 'Dream', 'Southern Rock', 'Comedy', 'Cult', 'Gangsta', 'Top 40',
+    'Christian Rap', 'Pop/Funk', 'Jungle', 'Native American', 'Cabaret', 'New Wave',
+    'Psychadelic', 'Rave', 'Showtunes', 'Trailer', 'Lo-Fi', 'Tribal', 'Acid Punk',
+    'Acid Jazz', 'Polka', 'Retro', 'Musical', 'Rock & Roll', 'Hard Rock',
+]
+
+# Ramki ID3v2 (v2.3/v2.4 oraz v2.2) i odpowiadające im nazwy tagów FFprobe
+ID3_FRAMES = {
+    'TIT2': 'title', 'TT2': 'title',
+    'TPE1': 'artist', 'TP1': 'artist',
+    'TALB': 'album', 'TAL': 'album',
+    'TCON': 'genre', 'TCO': 'genre',
+    'TRCK': 'track', 'TRK': 'track',
+    'TDRC': 'date', 'TYER': 'date', 'TYE': 'date',
+}
+
+# Nazwy komentarzy Vorbis i pól INFO (WAV) odpowiadające tagom FFprobe
+VORBIS_FIELDS = {
+    'TITLE': 'title', 'ARTIST': 'artist', 'ALBUM': 'album', 'GENRE': 'genre',
+    'TRACKNUMBER': 'track', 'DATE': 'date',
+}
+RIFF_INFO_FIELDS = {
+    b'INAM': 'title', b'IART': 'artist', b'IPRD': 'album', b'IGNR': 'genre',
+    b'ITRK': 'track', b'IPRT': 'track', b'ICRD': 'date',
+}
+
+# Tabele nagłówka ramki MPEG audio (kbps, Hz)
+MPEG_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MPEG_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+
+# Liczba zapisana jako "syncsafe" (7 bitów na bajt)
+def _syncsafe(data):
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7f)
+    return value
+
+# Usunięcie desynchronizacji ID3 (0xFF 0x00 -> 0xFF)
+def _unsynchronise(data):
+    return data.replace(b'\xff\x00', b'\xff')
+
+# Dekodowanie tekstu ramki ID3 zgodnie z bajtem kodowania
+def _decode_id3_text(encoding, data):
+    if encoding in (1, 2):
+        data = data[:len(data) - len(data) % 2]
+        text = data.decode('utf-16' if encoding == 1 else 'utf-16-be', errors='replace')
+    else:
+        text = data.decode('latin-1' if encoding == 0 else 'utf-8', errors='replace')
+    values = [value.strip('\ufeff').strip() for value in text.split('\x00')]
+    return ';'.join(value for value in values if value)
+
+# Podział danych na tekst zakończony zerem i resztę (dla APIC/PIC)
+def _split_terminated(encoding, data):
+    if encoding in (1, 2):
+        for i in range(0, len(data) - 1, 2):
+            if data[i:i + 2] == b'\x00\x00':
+                return data[:i], data[i + 2:]
+    else:
+        index = data.find(b'\x00')
+        if index >= 0:
+            return data[:index], data[index + 1:]
+    return data, b''
+
+# Zamiana numerycznego gatunku ID3 ("(17)", "17") na nazwę
+def _resolve_genre(genre):
+    match = re.match(r'^\((\d+)\)(.*)$', genre) or re.match(r'^(\d+)()$', genre)
+    if not match:
+        return genre
+    if match.group(2):
+        return match.group(2)
+    number = int(match.group(1))
+    return ID3V1_GENRES[number] if number < len(ID3V1_GENRES) else genre
+
+# Rozmiar znacznika ID3v2 na początku danych (0, jeśli go nie ma)
+def _id3v2_size(header):
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    size = 10 + _syncsafe(header[6:10])
+    if header[3] == 4 and header[5] & 0x10:
+        size += 10
+    return size
+
+# Odczyt ramek znacznika ID3v2
+def parse_id3v2(data):
+    """
+    Zwraca (tagi, dane okładki) ze znacznika ID3v2 zaczynającego się w data.
+    """
+    tags = {}
+    picture = None
+    major, flags = data[3], data[5]
+    end = min(len(data), 10 + _syncsafe(data[6:10]))
+    body = data[10:end]
+
+    if major < 4 and flags & 0x80:
+        body = _unsynchronise(body)
+
+    position = 0
+    if flags & 0x40:
+        # Nagłówek rozszerzony
+        if major == 4:
+            position = _syncsafe(body[0:4])
+        elif major == 3:
+            position = struct.unpack('>I', body[0:4])[0] + 4
+
+    id_size, header_size = (3, 6) if major == 2 else (4, 10)
+    while position + header_size <= len(body):
+        frame_id = body[position:position + id_size]
+        if not frame_id.strip(b'\x00') or not frame_id.isalnum():
+            break
+
+        if major == 2:
+            frame_size = int.from_bytes(body[position + 3:position + 6], 'big')
+            format_flags = 0
+        else:
+            size_bytes = body[position + 4:position + 8]
+            frame_size = _syncsafe(size_bytes) if major == 4 else struct.unpack('>I', size_bytes)[0]
+            format_flags = body[position + 9]
+
+        frame = body[position + header_size:position + header_size + frame_size]
+        position += header_size + frame_size
+        frame_id = frame_id.decode('latin-1')
+
+        # Ramki skompresowane lub zaszyfrowane są pomijane
+        if major == 4:
+            if format_flags & 0x0c:
+                continue
+            if format_flags & 0x02:
+                frame = _unsynchronise(frame)
+            if format_flags & 0x01:
+                frame = frame[4:]
+        elif major == 3:
+            if format_flags & 0xc0:
+                continue
+            if format_flags & 0x20:
+                frame = frame[1:]
+
+        if not frame:
+            continue
+
+        tag = ID3_FRAMES.get(frame_id)
+        if tag and tag not in tags:
+            value = _decode_id3_text(frame[0], frame[1:])
+            if value:
+                tags[tag] = _resolve_genre(value) if tag == 'genre' else value
+        elif frame_id in ('APIC', 'PIC') and picture is None:
+            encoding = frame[0]
+            if frame_id == 'APIC':
+                mime_end = frame.find(b'\x00', 1)
+                rest = frame[mime_end + 2:] if mime_end >= 0 else b''
+            else:
+                rest = frame[5:]
+            _, picture = _split_terminated(encoding, rest)
+            picture = picture or None
+
+    return tags, picture
+
+# Odczyt znacznika ID3v1 z ostatnich 128 bajtów pliku
+def parse_id3v1(data):
+    if len(data) != 128 or data[:3] != b'TAG':
+        return {}
+
+    def text(start, length):
+        return data[start:start + length].split(b'\x00')[0].decode('latin-1').strip()
+
+    tags = {
+        'title': text(3, 30),
+        'artist': text(33, 30),
+        'album': text(63, 30),
+        'date': text(93, 4),
+    }
+    # ID3v1.1 - numer utworu w ostatnim bajcie komentarza
+    if data[125] == 0 and data[126]:
+        tags['track'] = str(data[126])
+    if data[127] < len(ID3V1_GENRES):
+        tags['genre'] = ID3V1_GENRES[data[127]]
+    return {key: value for key, value in tags.items() if value}
+
+# Nagłówek ramki MPEG audio
+def _parse_mpeg_header(header):
+    if len(header) < 4 or header[0] != 0xff or header[1] & 0xe0 != 0xe0:
+        return None
+
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    version = {0: 2.5, 2: 2, 3: 1}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = MPEG_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if layer == 2 or version == 1 else 576
+        frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+
+    return {
+        'version': version,
+        'layer': layer,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'channels': 1 if header[3] >> 6 == 3 else 2,
+        'samples_per_frame': samples_per_frame,
+        'frame_length': frame_length,
+    }
+
+# Odczyt pliku MP3
+def _read_mp3(f, file_size, head):
+    tags, picture = {}, None
+    audio_start = _id3v2_size(head)
+    if audio_start:
+        f.seek(0)
+        tags, picture = parse_id3v2(f.read(audio_start))
+
+    # Szukanie pierwszej poprawnej ramki (potwierdzonej przez kolejną)
+    f.seek(audio_start)
+    buffer = f.read(MPEG_SYNC_SEARCH)
+    frame, position = None, buffer.find(b'\xff')
+    while 0 <= position < len(buffer) - 4:
+        candidate = _parse_mpeg_header(buffer[position:position + 4])
+        if candidate:
+            following = position + candidate['frame_length']
+            if following + 4 > len(buffer) or _parse_mpeg_header(buffer[following:following + 4]):
+                frame = candidate
+                break
+        position = buffer.find(b'\xff', position + 1)
+    if frame is None:
+        return None
+    audio_start += position
+
+    f.seek(max(0, file_size - 128))
+    id3v1 = parse_id3v1(f.read(128))
+    audio_end = file_size - (128 if id3v1 else 0)
+    for key, value in id3v1.items():
+        tags.setdefault(key, value)
+
+    # Nagłówek VBR (Xing/Info lub VBRI) w pierwszej ramce
+    if frame['version'] == 1:
+        side_info = 17 if frame['channels'] == 1 else 32
+    else:
+        side_info = 9 if frame['channels'] == 1 else 17
+    first_frame = buffer[position:position + max(frame['frame_length'], 4 + 32 + 18)]
+    frames = audio_bytes = None
+
+    xing = first_frame[4 + side_info:]
+    if xing[:4] in (b'Xing', b'Info') and len(xing) >= 8:
+        flags = struct.unpack('>I', xing[4:8])[0]
+        offset = 8
+        if flags & 0x01:
+            frames = struct.unpack('>I', xing[offset:offset + 4])[0]
+            offset += 4
+        if flags & 0x02:
+            audio_bytes = struct.unpack('>I', xing[offset:offset + 4])[0]
+    elif first_frame[36:40] == b'VBRI':
+        audio_bytes, frames = struct.unpack('>II', first_frame[46:54])
+
+    if frames:
+        duration = frames * frame['samples_per_frame'] / frame['sample_rate']
+        audio_bytes = audio_bytes or (audio_end - audio_start)
+        bitrate = int(audio_bytes * 8 / duration) if duration else frame['bitrate']
+    else:
+        bitrate = frame['bitrate']
+        duration = (audio_end - audio_start) * 8 / bitrate
+
+    codec = {1: 'mp1', 2: 'mp2', 3: 'mp3'}[frame['layer']]
+    return _build_info('mp3', codec, duration, bitrate, frame['sample_rate'], frame['channels'],
+                       tags, picture, file_size)
+
+# Blok PICTURE (FLAC, także METADATA_BLOCK_PICTURE w komentarzach Vorbis)
+def _parse_flac_picture(data):
+    offset = 4
+    mime_length = struct.unpack('>I', data[offset:offset + 4])[0]
+    offset += 4 + mime_length
+    description_length = struct.unpack('>I', data[offset:offset + 4])[0]
+    offset += 4 + description_length + 16
+    picture_length = struct.unpack('>I', data[offset:offset + 4])[0]
+    offset += 4
+    return data[offset:offset + picture_length] or None
+
+# Komentarze Vorbis (FLAC, Ogg Vorbis, Opus)
+def parse_vorbis_comments(data):
+    """
+    Zwraca (tagi, dane okładki) z bloku komentarzy Vorbis.
+    """
+    tags, picture = {}, None
+    vendor_length = struct.unpack('<I', data[0:4])[0]
+    offset = 4 + vendor_length
+    count = struct.unpack('<I', data[offset:offset + 4])[0]
+    offset += 4
+
+    values = {}
+    for _ in range(count):
+        length = struct.unpack('<I', data[offset:offset + 4])[0]
+        offset += 4
+        comment = data[offset:offset + length].decode('utf-8', errors='replace')
+        offset += length
+        key, _, value = comment.partition('=')
+        key = key.upper()
+        if key == 'METADATA_BLOCK_PICTURE' and picture is None:
+            try:
+                picture = _parse_flac_picture(base64.b64decode(value))
+            except (ValueError, struct.error):
+                pass
+        elif key in VORBIS_FIELDS and value:
+            values.setdefault(VORBIS_FIELDS[key], []).append(value)
+
+    for tag, tag_values in values.items():
+        tags[tag] = ';'.join(tag_values)
+    return tags, picture
+
+# Odczyt pliku FLAC
+def _read_flac(f, file_size, head):
+    start = _id3v2_size(head)
+    f.seek(start)
+    if f.read(4) != b'fLaC':
+        return None
+
+    tags, picture, stream_info = {}, None, None
+    while True:
+        block_header = f.read(4)
+        if len(block_header) < 4:
+            return None
+        last, block_type = block_header[0] & 0x80, block_header[0] & 0x7f
+        length = int.from_bytes(block_header[1:4], 'big')
+
+        if block_type in (0, 4) or (block_type == 6 and picture is None):
+            block = f.read(length)
+            if block_type == 0:
+                stream_info = block
+            elif block_type == 4:
+                tags = parse_vorbis_comments(block)[0]
+            else:
+                picture = _parse_flac_picture(block)
+        else:
+            f.seek(length, os.SEEK_CUR)
+
+        if last:
+            break
+
+    if not stream_info or len(stream_info) < 18:
+        return None
+    packed = int.from_bytes(stream_info[10:18], 'big')
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x07) + 1
+    total_samples = packed & 0xfffffffff
+    if not sample_rate:
+        return None
+
+    duration = total_samples / sample_rate
+    audio_bytes = file_size - f.tell()
+    bitrate = int(audio_bytes * 8 / duration) if duration else 0
+    return _build_info('flac', 'flac', duration, bitrate, sample_rate, channels, tags, picture, file_size)
+
+# Pakiety logiczne z początku strumienia Ogg
+def _ogg_packets(f, limit=OGG_HEADER_LIMIT):
+    packet = b''
+    read = 0
+    while read < limit:
+        header = f.read(27)
+        if len(header) < 27 or header[:4] != b'OggS':
+            return
+        lacing = f.read(header[26])
+        body = f.read(sum(lacing))
+        read += 27 + len(lacing) + len(body)
+
+        offset = 0
+        for lace in lacing:
+            packet += body[offset:offset + lace]
+            offset += lace
+            if lace < 255:
+                yield packet
+                packet = b''
+
+# Pozycja (granule) ostatniej strony strumienia Ogg
+def _ogg_last_granule(f, file_size):
+    f.seek(max(0, file_size - OGG_TAIL_SIZE))
+    tail = f.read()
+    position = tail.rfind(b'OggS')
+    while position >= 0:
+        granule = struct.unpack('<q', tail[position + 6:position + 14])[0]
+        if granule >= 0:
+            return granule
+        position = tail.rfind(b'OggS', 0, position)
+    return None
+
+# Odczyt pliku Ogg (Vorbis lub Opus)
+def _read_ogg(f, file_size, head):
+    f.seek(0)
+    packets = _ogg_packets(f)
+    identification = next(packets, None)
+    if not identification:
+        return None
+
+    if identification[:7] == b'\x01vorbis':
+        codec = 'vorbis'
+        channels = identification[11]
+        sample_rate, _, nominal_bitrate = struct.unpack('<Iii', identification[12:24])
+        comments_prefix, pre_skip, granule_rate = b'\x03vorbis', 0, sample_rate
+    elif identification[:8] == b'OpusHead':
+        codec = 'opus'
+        channels = identification[9]
+        pre_skip = struct.unpack('<H', identification[10:12])[0]
+        sample_rate, nominal_bitrate, granule_rate = 48000, 0, 48000
+        comments_prefix = b'OpusTags'
+    else:
+        return None
+
+    comments = next(packets, None)
+    if not comments or not comments.startswith(comments_prefix) or not granule_rate:
+        return None
+    tags, picture = parse_vorbis_comments(comments[len(comments_prefix):])
+
+    granule = _ogg_last_granule(f, file_size)
+    if granule is None:
+        return None
+    duration = max(granule - pre_skip, 0) / granule_rate
+    bitrate = nominal_bitrate if nominal_bitrate > 0 else (int(file_size * 8 / duration) if duration else 0)
+    return _build_info('ogg', codec, duration, bitrate, sample_rate, channels, tags, picture, file_size)
+
+# Odczyt pliku WAV (tylko PCM - inne kodeki obsługuje FFprobe)
+def _read_wav(f, file_size, head):
+    if head[:4] != b'RIFF' or head[8:12] != b'WAVE':
+        return None
+
+    tags, picture, fmt, data_size = {}, None, None, None
+    f.seek(12)
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            break
+        chunk_id, chunk_size = chunk_header[:4], struct.unpack('<I', chunk_header[4:8])[0]
+        chunk_start = f.tell()
+
+        if chunk_id == b'fmt ':
+            fmt = f.read(min(chunk_size, 40))
+        elif chunk_id == b'data':
+            data_size = min(chunk_size, file_size - chunk_start)
+        elif chunk_id == b'LIST' and chunk_size >= 4:
+            info = f.read(chunk_size)
+            if info[:4] == b'INFO':
+                offset = 4
+                while offset + 8 <= len(info):
+                    field, size = info[offset:offset + 4], struct.unpack('<I', info[offset + 4:offset + 8])[0]
+                    value = info[offset + 8:offset + 8 + size].split(b'\x00')[0].decode('latin-1').strip()
+                    if field in RIFF_INFO_FIELDS and value:
+                        tags.setdefault(RIFF_INFO_FIELDS[field], value)
+                    offset += 8 + size + (size & 1)
+        elif chunk_id in (b'id3 ', b'ID3 '):
+            id3 = f.read(chunk_size)
+            if id3[:3] == b'ID3':
+                id3_tags, picture = parse_id3v2(id3)
+                for key, value in id3_tags.items():
+                    tags.setdefault(key, value)
+
+        f.seek(chunk_start + chunk_size + (chunk_size & 1))
+
+    if not fmt or len(fmt) < 16 or data_size is None:
+        return None
+    format_tag, channels, sample_rate, byte_rate, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+    if format_tag == 0xfffe and len(fmt) >= 26:
+        # WAVE_FORMAT_EXTENSIBLE - właściwy kod formatu w podformacie
+        format_tag = struct.unpack('<H', fmt[24:26])[0]
+
+    if format_tag == 1 and bits in (8, 16, 24, 32):
+        codec = 'pcm_u8' if bits == 8 else f'pcm_s{bits}le'
+    elif format_tag == 3 and bits in (32, 64):
+        codec = f'pcm_f{bits}le'
+    else:
+        return None
+    if not byte_rate or not sample_rate:
+        return None
+
+    duration = data_size / byte_rate
+    return _build_info('wav', codec, duration, byte_rate * 8, sample_rate, channels, tags, picture, file_size)
+
+# Złożenie wyniku w kształcie zgodnym z probe_media
+def _build_info(format_name, codec, duration, bitrate, sample_rate, channels, tags, picture, file_size):
+    streams = [{
+        'index': 0,
+        'codec_type': 'audio',
+        'codec_name': codec,
+        'sample_rate': str(sample_rate),
+        'channels': channels,
+        'bit_rate': str(bitrate),
+    }]
+    if picture:
+        streams.append({'index': 1, 'codec_type': 'video', 'disposition': {'attached_pic': 1}})
+
+    return {
+        'format': {
+            'format_name': format_name,
+            'duration': f'{duration:.6f}',
+            'size': str(file_size),
+            'bit_rate': str(bitrate),
+            'tags': dict(tags),
+        },
+        'streams': streams,
+        'tags': dict(tags),
+        'duration': duration,
+        'attached_picture': 1 if picture else None,
+        'picture_data': picture,
+        'reader': 'tags',
+    }
+
+# Odczyt informacji o pliku audio w procesie (bez FFprobe)
+def read_audio_info(file_path):
+    """
+    Rozpoznaje format po zawartości pliku i odczytuje nagłówek strumienia oraz tagi.
+    Zwraca None, jeśli format nie jest obsługiwany lub plik jest uszkodzony.
+    """
+    try:
+        file_size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            head = f.read(12)
+            if head[:4] == b'RIFF':
+                return _read_wav(f, file_size, head)
+            if head[:4] == b'OggS':
+                return _read_ogg(f, file_size, head)
+            if head[:4] == b'fLaC':
+                return _read_flac(f, file_size, head)
+
+            # Znacznik ID3v2 może poprzedzać zarówno MP3, jak i FLAC
+            id3_size = _id3v2_size(head)
+            if id3_size:
+                f.seek(id3_size)
+                if f.read(4) == b'fLaC':
+                    return _read_flac(f, file_size, head)
+            return _read_mp3(f, file_size, head)
+    except (OSError, struct.error, IndexError, KeyError, ValueError, ZeroDivisionError):
+        return None
@@ -0,0 +1,263 @@
+# backup_helpers.py
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Domyślne ustawienia kopii zapasowych
+DEFAULT_PAGES_PER_STEP = 256
+DEFAULT_STEP_SLEEP = 0.01
+DEFAULT_KEEP = 7
+DEFAULT_HISTORY = 20
+# Limit restartów kopii (zmiana źródła przez inne połączenie bez migawki WAL)
+DEFAULT_MAX_RESTARTS = 10
+# Odstęp pomiarów czasu oczekiwania zapisującego na blokadę w trakcie kopii (sekundy)
+DEFAULT_PROBE_INTERVAL = 0.1
+DEFAULT_PROBE_TIMEOUT = 5.0
+
+# Pomiar wpływu kopii na zapisujących: w tle co interval sekund próba przejęcia
+# blokady zapisu (BEGIN IMMEDIATE + ROLLBACK - bez zmian w bazie)
+class WriterLatencyProbe:
+    def __init__(self, database, interval=DEFAULT_PROBE_INTERVAL, timeout=DEFAULT_PROBE_TIMEOUT):
+        self.database = database
+        self.interval = interval
+        self.timeout = timeout
+        self.samples = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.interval:
+            self._thread = threading.Thread(target=self._run, name='backup-writer-probe', daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        return False
+
+    def _run(self):
+        conn = sqlite3.connect(self.database, timeout=self.timeout, isolation_level=None)
+        try:
+            while not self._stopped.wait(self.interval):
+                start = time.perf_counter()
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.execute('ROLLBACK')
+                except sqlite3.OperationalError:
+                    pass
+                wait_ms = (time.perf_counter() - start) * 1000
+                self.samples += 1
+                self.total_ms += wait_ms
+                self.max_ms = max(self.max_ms, wait_ms)
+        finally:
+            conn.close()
+
+    def to_dict(self):
+        return {
+            'writer_probes': self.samples,
+            'max_writer_wait_ms': round(self.max_ms, 3),
+            'avg_writer_wait_ms': round(self.total_ms / self.samples, 3) if self.samples else None,
+        }
+
+# Wykonanie kopii bazy przez API backup SQLite
+def backup_database(database, destination, pages_per_step=DEFAULT_PAGES_PER_STEP, step_sleep=DEFAULT_STEP_SLEEP,
+                    max_restarts=DEFAULT_MAX_RESTARTS, probe_interval=DEFAULT_PROBE_INTERVAL):
+    """
+    Kopiuje bazę krokami po pages_per_step stron, z przerwą step_sleep sekund
+    między krokami.
+
+    W trybie WAL cała kopia wykonywana jest w jednej transakcji odczytu na
+    połączeniu źródłowym: kopia odpowiada migawce z chwili rozpoczęcia, zapisy
+    innych połączeń trafiają do WAL i nie restartują kopiowania, a zapisujący
+    nie czekają na czytelnika. Bez WAL (gdzie długa transakcja odczytu
+    blokowałaby zapisy) kopia może się restartować - po max_restarts
+    zgłaszany jest błąd zamiast kopiowania w nieskończoność.
+
+    Zwraca słownik ze statystykami kopii, w tym najdłuższe oczekiwanie
+    zapisującego na blokadę zmierzone w trakcie kopii (WriterLatencyProbe).
+    """
+    tmp_destination = destination + '.part'
+    if os.path.exists(tmp_destination):
+        os.remove(tmp_destination)
+
+    steps = {'count': 0, 'max_step_ms': 0.0, 'last': None, 'remaining': None, 'restarts': 0}
+    start = time.perf_counter()
+
+    def progress(status, remaining, total):
+        now = time.perf_counter()
+        step_ms = (now - (steps['last'] or start)) * 1000
+        steps['count'] += 1
+        steps['max_step_ms'] = max(steps['max_step_ms'], step_ms)
+        steps['total_pages'] = total
+        # Wzrost liczby pozostałych stron oznacza restart kopii po zmianie źródła
+        if steps['remaining'] is not None and remaining > steps['remaining']:
+            steps['restarts'] += 1
+            if steps['restarts'] > max_restarts:
+                raise RuntimeError(f'Kopia restartowana ponad {max_restarts} razy (baza zmieniana w trakcie kopii)')
+        steps['remaining'] = remaining
+        if remaining and step_sleep:
+            time.sleep(step_sleep)
+        # Czas snu nie wlicza się do czasu trwania kolejnego kroku
+        steps['last'] = time.perf_counter()
+
+    source = sqlite3.connect(database)
+    target = sqlite3.connect(tmp_destination)
+    try:
+        snapshot = source.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+        if snapshot:
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        with WriterLatencyProbe(database, probe_interval) as probe:
+            source.backup(target, pages=pages_per_step, progress=progress)
+        page_size = target.execute('PRAGMA page_size').fetchone()[0]
+        page_count = target.execute('PRAGMA page_count').fetchone()[0]
+    except BaseException:
+        # Niedokończona kopia nie zostaje na dysku
+        target.close()
+        if os.path.exists(tmp_destination):
+            os.remove(tmp_destination)
+        raise
+    finally:
+        target.close()
+        source.close()
+
+    os.replace(tmp_destination, destination)
+
+    return dict({
+        'path': destination,
+        'bytes': page_size * page_count,
+        'pages': page_count,
+        'steps': steps['count'],
+        'restarts': steps['restarts'],
+        'snapshot': snapshot,
+        'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+        'max_step_ms': round(steps['max_step_ms'], 3),
+    }, **probe.to_dict())
+
+# Weryfikacja kopii przez PRAGMA integrity_check
+def verify_backup(path):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = conn.execute('PRAGMA integrity_check').fetchall()
+    finally:
+        conn.close()
+    messages = [row[0] for row in rows]
+    return messages == ['ok'], messages
+
+# Usuwanie najstarszych kopii ponad limit
+def rotate_backups(backup_dir, prefix, keep=DEFAULT_KEEP):
+    snapshots = sorted(
+        name for name in os.listdir(backup_dir)
+        if name.startswith(prefix) and name.endswith('.db')
+    )
+    removed = []
+    for name in snapshots[:-keep] if keep > 0 else snapshots:
+        os.remove(os.path.join(backup_dir, name))
+        removed.append(name)
+    return removed
+
+# Menedżer kopii zapasowych uruchamianych w tle
+class BackupManager:
+    def __init__(self):
+        self._config = None
+        self._lock = threading.Lock()
+        self._running = None
+        self.history = []
+
+    def init_app(self, app):
+        self._config = app.config
+
+    @property
+    def backup_dir(self):
+        return self._config.get('BACKUP_DIR') or os.path.join(
+            os.path.dirname(os.path.abspath(self._config['DATABASE'])), 'backups'
+        )
+
+    def is_running(self):
+        return self._running is not None
+
+    def run(self, verify_in_background=True):
+        """Wykonuje kopię synchronicznie; zwraca rekord z wynikiem"""
+        with self._lock:
+            if self._running is not None:
+                raise RuntimeError('Kopia zapasowa jest już w trakcie tworzenia')
+            record = self._running = {
+                'status': 'running',
+                'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+
+        try:
+            database = self._config['DATABASE']
+            if database == ':memory:':
+                raise RuntimeError('Nie można wykonać kopii bazy w pamięci')
+
+            os.makedirs(self.backup_dir, exist_ok=True)
+            prefix = os.path.splitext(os.path.basename(database))[0] + '-'
+            destination = os.path.join(
+                self.backup_dir, f"{prefix}{datetime.now().strftime('%Y%m%d-%H%M%S')}.db"
+            )
+
+            record.update(backup_database(
+                database, destination,
+                pages_per_step=self._config.get('BACKUP_PAGES_PER_STEP', DEFAULT_PAGES_PER_STEP),
+                step_sleep=self._config.get('BACKUP_STEP_SLEEP', DEFAULT_STEP_SLEEP),
+                max_restarts=self._config.get('BACKUP_MAX_RESTARTS', DEFAULT_MAX_RESTARTS),
+                probe_interval=self._config.get('BACKUP_PROBE_INTERVAL', DEFAULT_PROBE_INTERVAL),
+            ))
+            record['rotated'] = rotate_backups(self.backup_dir, prefix,
+                                               self._config.get('BACKUP_KEEP', DEFAULT_KEEP))
+            record['status'] = 'completed'
+            record['integrity'] = 'pending'
+        except Exception as e:
+            record['status'] = 'failed'
+            record['error'] = str(e)
+        finally:
+            with self._lock:
+                self._running = None
+                self.history.append(record)
+                del self.history[:-DEFAULT_HISTORY]
+
+        if record['status'] == 'completed':
+            if verify_in_background:
+                threading.Thread(target=self._verify, args=(record,), daemon=True).start()
+            else:
+                self._verify(record)
+        return record
+
+    def start(self):
+        """Uruchamia kopię w osobnym wątku"""
+        if self.is_running():
+            raise RuntimeError('Kopia zapasowa jest już w trakcie tworzenia')
+        thread = threading.Thread(target=self._run_safely, daemon=True)
+        thread.start()
+
+    def _run_safely(self):
+        try:
+            self.run()
+        except RuntimeError:
+            pass
+
+    def _verify(self, record):
+        try:
+            ok, messages = verify_backup(record['path'])
+            record['integrity'] = 'ok' if ok else 'failed'
+            if not ok:
+                record['integrity_errors'] = messages[:20]
+        except Exception as e:
+            record['integrity'] = 'failed'
+            record['integrity_errors'] = [str(e)]
+
+    def status(self):
+        with self._lock:
+            running = dict(self._running) if self._running else None
+            history = [dict(record) for record in self.history]
+        return {'running': running, 'history': list(reversed(history))}
+
+# Globalny menedżer kopii zapasowych
+backup_manager = BackupManager()
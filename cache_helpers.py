@@ -0,0 +1,89 @@
+# cache_helpers.py
+import os
+import time
+
+# Po przekroczeniu budżetu usuwamy pliki do 90% limitu, żeby nie sprzątać przy każdym zapisie
+EVICTION_LOW_WATER = 0.9
+# Czas dostępu (mtime) odświeżamy najwyżej raz na minutę dla danego pliku
+TOUCH_INTERVAL = 60
+
+# Odcisk pliku źródłowego (rozmiar, mtime) - zmiana pliku unieważnia wyniki w pamięci podręcznej
+def source_fingerprint(file_path):
+    st = os.stat(file_path)
+    return f'{st.st_size:x}-{int(st.st_mtime):x}'
+
+# Pliki w katalogu pamięci podręcznej (czas ostatniego użycia, rozmiar, ścieżka)
+def cache_entries(root, suffixes=None):
+    """
+    Pliki tymczasowe (*.tmp*, *.part) są pomijane - należą do trwających zapisów.
+    """
+    entries = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if '.tmp' in name or name.endswith('.part'):
+                continue
+            if suffixes and not name.endswith(suffixes):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+# Odświeżenie czasu ostatniego użycia pliku (mtime jako zegar LRU)
+def touch_entry(path, interval=TOUCH_INTERVAL):
+    try:
+        now = time.time()
+        if now - os.path.getmtime(path) > interval:
+            os.utime(path, (now, now))
+    except OSError:
+        pass
+
+# Usuwanie najdawniej używanych plików ponad budżet
+def evict_lru(root, max_bytes, suffixes=None, low_water=EVICTION_LOW_WATER, keep=None):
+    """
+    Jeśli pliki w root zajmują więcej niż max_bytes, usuwa najdawniej używane
+    aż do low_water * max_bytes. keep(ścieżka) -> True chroni plik przed usunięciem
+    (np. segmenty właśnie odtwarzanego strumienia). Zwraca (usunięte pliki, bajty).
+    """
+    entries = cache_entries(root, suffixes)
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return 0, 0
+
+    target = max_bytes * low_water
+    removed = removed_bytes = 0
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        if keep is not None and keep(path):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        removed_bytes += size
+
+    _remove_empty_dirs(root)
+    return removed, removed_bytes
+
+# Usunięcie pustych podkatalogów po sprzątaniu
+def _remove_empty_dirs(root):
+    # Świeżo utworzone katalogi mogą właśnie czekać na pierwszy zapis
+    cutoff = time.time() - TOUCH_INTERVAL
+    for directory, _, _ in os.walk(root, topdown=False):
+        if directory == root:
+            continue
+        try:
+            empty = not os.listdir(directory) and os.path.getmtime(directory) < cutoff
+        except OSError:
+            continue
+        if empty:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
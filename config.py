@@ -9,6 +9,95 @@ class Config:
     
     # Konfiguracja bazy danych
     DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'homeHub.db')
+    DB_POOL_SIZE = 8               # maksymalna liczba bezczynnych połączeń w puli
+    DB_BUSY_TIMEOUT = 5.0          # sekundy oczekiwania na zwolnienie blokady
+    DB_SYNCHRONOUS = 'NORMAL'      # w trybie WAL wystarczające i znacznie szybsze niż FULL
+    DB_MMAP_SIZE = 256 * 1024 * 1024
+    DB_CACHE_SIZE = -16000         # wartość ujemna = rozmiar w KiB
+    
+    # Bufor liczników (access_count, play_count) zapisywany partiami
+    COUNTER_FLUSH_INTERVAL_MS = 2000
+    COUNTER_FLUSH_MAX_EVENTS = 500
+    
+    # Śledzenie zapytań SQL w żądaniach
+    SQL_TRACE_ENABLED = True
+    SQL_TRACE_SLOWEST = 5             # liczba najwolniejszych zapytań zapamiętywanych na żądanie
+    SQL_N_PLUS_ONE_THRESHOLD = 5      # ile powtórzeń tego samego zapytania oznacza podejrzenie N+1
+    
+    # Pamięć podręczna ustawień użytkowników
+    USER_SETTINGS_CACHE_TTL = 300     # sekundy
+    USER_SETTINGS_CACHE_SIZE = 1024
+    
+    # Kopie zapasowe bazy danych (API backup SQLite)
+    BACKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups')
+    BACKUP_KEEP = 7                   # liczba przechowywanych kopii
+    BACKUP_PAGES_PER_STEP = 256       # stron kopiowanych w jednym kroku
+    BACKUP_STEP_SLEEP = 0.01          # przerwa między krokami (sekundy)
+    BACKUP_MAX_RESTARTS = 10          # restartów kopii (bez WAL) przed zgłoszeniem błędu
+    BACKUP_PROBE_INTERVAL = 0.1       # pomiar oczekiwania zapisujących w trakcie kopii (0 - wyłączony)
+    
+    # Centrum multimedialne
+    MEDIA_DIRS = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'HomeHubShared')]
+    MEDIA_FORMATS = {
+        'video': ['mp4', 'mkv', 'avi', 'mov'],
+        'audio': ['mp3', 'flac', 'ogg', 'wav'],
+        'image': ['jpg', 'jpeg', 'png', 'gif', 'webp']
+    }
+    THUMBNAIL_DIR = '/tmp/homehub/thumbnails'
+    # Magazyn miniatur: budżet w bajtach (LRU) i rozmiary (szerokość w pikselach)
+    THUMBNAIL_MAX_BYTES = 512 * 1024 * 1024
+    THUMBNAIL_RENDITIONS = {'grid': 160, 'card': 320, 'full': 1280}
+    TRANSCODE_DIR = '/tmp/homehub/transcoded'
+    # Liczba równoczesnych procesów FFmpeg (None - połowa rdzeni)
+    TRANSCODE_WORKERS = None
+    # Transkodowanie audio na żywo (/api/media/stream/<id>/live): limit równoczesnych strumieni,
+    # rozmiar fragmentu odpowiedzi i potoku FFmpeg (granica bufora na strumień)
+    LIVE_TRANSCODE_MAX_STREAMS = 8
+    LIVE_TRANSCODE_CHUNK_BYTES = 16 * 1024
+    LIVE_TRANSCODE_PIPE_BYTES = 128 * 1024
+    # Budżet dyskowy plików transkodowanych (najdawniej używane są usuwane)
+    TRANSCODE_CACHE_MAX_BYTES = 20 * 1024 * 1024 * 1024
+    # Zadania o niskim priorytecie (przygotowanie następnych utworów): liczba procesów i nice FFmpeg
+    TRANSCODE_LOW_PRIORITY_WORKERS = 1
+    TRANSCODE_LOW_PRIORITY_NICENESS = 10
+    # Przygotowanie z wyprzedzeniem następnych elementów playlisty (?playlist=<id>):
+    # liczba elementów, segmenty HLS na element i bajty wczytywane z wyprzedzeniem
+    PREFETCH_ENABLED = True
+    PREFETCH_AHEAD = 2
+    PREFETCH_HLS_SEGMENTS = 2
+    PREFETCH_READAHEAD_BYTES = 8 * 1024 * 1024
+    # Strumieniowanie HLS: długość segmentu (s), zapas segmentów przed odtwarzaczem,
+    # czas bezczynności odtwarzacza (s), limit równoczesnych sesji i budżet pamięci segmentów
+    HLS_SEGMENT_SECONDS = 6
+    HLS_AHEAD_SEGMENTS = 5
+    HLS_IDLE_TIMEOUT = 30
+    HLS_MAX_SESSIONS = 4
+    HLS_CACHE_MAX_BYTES = 4 * 1024 * 1024 * 1024
+    # Okno sesji odtwarzania (s) - żądania w tym oknie to jedno odtworzenie
+    PLAY_SESSION_TTL = 1800
+    # Wysyłanie plików przez serwer proxy (nagłówek X-Sendfile) - wymaga obsługi w nginx/Apache
+    USE_X_SENDFILE = False
+    # Wbudowany serwer DLNA/UPnP: port HTTP, nazwa widoczna w odbiornikach, adres ogłaszany
+    # w SSDP (None - wykrywany automatycznie), maks. elementów na stronę i wpisy pamięci podręcznej
+    DLNA_ENABLED = True
+    DLNA_SERVER_PORT = 8200
+    DLNA_FRIENDLY_NAME = 'HomeHub Media Server'
+    DLNA_HOST = None
+    DLNA_PAGE_SIZE = 200
+    DLNA_CACHE_ENTRIES = 512
+    
+    # Skaner mediów - pula procesów dla ffprobe i generowania miniatur
+    MEDIA_SCAN_WORKERS = os.cpu_count() or 2
+    MEDIA_SCAN_BATCH_SIZE = 200       # liczba plików zapisywanych w jednej transakcji
+    MEDIA_SCAN_QUEUE_DEPTH = None     # maks. zadań w toku (domyślnie 4 x liczba procesów)
+    MEDIA_SCAN_INLINE_MAX = 8         # do tylu plików (np. partia obserwatora) - wątki zamiast procesów
+    
+    # Obserwator katalogów mediów (inotify) - zmiany trafiają do bazy bez ręcznego skanowania.
+    # Partia zmian przetwarzana jest po MEDIA_WATCH_DEBOUNCE s ciszy, najpóźniej po MEDIA_WATCH_MAX_DELAY s
+    MEDIA_WATCH_ENABLED = True
+    MEDIA_WATCH_DEBOUNCE = 2.0
+    MEDIA_WATCH_MAX_DELAY = 10.0
+    MEDIA_WATCH_THUMBNAILS = True
     
     # Konfiguracja sesji
     SESSION_TYPE = 'filesystem'
@@ -65,6 +154,8 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     DATABASE = ':memory:'  # Używa bazy danych w pamięci
+    DLNA_ENABLED = False
+    MEDIA_WATCH_ENABLED = False
 
 # Słownik dostępnych konfiguracji
 config = {
@@ -0,0 +1,209 @@
+# counter_helpers.py
+import threading
+import atexit
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from db_helpers import get_pool
+
+# Domyślne progi opróżniania bufora
+DEFAULT_FLUSH_INTERVAL_MS = 2000
+DEFAULT_FLUSH_MAX_EVENTS = 500
+
+# Okno (s), w którym kolejne żądania użytkownika dla tego samego pliku są jednym odtworzeniem
+DEFAULT_PLAY_SESSION_TTL = 1800
+DEFAULT_PLAY_SESSION_MAX = 10000
+
+# Bufor liczników z zapisem odroczonym (write-behind)
+class CounterBuffer:
+    """
+    Zbiera w pamięci przyrosty liczników (access_count, play_count) i znaczniki
+    ostatniego dostępu, a następnie zapisuje je do bazy jedną transakcją co
+    określony czas lub po określonej liczbie zdarzeń.
+    """
+
+    def __init__(self):
+        self._config = None
+        self._pending = {}
+        self._event_count = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL_MS / 1000.0
+        self.max_events = DEFAULT_FLUSH_MAX_EVENTS
+        self.stats = {'events': 0, 'flushes': 0, 'rows_written': 0, 'failed_flushes': 0}
+
+    def init_app(self, app):
+        self._config = app.config
+        self.flush_interval = app.config.get('COUNTER_FLUSH_INTERVAL_MS', DEFAULT_FLUSH_INTERVAL_MS) / 1000.0
+        self.max_events = app.config.get('COUNTER_FLUSH_MAX_EVENTS', DEFAULT_FLUSH_MAX_EVENTS)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='counter-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def increment(self, table, key_column, key, counter_column, timestamp_column=None, amount=1):
+        """Rejestruje przyrost licznika bez zapisu do bazy"""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        entry_key = (table, key_column, counter_column, timestamp_column, key)
+        with self._lock:
+            entry = self._pending.get(entry_key)
+            if entry is None:
+                self._pending[entry_key] = [amount, timestamp]
+            else:
+                entry[0] += amount
+                entry[1] = timestamp
+            self._event_count += 1
+            self.stats['events'] += 1
+            should_flush = self._event_count >= self.max_events
+
+        if should_flush:
+            self._wakeup.set()
+
+    def pending(self, table, key_column, key, counter_column, timestamp_column=None):
+        """Zwraca (przyrost, ostatni znacznik czasu) oczekujący na zapis"""
+        with self._lock:
+            entry = self._pending.get((table, key_column, counter_column, timestamp_column, key))
+            if entry is None:
+                return 0, None
+            return entry[0], entry[1]
+
+    def overlay(self, row, table, key_column, counter_column, timestamp_column=None):
+        """Nakłada oczekujące przyrosty na słownik odczytany z bazy"""
+        delta, timestamp = self.pending(table, key_column, row.get(key_column), counter_column,
+                                        timestamp_column)
+        if delta:
+            row[counter_column] = (row.get(counter_column) or 0) + delta
+            if timestamp_column:
+                row[timestamp_column] = timestamp
+        return row
+
+    def flush(self):
+        """Zapisuje wszystkie oczekujące przyrosty w jednej transakcji"""
+        with self._lock:
+            batch = self._pending
+            self._pending = {}
+            self._event_count = 0
+
+        if not batch or self._config is None:
+            return 0
+
+        # Grupowanie aktualizacji według tabeli i kolumn
+        groups = {}
+        for (table, key_column, counter_column, timestamp_column, key), (delta, timestamp) in batch.items():
+            groups.setdefault((table, key_column, counter_column, timestamp_column), []).append(
+                (delta, timestamp, key)
+            )
+
+        pool = get_pool(self._config)
+        db = pool.acquire()
+        try:
+            for (table, key_column, counter_column, timestamp_column), rows in groups.items():
+                if timestamp_column:
+                    db.executemany(
+                        f'UPDATE {table} SET {counter_column} = COALESCE({counter_column}, 0) + ?, '
+                        f'{timestamp_column} = ? WHERE {key_column} = ?',
+                        rows
+                    )
+                else:
+                    db.executemany(
+                        f'UPDATE {table} SET {counter_column} = COALESCE({counter_column}, 0) + ? '
+                        f'WHERE {key_column} = ?',
+                        [(delta, key) for delta, _, key in rows]
+                    )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self._restore(batch)
+            with self._lock:
+                self.stats['failed_flushes'] += 1
+            print(f"Błąd zapisu buforowanych liczników: {str(e)}")
+            return 0
+        finally:
+            pool.release(db)
+
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += len(batch)
+        return len(batch)
+
+    def _restore(self, batch):
+        # Przywrócenie niezapisanych przyrostów, aby nie zgubić zdarzeń
+        with self._lock:
+            for entry_key, (delta, timestamp) in batch.items():
+                entry = self._pending.get(entry_key)
+                if entry is None:
+                    self._pending[entry_key] = [delta, timestamp]
+                else:
+                    entry[0] += delta
+                    entry[1] = max(entry[1], timestamp)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stop(self):
+        """Zatrzymuje wątek i zapisuje pozostałe przyrosty"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+# Sesje odtwarzania - jedno odtworzenie niezależnie od liczby żądań (przewijanie, Range, HLS)
+class PlaySessions:
+    def __init__(self, ttl=DEFAULT_PLAY_SESSION_TTL, max_entries=DEFAULT_PLAY_SESSION_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'started': 0, 'deduplicated': 0}
+
+    def init_app(self, app):
+        self.ttl = app.config.get('PLAY_SESSION_TTL', DEFAULT_PLAY_SESSION_TTL)
+
+    def start(self, user_id, media_id):
+        """
+        Zwraca True, jeśli to nowe odtworzenie. Każde żądanie przedłuża sesję,
+        więc długi film oglądany z przerwami na przewijanie liczy się raz.
+        """
+        key = (user_id, media_id)
+        now = time.monotonic()
+        with self._lock:
+            last_seen = self._sessions.pop(key, None)
+            self._sessions[key] = now
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+            if last_seen is not None and now - last_seen < self.ttl:
+                self.stats['deduplicated'] += 1
+                return False
+            self.stats['started'] += 1
+            return True
+
+# Globalny bufor liczników aplikacji
+counter_buffer = CounterBuffer()
+
+# Globalny rejestr sesji odtwarzania
+play_sessions = PlaySessions()
+
+# Rejestracja dostępu do udostępnionego pliku (po ścieżce lub linku)
+def record_file_access(file_path=None, shared_link=None):
+    if shared_link is not None:
+        counter_buffer.increment('shared_files', 'shared_link', shared_link, 'access_count', 'last_accessed')
+    else:
+        counter_buffer.increment('shared_files', 'file_path', file_path, 'access_count', 'last_accessed')
+
+# Rejestracja odtworzenia elementu multimedialnego
+def record_media_play(media_id, user_id=None):
+    """
+    Z podanym user_id zliczane jest tylko pierwsze żądanie sesji odtwarzania.
+    Zwraca True, jeśli odtworzenie zostało policzone.
+    """
+    if user_id is not None and not play_sessions.start(user_id, media_id):
+        return False
+    counter_buffer.increment('media_items', 'id', media_id, 'play_count', 'last_accessed')
+    return True
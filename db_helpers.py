@@ -1,18 +1,288 @@
 # db_helpers.py
 from flask import g
 import sqlite3
+import threading
+import time
+import atexit
+from collections import deque
 
-# Funkcja do pobierania połączenia z bazą danych
+# Domyślne parametry połączeń (nadpisywane przez konfigurację aplikacji)
+DEFAULT_POOL_SIZE = 8
+DEFAULT_BUSY_TIMEOUT = 5.0
+DEFAULT_SYNCHRONOUS = 'NORMAL'
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+DEFAULT_CACHE_SIZE = -16000  # wartość ujemna = rozmiar w KiB
+
+# Sprawdzenie, czy wyjątek oznacza zablokowaną bazę
+def is_lock_error(exc):
+    return isinstance(exc, sqlite3.OperationalError) and 'locked' in str(exc).lower()
+
+# Kursor zliczający błędy blokady bazy i czas zapytań (gdy aktywny jest ślad żądania).
+# SQLite wykonuje zapytanie krokowo, więc czas pobierania wierszy (fetch*) też jest
+# doliczany do zapytania, które je zwróciło.
+class HubCursor(sqlite3.Cursor):
+    _traced_sql = None
+
+    def execute(self, sql, parameters=()):
+        tracer = self.connection.tracer
+        start = time.perf_counter() if tracer is not None else None
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.OperationalError as e:
+            self.connection.note_error(e)
+            raise
+        finally:
+            if tracer is not None:
+                self._traced_sql = sql
+                tracer.record(sql, (time.perf_counter() - start) * 1000)
+
+    def executemany(self, sql, seq_of_parameters):
+        tracer = self.connection.tracer
+        start = time.perf_counter() if tracer is not None else None
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.OperationalError as e:
+            self.connection.note_error(e)
+            raise
+        finally:
+            if tracer is not None:
+                self._traced_sql = None
+                tracer.record(sql, (time.perf_counter() - start) * 1000)
+
+    def _traced_fetch(self, fetch, *args):
+        tracer = self.connection.tracer
+        if tracer is None or self._traced_sql is None:
+            return fetch(*args)
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            tracer.record_fetch(self._traced_sql, (time.perf_counter() - start) * 1000)
+
+    def fetchone(self):
+        return self._traced_fetch(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._traced_fetch(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._traced_fetch(super().fetchall)
+
+    def __next__(self):
+        return self._traced_fetch(super().__next__)
+
+# Połączenie należące do puli
+class HubConnection(sqlite3.Connection):
+    pool = None
+    tracer = None
+
+    def cursor(self, factory=HubCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        tracer = self.tracer
+        start = time.perf_counter() if tracer is not None else None
+        try:
+            super().commit()
+        except sqlite3.OperationalError as e:
+            self.note_error(e)
+            raise
+        finally:
+            if tracer is not None:
+                tracer.record('COMMIT', (time.perf_counter() - start) * 1000)
+
+    def note_error(self, exc):
+        if self.pool is not None and is_lock_error(exc):
+            self.pool.record_lock_error()
+
+# Pula "ciepłych" połączeń SQLite
+class ConnectionPool:
+    """
+    Przechowuje otwarte połączenia z bazą i wydaje je kolejnym żądaniom.
+    Połączenie jest przypisane do wątku obsługującego żądanie od get_db()
+    do close_db(), potem wraca do puli zamiast być zamykane.
+    """
+
+    def __init__(self, database, readonly=False, max_idle=DEFAULT_POOL_SIZE,
+                 busy_timeout=DEFAULT_BUSY_TIMEOUT, synchronous=DEFAULT_SYNCHRONOUS,
+                 mmap_size=DEFAULT_MMAP_SIZE, cache_size=DEFAULT_CACHE_SIZE):
+        self.database = database
+        self.readonly = readonly
+        self.max_idle = max_idle
+        self.busy_timeout = busy_timeout
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._stats = {
+            'opened': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'reused': 0,
+            'in_use': 0,
+            'lock_errors': 0,
+            'connect_time_ms': 0.0,
+        }
+
+    def _connect(self):
+        start = time.perf_counter()
+        if self.readonly:
+            conn = sqlite3.connect(f'file:{self.database}?mode=ro', uri=True,
+                                   timeout=self.busy_timeout, check_same_thread=False,
+                                   factory=HubConnection)
+        else:
+            conn = sqlite3.connect(self.database, timeout=self.busy_timeout,
+                                   check_same_thread=False, factory=HubConnection)
+        conn.row_factory = sqlite3.Row
+        conn.pool = self
+
+        if not self.readonly:
+            # Tryb WAL jest trwały dla pliku bazy - czytelnicy nie czekają na zapisujących
+            conn.execute('PRAGMA journal_mode=WAL')
+        else:
+            conn.execute('PRAGMA query_only=1')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size={int(self.cache_size)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+
+        with self._lock:
+            self._stats['opened'] += 1
+            self._stats['connect_time_ms'] += (time.perf_counter() - start) * 1000
+        return conn
+
+    def acquire(self):
+        """Pobiera połączenie z puli lub otwiera nowe"""
+        conn = None
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats['reused'] += 1
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._stats['in_use'] -= 1
+                raise
+        return conn
+
+    def release(self, conn):
+        """Zwraca połączenie do puli, wycofując niezatwierdzoną transakcję"""
+        conn.tracer = None
+        keep = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            keep = False
+
+        with self._lock:
+            self._stats['in_use'] -= 1
+            if keep and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._stats['closed'] += 1
+        conn.close()
+
+    def record_lock_error(self):
+        with self._lock:
+            self._stats['lock_errors'] += 1
+
+    def close_all(self):
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._stats['closed'] += len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['database'] = self.database
+        stats['readonly'] = self.readonly
+        stats['connect_time_ms'] = round(stats['connect_time_ms'], 3)
+        stats['reuse_ratio'] = round(stats['reused'] / stats['checkouts'], 3) if stats['checkouts'] else 0.0
+        return stats
+
+# Rejestr pul dla poszczególnych plików bazy
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(config, readonly=False):
+    database = config['DATABASE']
+    key = (database, readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(
+                    database,
+                    readonly=readonly,
+                    max_idle=config.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE),
+                    busy_timeout=config.get('DB_BUSY_TIMEOUT', DEFAULT_BUSY_TIMEOUT),
+                    synchronous=config.get('DB_SYNCHRONOUS', DEFAULT_SYNCHRONOUS),
+                    mmap_size=config.get('DB_MMAP_SIZE', DEFAULT_MMAP_SIZE),
+                    cache_size=config.get('DB_CACHE_SIZE', DEFAULT_CACHE_SIZE),
+                )
+                _pools[key] = pool
+    return pool
+
+# Funkcja do pobierania połączenia z bazą danych (do zapisu)
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
         from flask import current_app
-        db = g._database = sqlite3.connect(current_app.config['DATABASE'])
-        db.row_factory = sqlite3.Row
+        db = g._database = get_pool(current_app.config).acquire()
+        db.tracer = getattr(g, '_sql_trace', None)
     return db
 
-# Funkcja do zamykania połączenia
+# Funkcja do pobierania połączenia tylko do odczytu
+def get_read_db():
+    db = getattr(g, '_read_database', None)
+    if db is None:
+        from flask import current_app
+        # Baza w pamięci nie może być otwarta drugi raz - korzystamy z połączenia do zapisu
+        if current_app.config['DATABASE'] == ':memory:':
+            return get_db()
+        db = g._read_database = get_pool(current_app.config, readonly=True).acquire()
+        db.tracer = getattr(g, '_sql_trace', None)
+    return db
+
+# Funkcja do zwracania połączeń do puli
+# (błędy blokady zlicza HubCursor/HubConnection w miejscu wystąpienia)
 def close_db(e=None):
-    db = getattr(g, '_database', None)
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
\ No newline at end of file
+        db.pool.release(db)
+
+    read_db = g.pop('_read_database', None)
+    if read_db is not None:
+        read_db.pool.release(read_db)
+
+# Statystyki wszystkich pul
+def pool_stats():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+# Zamknięcie wszystkich połączeń (przy zamykaniu aplikacji)
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+atexit.register(close_all_pools)
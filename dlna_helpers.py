@@ -0,0 +1,704 @@
+# dlna_helpers.py
+import re
+import socket
+import struct
+import threading
+import time
+import uuid
+import atexit
+import platform
+from collections import OrderedDict
+from email.utils import formatdate
+from urllib.parse import quote, unquote
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+from search_helpers import search_media_page, count_search_matches
+
+# Adres i port grupy multicast SSDP
+SSDP_ADDR = '239.255.255.250'
+SSDP_PORT = 1900
+# Typy urządzenia i usług UPnP
+DEVICE_TYPE = 'urn:schemas-upnp-org:device:MediaServer:1'
+CONTENT_DIRECTORY = 'urn:schemas-upnp-org:service:ContentDirectory:1'
+CONNECTION_MANAGER = 'urn:schemas-upnp-org:service:ConnectionManager:1'
+SERVER_STRING = f'{platform.system()}/{platform.release()} UPnP/1.0 HomeHub/1.0'
+
+# Domyślne ustawienia serwera DLNA
+DEFAULT_FRIENDLY_NAME = 'HomeHub Media Server'
+DEFAULT_MAX_AGE = 1800
+DEFAULT_PAGE_SIZE = 200
+DEFAULT_CACHE_ENTRIES = 512
+# Klucz w środowisku WSGI oznaczający żądanie przyjęte na porcie DLNA
+DLNA_ENVIRON_KEY = 'homehub.dlna'
+
+# Typy MIME plików według rozszerzenia (mimetypes nie zna części formatów, np. mkv)
+DLNA_MIME_TYPES = {
+    'mp3': 'audio/mpeg', 'flac': 'audio/flac', 'ogg': 'audio/ogg', 'wav': 'audio/wav',
+    'mp4': 'video/mp4', 'mkv': 'video/x-matroska', 'avi': 'video/x-msvideo', 'mov': 'video/quicktime',
+    'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp',
+}
+# Klasy UPnP elementów według typu mediów
+ITEM_CLASSES = {
+    'audio': 'object.item.audioItem.musicTrack',
+    'video': 'object.item.videoItem',
+    'image': 'object.item.imageItem.photo',
+}
+# Flagi DLNA: strumieniowanie, przewijanie po bajtach (Range), protokół DLNA 1.5
+DLNA_FLAGS = 'DLNA.ORG_OP=01;DLNA.ORG_CI=0;DLNA.ORG_FLAGS=01700000000000000000000000000000'
+
+# Drzewo katalogu: id kontenera -> (rodzic, tytuł, klasa UPnP)
+CONTAINERS = OrderedDict([
+    ('0', ('-1', 'HomeHub', 'object.container.storageFolder')),
+    ('audio', ('0', 'Muzyka', 'object.container.storageFolder')),
+    ('video', ('0', 'Wideo', 'object.container.storageFolder')),
+    ('image', ('0', 'Zdjęcia', 'object.container.storageFolder')),
+    ('audio/all', ('audio', 'Wszystkie utwory', 'object.container.storageFolder')),
+    ('audio/artist', ('audio', 'Wykonawcy', 'object.container.storageFolder')),
+    ('audio/album', ('audio', 'Albumy', 'object.container.storageFolder')),
+    ('audio/genre', ('audio', 'Gatunki', 'object.container.storageFolder')),
+    ('video/all', ('video', 'Wszystkie filmy', 'object.container.storageFolder')),
+    ('image/all', ('image', 'Wszystkie zdjęcia', 'object.container.storageFolder')),
+])
+# Kontenery grupujące utwory według kolumny audio_metadata: kolumna, klasa podkontenera, kolejność
+GROUP_CONTAINERS = {
+    'audio/artist': ('artist', 'object.container.person.musicArtist', 'a.album, a.track_number, a.media_id'),
+    'audio/album': ('album', 'object.container.album.musicAlbum', 'a.track_number, a.media_id'),
+    'audio/genre': ('genre', 'object.container.genre.musicGenre', 'm.title, m.id'),
+}
+
+# Kolumny elementu potrzebne do opisu DIDL-Lite
+ITEM_QUERY = '''SELECT m.id, m.title, m.media_type, m.format, m.duration, m.file_size, m.thumbnail_key,
+        a.artist, a.album, a.genre, a.track_number, a.year, a.bitrate, a.sample_rate, v.resolution
+    FROM media_items m
+    LEFT JOIN audio_metadata a ON a.media_id = m.id
+    LEFT JOIN video_metadata v ON v.media_id = m.id'''
+
+DIDL_HEADER = ('<DIDL-Lite xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/" '
+               'xmlns:dc="http://purl.org/dc/elements/1.1/" '
+               'xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" '
+               'xmlns:dlna="urn:schemas-dlna-org:metadata-1-0/">')
+
+# Wyjątek akcji UPnP (kod i opis trafiają do SOAP Fault)
+class UpnpError(Exception):
+    def __init__(self, code, description):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+
+# Stały identyfikator urządzenia (ten sam po restarcie - odbiorniki pamiętają serwer)
+def device_uuid(config):
+    seed = f"homehub-{socket.gethostname()}-{config.get('DATABASE')}-{config.get('DLNA_SERVER_PORT')}"
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, seed))
+
+# Czas w formacie DIDL-Lite (H:MM:SS.000)
+def format_didl_duration(seconds):
+    seconds = int(seconds or 0)
+    return f'{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}.000'
+
+# Odczyt akcji z koperty SOAP: (nazwa akcji, argumenty)
+def parse_soap_request(body):
+    try:
+        envelope = ElementTree.fromstring(body)
+    except ElementTree.ParseError:
+        raise UpnpError(401, 'Invalid Action')
+    soap_body = next((child for child in envelope if child.tag.endswith('}Body')), None)
+    if soap_body is None or not len(soap_body):
+        raise UpnpError(401, 'Invalid Action')
+    action = soap_body[0]
+    name = action.tag.split('}')[-1]
+    return name, {arg.tag.split('}')[-1]: (arg.text or '') for arg in action}
+
+# Koperta SOAP z odpowiedzią akcji
+def soap_response(service, action, values):
+    args = ''.join(f'<{name}>{escape(str(value))}</{name}>' for name, value in values)
+    return ('<?xml version="1.0" encoding="utf-8"?>'
+            '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+            's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body>'
+            f'<u:{action}Response xmlns:u="{service}">{args}</u:{action}Response>'
+            '</s:Body></s:Envelope>')
+
+# Koperta SOAP z błędem UPnP
+def soap_fault(code, description):
+    return ('<?xml version="1.0" encoding="utf-8"?>'
+            '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+            's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body><s:Fault>'
+            '<faultcode>s:Client</faultcode><faultstring>UPnPError</faultstring><detail>'
+            '<UPnPError xmlns="urn:schemas-upnp-org:control-1-0">'
+            f'<errorCode>{code}</errorCode><errorDescription>{escape(description)}</errorDescription>'
+            '</UPnPError></detail></s:Fault></s:Body></s:Envelope>')
+
+# Opis urządzenia (description.xml)
+def device_description(config):
+    friendly_name = config.get('DLNA_FRIENDLY_NAME') or DEFAULT_FRIENDLY_NAME
+    services = ''.join(
+        f'<service><serviceType>{service_type}</serviceType>'
+        f'<serviceId>urn:upnp-org:serviceId:{name}</serviceId>'
+        f'<SCPDURL>/dlna/{name}.xml</SCPDURL>'
+        f'<controlURL>/dlna/control/{name}</controlURL>'
+        f'<eventSubURL>/dlna/event/{name}</eventSubURL></service>'
+        for name, service_type in (('ContentDirectory', CONTENT_DIRECTORY),
+                                   ('ConnectionManager', CONNECTION_MANAGER))
+    )
+    return ('<?xml version="1.0" encoding="utf-8"?>'
+            '<root xmlns="urn:schemas-upnp-org:device-1-0" xmlns:dlna="urn:schemas-dlna-org:device-1-0">'
+            '<specVersion><major>1</major><minor>0</minor></specVersion><device>'
+            f'<deviceType>{DEVICE_TYPE}</deviceType>'
+            f'<friendlyName>{escape(friendly_name)}</friendlyName>'
+            '<manufacturer>HomeHub</manufacturer><modelName>HomeHub Media Server</modelName>'
+            '<modelNumber>1</modelNumber>'
+            '<dlna:X_DLNADOC>DMS-1.50</dlna:X_DLNADOC>'
+            f'<UDN>uuid:{device_uuid(config)}</UDN>'
+            f'<serviceList>{services}</serviceList>'
+            '</device></root>')
+
+# Opisy usług (SCPD) - akcje i zmienne stanu
+def _scpd(actions, variables):
+    action_xml = ''.join(
+        f'<action><name>{name}</name><argumentList>' + ''.join(
+            f'<argument><name>{arg}</name><direction>{direction}</direction>'
+            f'<relatedStateVariable>{variable}</relatedStateVariable></argument>'
+            for arg, direction, variable in args
+        ) + '</argumentList></action>'
+        for name, args in actions
+    )
+    variable_xml = ''.join(
+        f'<stateVariable sendEvents="{"yes" if events else "no"}"><name>{name}</name>'
+        f'<dataType>{data_type}</dataType></stateVariable>'
+        for name, data_type, events in variables
+    )
+    return ('<?xml version="1.0" encoding="utf-8"?><scpd xmlns="urn:schemas-upnp-org:service-1-0">'
+            '<specVersion><major>1</major><minor>0</minor></specVersion>'
+            f'<actionList>{action_xml}</actionList><serviceStateTable>{variable_xml}</serviceStateTable></scpd>')
+
+_BROWSE_RESULT = [('Result', 'out', 'A_ARG_TYPE_Result'), ('NumberReturned', 'out', 'A_ARG_TYPE_Count'),
+                  ('TotalMatches', 'out', 'A_ARG_TYPE_Count'), ('UpdateID', 'out', 'A_ARG_TYPE_UpdateID')]
+
+CONTENT_DIRECTORY_SCPD = _scpd([
+    ('GetSearchCapabilities', [('SearchCaps', 'out', 'SearchCapabilities')]),
+    ('GetSortCapabilities', [('SortCaps', 'out', 'SortCapabilities')]),
+    ('GetSystemUpdateID', [('Id', 'out', 'SystemUpdateID')]),
+    ('Browse', [('ObjectID', 'in', 'A_ARG_TYPE_ObjectID'), ('BrowseFlag', 'in', 'A_ARG_TYPE_BrowseFlag'),
+                ('Filter', 'in', 'A_ARG_TYPE_Filter'), ('StartingIndex', 'in', 'A_ARG_TYPE_Index'),
+                ('RequestedCount', 'in', 'A_ARG_TYPE_Count'), ('SortCriteria', 'in', 'A_ARG_TYPE_SortCriteria')]
+     + _BROWSE_RESULT),
+    ('Search', [('ContainerID', 'in', 'A_ARG_TYPE_ObjectID'), ('SearchCriteria', 'in', 'A_ARG_TYPE_SearchCriteria'),
+                ('Filter', 'in', 'A_ARG_TYPE_Filter'), ('StartingIndex', 'in', 'A_ARG_TYPE_Index'),
+                ('RequestedCount', 'in', 'A_ARG_TYPE_Count'), ('SortCriteria', 'in', 'A_ARG_TYPE_SortCriteria')]
+     + _BROWSE_RESULT),
+], [
+    ('SearchCapabilities', 'string', False), ('SortCapabilities', 'string', False),
+    ('SystemUpdateID', 'ui4', True), ('A_ARG_TYPE_ObjectID', 'string', False),
+    ('A_ARG_TYPE_Result', 'string', False), ('A_ARG_TYPE_SearchCriteria', 'string', False),
+    ('A_ARG_TYPE_BrowseFlag', 'string', False), ('A_ARG_TYPE_Filter', 'string', False),
+    ('A_ARG_TYPE_SortCriteria', 'string', False), ('A_ARG_TYPE_Index', 'ui4', False),
+    ('A_ARG_TYPE_Count', 'ui4', False), ('A_ARG_TYPE_UpdateID', 'ui4', False),
+])
+
+CONNECTION_MANAGER_SCPD = _scpd([
+    ('GetProtocolInfo', [('Source', 'out', 'SourceProtocolInfo'), ('Sink', 'out', 'SinkProtocolInfo')]),
+    ('GetCurrentConnectionIDs', [('ConnectionIDs', 'out', 'CurrentConnectionIDs')]),
+    ('GetCurrentConnectionInfo', [
+        ('ConnectionID', 'in', 'A_ARG_TYPE_ConnectionID'), ('RcsID', 'out', 'A_ARG_TYPE_RcsID'),
+        ('AVTransportID', 'out', 'A_ARG_TYPE_AVTransportID'), ('ProtocolInfo', 'out', 'A_ARG_TYPE_ProtocolInfo'),
+        ('PeerConnectionManager', 'out', 'A_ARG_TYPE_ConnectionManager'),
+        ('PeerConnectionID', 'out', 'A_ARG_TYPE_ConnectionID'), ('Direction', 'out', 'A_ARG_TYPE_Direction'),
+        ('Status', 'out', 'A_ARG_TYPE_ConnectionStatus')]),
+], [
+    ('SourceProtocolInfo', 'string', True), ('SinkProtocolInfo', 'string', True),
+    ('CurrentConnectionIDs', 'string', True), ('A_ARG_TYPE_ConnectionStatus', 'string', False),
+    ('A_ARG_TYPE_ConnectionManager', 'string', False), ('A_ARG_TYPE_Direction', 'string', False),
+    ('A_ARG_TYPE_ProtocolInfo', 'string', False), ('A_ARG_TYPE_ConnectionID', 'i4', False),
+    ('A_ARG_TYPE_AVTransportID', 'i4', False), ('A_ARG_TYPE_RcsID', 'i4', False),
+])
+
+# Lista formatów udostępnianych przez serwer (GetProtocolInfo)
+SOURCE_PROTOCOL_INFO = ','.join(f'http-get:*:{mime}:*' for mime in sorted(set(DLNA_MIME_TYPES.values())))
+
+# Katalog treści (usługa ContentDirectory) oparty bezpośrednio na media_items
+class ContentDirectory:
+    """
+    Browse i Search odpowiadają na podstawie media_items, audio_metadata i video_metadata -
+    bez drugiego indeksu plików. Wygenerowane odpowiedzi DIDL-Lite trafiają do pamięci
+    podręcznej LRU; klucz zawiera SystemUpdateID (licznik media_updates utrzymywany przez
+    wyzwalacze), więc każda zmiana biblioteki unieważnia wpisy bez jawnego czyszczenia.
+
+    Duże kontenery ("Wszystkie utwory") stronicowane są kursorem (title, id): po stronie
+    kończącej się na indeksie N zapamiętywany jest kursor dla StartingIndex = N, więc
+    kolejne strony przeglądane przez telewizor nie używają OFFSET.
+    """
+    def __init__(self, cache_entries=DEFAULT_CACHE_ENTRIES, page_size=DEFAULT_PAGE_SIZE):
+        self.cache_entries = cache_entries
+        self.page_size = page_size
+        self._cache = OrderedDict()
+        self._cursors = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'browse': 0, 'search': 0, 'cache_hits': 0, 'cache_misses': 0, 'keyset_pages': 0,
+                      'offset_pages': 0}
+
+    @staticmethod
+    def update_id(db):
+        row = db.execute("SELECT value FROM stats_counters WHERE name = 'media_updates'").fetchone()
+        return row[0] if row else 0
+
+    def _cache_get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.stats['cache_misses'] += 1
+                return None
+            self._cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return entry
+
+    def _cache_put(self, key, entry):
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def _page_count(self, requested):
+        # RequestedCount = 0 oznacza "wszystko" - odbiorca i tak stronicuje według TotalMatches
+        return min(requested, self.page_size) if requested > 0 else self.page_size
+
+    def browse(self, db, object_id, flag, start, requested, base_url):
+        """Zwraca (DIDL-Lite, liczba zwróconych, liczba wszystkich, UpdateID)"""
+        self.stats['browse'] += 1
+        if flag not in ('BrowseMetadata', 'BrowseDirectChildren'):
+            raise UpnpError(402, 'Invalid Args')
+        update_id = self.update_id(db)
+        count = self._page_count(requested)
+        key = ('browse', update_id, base_url, object_id, flag, start, count)
+        entry = self._cache_get(key)
+        if entry is None:
+            if flag == 'BrowseMetadata':
+                entries, total = [self._metadata(db, object_id, base_url)], 1
+            else:
+                entries, total = self._children(db, update_id, object_id, start, count, base_url)
+            entry = (DIDL_HEADER + ''.join(entries) + '</DIDL-Lite>', len(entries), total)
+            self._cache_put(key, entry)
+        return entry + (update_id,)
+
+    def search(self, db, container_id, criteria, start, requested, base_url):
+        self.stats['search'] += 1
+        update_id = self.update_id(db)
+        count = self._page_count(requested)
+        key = ('search', update_id, base_url, container_id, criteria, start, count)
+        entry = self._cache_get(key)
+        if entry is None:
+            entries, total = self._search(db, container_id, criteria, start, count, base_url)
+            entry = (DIDL_HEADER + ''.join(entries) + '</DIDL-Lite>', len(entries), total)
+            self._cache_put(key, entry)
+        return entry + (update_id,)
+
+    def _metadata(self, db, object_id, base_url):
+        if object_id.startswith('m/'):
+            rows = self._load_items(db, [self._media_id(object_id)])
+            if not rows:
+                raise UpnpError(701, 'No such object')
+            return self._item_xml(rows[0], f"{rows[0]['media_type']}/all", base_url)
+        if object_id in CONTAINERS:
+            parent, _, _ = CONTAINERS[object_id]
+            return self._container_xml(db, object_id, parent)
+        group, value = self._split_group(object_id)
+        column, upnp_class, _ = GROUP_CONTAINERS[group]
+        total = db.execute(f'SELECT COUNT(*) FROM audio_metadata WHERE {column} = ?', (value,)).fetchone()[0]
+        if not total:
+            raise UpnpError(701, 'No such object')
+        return self._group_xml(group, value, upnp_class, total)
+
+    def _children(self, db, update_id, object_id, start, count, base_url):
+        if object_id in GROUP_CONTAINERS:
+            return self._group_list(db, object_id, start, count)
+        if object_id.endswith('/all') and object_id in CONTAINERS:
+            return self._type_items(db, update_id, object_id, start, count, base_url)
+        if object_id in CONTAINERS:
+            children = [cid for cid, (parent, _, _) in CONTAINERS.items() if parent == object_id]
+            return [self._container_xml(db, cid, object_id) for cid in children[start:start + count]], len(children)
+        if object_id.startswith('m/'):
+            return [], 0
+        group, value = self._split_group(object_id)
+        column, _, order = GROUP_CONTAINERS[group]
+        total = db.execute(f'SELECT COUNT(*) FROM audio_metadata WHERE {column} = ?', (value,)).fetchone()[0]
+        ids = [row[0] for row in db.execute(
+            f'SELECT m.id FROM audio_metadata a CROSS JOIN media_items m ON m.id = a.media_id '
+            f'WHERE a.{column} = ? ORDER BY {order} LIMIT ? OFFSET ?',
+            (value, count, start)
+        ).fetchall()]
+        return [self._item_xml(row, object_id, base_url) for row in self._load_items(db, ids)], total
+
+    def _type_items(self, db, update_id, object_id, start, count, base_url):
+        media_type = object_id.split('/')[0]
+        total_row = db.execute('SELECT value FROM stats_counters WHERE name = ?', (f'media_{media_type}',)).fetchone()
+        total = total_row[0] if total_row else 0
+        cursor_key = (update_id, object_id, start)
+        with self._lock:
+            cursor = self._cursors.get(cursor_key)
+        if start == 0:
+            cursor = ('', 0)
+        if cursor is not None:
+            self.stats['keyset_pages'] += 1
+            rows = db.execute(
+                f'{ITEM_QUERY} WHERE m.media_type = ? AND (m.title, m.id) > (?, ?) ORDER BY m.title, m.id LIMIT ?',
+                (media_type, cursor[0], cursor[1], count)
+            ).fetchall()
+        else:
+            # Skok w środek listy (np. przewinięcie na literę) - jednorazowo OFFSET
+            self.stats['offset_pages'] += 1
+            rows = db.execute(
+                f'{ITEM_QUERY} WHERE m.media_type = ? ORDER BY m.title, m.id LIMIT ? OFFSET ?',
+                (media_type, count, start)
+            ).fetchall()
+        if rows:
+            with self._lock:
+                self._cursors[(update_id, object_id, start + len(rows))] = (rows[-1]['title'], rows[-1]['id'])
+                while len(self._cursors) > self.cache_entries:
+                    self._cursors.popitem(last=False)
+        return [self._item_xml(row, object_id, base_url) for row in rows], total
+
+    def _group_list(self, db, group, start, count):
+        column, upnp_class, _ = GROUP_CONTAINERS[group]
+        total = db.execute(
+            f"SELECT COUNT(DISTINCT {column}) FROM audio_metadata WHERE {column} > ''"
+        ).fetchone()[0]
+        rows = db.execute(
+            f"SELECT {column}, COUNT(*) FROM audio_metadata WHERE {column} > '' "
+            f"GROUP BY {column} ORDER BY {column} LIMIT ? OFFSET ?",
+            (count, start)
+        ).fetchall()
+        return [self._group_xml(group, row[0], upnp_class, row[1]) for row in rows], total
+
+    def _search(self, db, container_id, criteria, start, count, base_url):
+        """
+        Obsługiwany jest podzbiór składni SearchCriteria używany przez odbiorniki:
+        upnp:class derivedfrom/= "object.item.audioItem" (typ mediów) oraz
+        dc:title/upnp:artist/upnp:album/upnp:genre contains "tekst" - tekst trafia
+        do indeksu FTS5. Wyszukiwanie kontenerów (np. albumów) zwraca pustą listę.
+        Ranking obejmuje wszystkie dopasowania, a TotalMatches to ich pełna liczba.
+        """
+        media_type = container_id.split('/')[0] if container_id.split('/')[0] in ITEM_CLASSES else None
+        classes = re.findall(r'upnp:class\s+(?:derivedfrom|=)\s+"([^"]*)"', criteria)
+        if classes:
+            types = {media_type for media_type, upnp_class in ITEM_CLASSES.items()
+                     if any(upnp_class.startswith(c) or c.startswith(upnp_class) for c in classes)}
+            if not types or (media_type and media_type not in types):
+                return [], 0
+            if len(types) == 1:
+                media_type = types.pop()
+        terms = re.findall(r'(?:dc:title|dc:creator|upnp:artist|upnp:album|upnp:genre)\s+contains\s+'
+                           r'"((?:[^"\\]|\\.)*)"', criteria)
+        terms = list(dict.fromkeys(term.replace('\\"', '"') for term in terms))
+
+        if not terms:
+            if media_type is None:
+                return [], 0
+            return self._type_items(db, self.update_id(db), f'{media_type}/all', start, count, base_url)
+
+        text = ' '.join(terms)
+        total = count_search_matches(db, text, media_type)
+        if start >= total:
+            return [], total
+        ids = [media_id for media_id, _ in search_media_page(db, text, media_type, start, count)]
+        rows = self._load_items(db, ids)
+        return [self._item_xml(row, f"{row['media_type']}/all", base_url) for row in rows], total
+
+    @staticmethod
+    def _load_items(db, ids):
+        if not ids:
+            return []
+        placeholders = ', '.join('?' * len(ids))
+        rows = {row['id']: row for row in db.execute(f'{ITEM_QUERY} WHERE m.id IN ({placeholders})', ids)}
+        return [rows[media_id] for media_id in ids if media_id in rows]
+
+    @staticmethod
+    def _media_id(object_id):
+        try:
+            return int(object_id[2:])
+        except ValueError:
+            raise UpnpError(701, 'No such object')
+
+    @staticmethod
+    def _split_group(object_id):
+        group, _, value = object_id.rpartition('/')
+        if group not in GROUP_CONTAINERS or not value:
+            raise UpnpError(701, 'No such object')
+        return group, unquote(value)
+
+    def _container_xml(self, db, object_id, parent):
+        _, title, upnp_class = CONTAINERS[object_id]
+        if object_id.endswith('/all'):
+            row = db.execute('SELECT value FROM stats_counters WHERE name = ?',
+                             (f"media_{object_id.split('/')[0]}",)).fetchone()
+            child_count = row[0] if row else 0
+        else:
+            child_count = sum(1 for p, _, _ in CONTAINERS.values() if p == object_id)
+        return (f'<container id={quoteattr(object_id)} parentID={quoteattr(parent)} restricted="1" '
+                f'searchable="1" childCount="{child_count}"><dc:title>{escape(title)}</dc:title>'
+                f'<upnp:class>{upnp_class}</upnp:class></container>')
+
+    @staticmethod
+    def _group_xml(group, value, upnp_class, child_count):
+        object_id = f"{group}/{quote(value, safe='')}"
+        return (f'<container id={quoteattr(object_id)} parentID={quoteattr(group)} restricted="1" '
+                f'childCount="{child_count}"><dc:title>{escape(value)}</dc:title>'
+                f'<upnp:class>{upnp_class}</upnp:class></container>')
+
+    @staticmethod
+    def _item_xml(row, parent, base_url):
+        media_type = row['media_type']
+        fmt = (row['format'] or '').lower()
+        mime = DLNA_MIME_TYPES.get(fmt, f'{media_type}/{fmt or "octet-stream"}')
+        parts = [f'<item id="m/{row["id"]}" parentID={quoteattr(parent)} restricted="1">',
+                 f'<dc:title>{escape(row["title"] or "")}</dc:title>',
+                 f'<upnp:class>{ITEM_CLASSES.get(media_type, "object.item")}</upnp:class>']
+        if row['artist']:
+            parts.append(f'<upnp:artist>{escape(row["artist"])}</upnp:artist>'
+                         f'<dc:creator>{escape(row["artist"])}</dc:creator>')
+        if row['album']:
+            parts.append(f'<upnp:album>{escape(row["album"])}</upnp:album>')
+        if row['genre']:
+            parts.append(f'<upnp:genre>{escape(row["genre"])}</upnp:genre>')
+        if row['track_number']:
+            parts.append(f'<upnp:originalTrackNumber>{int(row["track_number"])}</upnp:originalTrackNumber>')
+        if row['year']:
+            parts.append(f'<dc:date>{int(row["year"]):04d}-01-01</dc:date>')
+        if row['thumbnail_key']:
+            parts.append(f'<upnp:albumArtURI dlna:profileID="JPEG_TN">{base_url}dlna/thumbnail/{row["id"]}'
+                         f'</upnp:albumArtURI>')
+
+        attributes = [f'protocolInfo="http-get:*:{mime}:{DLNA_FLAGS}"']
+        if row['file_size']:
+            attributes.append(f'size="{int(row["file_size"])}"')
+        if row['duration'] and media_type in ('audio', 'video'):
+            attributes.append(f'duration="{format_didl_duration(row["duration"])}"')
+        if row['bitrate']:
+            # bitrate w DIDL-Lite podawany jest w bajtach na sekundę
+            attributes.append(f'bitrate="{int(row["bitrate"]) // 8}"')
+        if row['sample_rate']:
+            attributes.append(f'sampleFrequency="{int(row["sample_rate"])}"')
+        if row['resolution'] and re.match(r'^\d+x\d+$', row['resolution']):
+            attributes.append(f'resolution="{row["resolution"]}"')
+        parts.append(f'<res {" ".join(attributes)}>{base_url}dlna/media/{row["id"]}</res></item>')
+        return ''.join(parts)
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, cache_entries=len(self._cache), cursors=len(self._cursors))
+
+# Odpowiadanie na wyszukiwania SSDP i ogłaszanie obecności serwera w sieci lokalnej
+class SsdpResponder:
+    def __init__(self, device_id, port, max_age=DEFAULT_MAX_AGE, host=None):
+        self.device_id = device_id
+        self.port = port
+        self.max_age = max_age
+        self.host = host
+        self._socket = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self.stats = {'searches': 0, 'responses': 0, 'notifications': 0}
+
+    def targets(self):
+        """Pary (NT/ST, USN) ogłaszane przez serwer"""
+        udn = f'uuid:{self.device_id}'
+        return [('upnp:rootdevice', f'{udn}::upnp:rootdevice'), (udn, udn),
+                (DEVICE_TYPE, f'{udn}::{DEVICE_TYPE}'),
+                (CONTENT_DIRECTORY, f'{udn}::{CONTENT_DIRECTORY}'),
+                (CONNECTION_MANAGER, f'{udn}::{CONNECTION_MANAGER}')]
+
+    def location(self, peer=SSDP_ADDR):
+        # Adres interfejsu, przez który widzi nas odbiorca (bez wysyłania pakietu)
+        host = self.host
+        if not host:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                try:
+                    probe.connect((peer, SSDP_PORT))
+                    host = probe.getsockname()[0]
+                except OSError:
+                    host = '127.0.0.1'
+        return f'http://{host}:{self.port}/dlna/description.xml'
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except OSError:
+                pass
+        try:
+            sock.bind(('', SSDP_PORT))
+            membership = struct.pack('4s4s', socket.inet_aton(SSDP_ADDR), socket.inet_aton('0.0.0.0'))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(1.0)
+        self._socket = sock
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='dlna-ssdp', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._socket is None:
+            return
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=3)
+        try:
+            self._notify('ssdp:byebye')
+        except OSError:
+            pass
+        self._socket.close()
+        self._socket = None
+
+    def _run(self):
+        next_notify = 0
+        while not self._stopped.is_set():
+            # Ogłoszenie co połowę czasu ważności (CACHE-CONTROL max-age)
+            if time.time() >= next_notify:
+                try:
+                    self._notify('ssdp:alive')
+                except OSError as e:
+                    print(f"Błąd ogłoszenia SSDP: {str(e)}")
+                next_notify = time.time() + self.max_age / 2
+            try:
+                data, peer = self._socket.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stopped.is_set():
+                    break
+                continue
+            try:
+                self._handle(data, peer)
+            except Exception as e:
+                print(f"Błąd obsługi zapytania SSDP od {peer[0]}: {str(e)}")
+
+    def _handle(self, data, peer):
+        lines = data.decode('utf-8', 'replace').split('\r\n')
+        if not lines[0].upper().startswith('M-SEARCH'):
+            return
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().upper()] = value.strip()
+        if headers.get('MAN', '').strip('"') != 'ssdp:discover':
+            return
+        self.stats['searches'] += 1
+        search_target = headers.get('ST', '')
+        location = self.location(peer[0])
+        for target, usn in self.targets():
+            if search_target in ('ssdp:all', target):
+                response = ('HTTP/1.1 200 OK\r\n'
+                            f'CACHE-CONTROL: max-age={self.max_age}\r\n'
+                            f'DATE: {formatdate(usegmt=True)}\r\n'
+                            'EXT:\r\n'
+                            f'LOCATION: {location}\r\n'
+                            f'SERVER: {SERVER_STRING}\r\n'
+                            f'ST: {target}\r\n'
+                            f'USN: {usn}\r\n\r\n')
+                self._socket.sendto(response.encode(), peer)
+                self.stats['responses'] += 1
+
+    def _notify(self, nts):
+        location = self.location()
+        for target, usn in self.targets():
+            message = ('NOTIFY * HTTP/1.1\r\n'
+                       f'HOST: {SSDP_ADDR}:{SSDP_PORT}\r\n'
+                       f'CACHE-CONTROL: max-age={self.max_age}\r\n'
+                       f'LOCATION: {location}\r\n'
+                       f'NT: {target}\r\n'
+                       f'NTS: {nts}\r\n'
+                       f'SERVER: {SERVER_STRING}\r\n'
+                       f'USN: {usn}\r\n\r\n')
+            self._socket.sendto(message.encode(), (SSDP_ADDR, SSDP_PORT))
+            self.stats['notifications'] += 1
+
+# Przepuszcza do aplikacji tylko ścieżki /dlna/ i oznacza żądania przyjęte na porcie DLNA
+class DlnaWsgiFilter:
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        if not environ.get('PATH_INFO', '').startswith('/dlna/'):
+            start_response('404 Not Found', [('Content-Type', 'text/plain'), ('Content-Length', '0')])
+            return [b'']
+        environ[DLNA_ENVIRON_KEY] = True
+        return self.app(environ, start_response)
+
+# Wbudowany serwer multimediów UPnP/DLNA
+class DlnaServer:
+    """
+    Serwer HTTP na porcie DLNA_SERVER_PORT (w wątku, obok aplikacji) obsługuje opis
+    urządzenia, usługi ContentDirectory i ConnectionManager oraz pliki mediów; SSDP
+    odpowiada na wyszukiwania odbiorników. Katalog budowany jest z media_items -
+    zastępuje zewnętrzny minidlna i jego drugi indeks plików.
+    """
+    def __init__(self):
+        self._app = None
+        self.enabled = False
+        self.port = None
+        self.content_directory = ContentDirectory()
+        self.ssdp = None
+        self._http = None
+        self._thread = None
+
+    def init_app(self, app):
+        self._app = app
+        config = app.config
+        self.enabled = config.get('DLNA_ENABLED', False)
+        self.port = config.get('DLNA_SERVER_PORT', 8200)
+        self.content_directory = ContentDirectory(
+            config.get('DLNA_CACHE_ENTRIES', DEFAULT_CACHE_ENTRIES),
+            config.get('DLNA_PAGE_SIZE', DEFAULT_PAGE_SIZE),
+        )
+
+    def start(self):
+        """Uruchamia serwer w tle; nie blokuje startu aplikacji. Zwraca True, jeśli działa."""
+        if not self.enabled or self._thread is not None:
+            return self._thread is not None
+        from werkzeug.serving import make_server
+
+        config = self._app.config
+        try:
+            self._http = make_server(config.get('DLNA_BIND', '0.0.0.0'), self.port,
+                                     DlnaWsgiFilter(self._app), threaded=True)
+        except (OSError, SystemExit) as e:
+            print(f"Nie można uruchomić serwera DLNA na porcie {self.port}: {str(e)}")
+            self._http = None
+            return False
+        self._thread = threading.Thread(target=self._http.serve_forever, name='dlna-http', daemon=True)
+        self._thread.start()
+
+        self.ssdp = SsdpResponder(device_uuid(config), self.port,
+                                  config.get('DLNA_MAX_AGE', DEFAULT_MAX_AGE), config.get('DLNA_HOST'))
+        try:
+            self.ssdp.start()
+        except OSError as e:
+            # Bez SSDP serwer działa, ale odbiorniki muszą znać jego adres
+            print(f"Nie można uruchomić SSDP: {str(e)}")
+            self.ssdp = None
+        atexit.register(self.stop)
+        return True
+
+    def stop(self):
+        if self.ssdp is not None:
+            self.ssdp.stop()
+            self.ssdp = None
+        if self._http is not None:
+            self._http.shutdown()
+            self._http = None
+            self._thread = None
+
+    def status(self):
+        return {
+            'running': self._thread is not None,
+            'port': self.port,
+            'ssdp': dict(self.ssdp.stats) if self.ssdp else None,
+            'content_directory': self.content_directory.metrics(),
+        }
+
+# Globalny serwer DLNA
+dlna_server = DlnaServer()
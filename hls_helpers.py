@@ -0,0 +1,447 @@
+# hls_helpers.py
+import math
+import os
+import re
+import shutil
+import signal
+import subprocess
+import threading
+import time
+
+from cache_helpers import evict_lru, touch_entry, source_fingerprint
+from media_helpers import TRANSCODE_RESOLUTIONS, with_priority
+
+# Domyślne ustawienia strumieniowania HLS
+DEFAULT_SEGMENT_SECONDS = 6
+# Ile segmentów przed ostatnio pobranym może przygotować FFmpeg, zanim zostanie wstrzymany
+DEFAULT_AHEAD_SEGMENTS = 5
+# Żądanie segmentu dalej niż tyle segmentów przed producentem uruchamia FFmpeg od nowa (przewinięcie)
+SEEK_GAP_SEGMENTS = 3
+# Po tylu sekundach bez żądań odtwarzacz uznawany jest za nieaktywny
+DEFAULT_IDLE_TIMEOUT = 30
+DEFAULT_SEGMENT_WAIT = 30
+DEFAULT_MAX_SESSIONS = 4
+DEFAULT_CACHE_MAX_BYTES = 4 * 1024 * 1024 * 1024
+AUDIO_BITRATE = 128000
+MONITOR_INTERVAL = 2
+EVICT_INTERVAL = 60
+
+# Liczba bitów na sekundę z zapisu FFmpeg ('2.5M', '800k')
+def _parse_bitrate(value):
+    multiplier = {'k': 1000, 'M': 1000000}.get(value[-1], 1)
+    return int(float(value.rstrip('kM')) * multiplier)
+
+# Drabinka jakości HLS na podstawie ustawień transkodowania
+def hls_ladder(source_height=None):
+    """
+    Zwraca listę (rozdzielczość, wysokość, pasmo w b/s). Pomijane są poziomy
+    wyższe niż źródło - z wyjątkiem najniższego, który jest zawsze dostępny.
+    """
+    ladder = []
+    for resolution, params in TRANSCODE_RESOLUTIONS.items():
+        height = int(resolution.rstrip('p'))
+        bandwidth = _parse_bitrate(params[params.index('-b:v') + 1]) + AUDIO_BITRATE
+        ladder.append((resolution, height, bandwidth))
+    ladder.sort(key=lambda item: item[1])
+    if source_height:
+        ladder = [rung for rung in ladder if rung[1] <= source_height] or ladder[:1]
+    return ladder
+
+# Playlista główna (wybór jakości); query dołączane jest do adresów playlist segmentów
+def build_master_playlist(ladder, aspect=16 / 9, query=''):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for resolution, height, bandwidth in ladder:
+        width = int(round(height * aspect / 2)) * 2
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={width}x{height}')
+        lines.append(f'{resolution}/index.m3u8{query}')
+    return '\n'.join(lines) + '\n'
+
+# Liczba segmentów dla danego czasu trwania
+def segment_count(duration, segment_seconds=DEFAULT_SEGMENT_SECONDS):
+    return max(1, math.ceil(duration / segment_seconds))
+
+# Playlista segmentów (VOD) - znana z góry, bo segmenty mają stałą długość
+def build_media_playlist(duration, segment_seconds=DEFAULT_SEGMENT_SECONDS):
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{math.ceil(segment_seconds)}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+    ]
+    total = segment_count(duration, segment_seconds)
+    for number in range(total):
+        length = min(segment_seconds, duration - number * segment_seconds) if duration else segment_seconds
+        lines.append(f'#EXTINF:{max(length, 0.001):.3f},')
+        lines.append(f'{number}.ts')
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+# Sesja HLS - segmenty jednego pliku w jednej jakości i proces FFmpeg, który je tworzy
+class HlsSession:
+    def __init__(self, media_id, input_file, resolution, duration, cache_dir, segment_seconds,
+                 ahead_segments, threads=None, niceness=None):
+        self.media_id = media_id
+        self.input_file = input_file
+        self.resolution = resolution
+        self.duration = duration
+        self.cache_dir = cache_dir
+        self.segment_seconds = segment_seconds
+        self.ahead_segments = ahead_segments
+        self.threads = threads
+        self.niceness = niceness
+        # Sesja rozgrzewająca początek pliku przed odtworzeniem (HlsManager.warm)
+        self.prefetch = False
+        self.total_segments = segment_count(duration, segment_seconds)
+        self.process = None
+        self.work_dir = None
+        self.start_segment = 0
+        self.next_segment = 0
+        self.last_requested = 0
+        self.last_access = time.time()
+        self.paused = False
+        self.error = None
+        self.stats = {'produced': 0, 'cache_hits': 0, 'restarts': 0}
+        self._cond = threading.Condition()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def segment_path(self, number):
+        return os.path.join(self.cache_dir, f'{number:05d}.ts')
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def get_segment(self, number, timeout):
+        """Zwraca ścieżkę segmentu, czekając najwyżej timeout sekund na jego utworzenie"""
+        deadline = time.time() + timeout
+        with self._cond:
+            self.last_access = time.time()
+            self.last_requested = number
+            path = self.segment_path(number)
+            if os.path.exists(path):
+                self.stats['cache_hits'] += 1
+                self._throttle()
+                return path
+
+            # Producent dotrze do segmentu wkrótce - w przeciwnym razie start od tego miejsca
+            in_range = self.start_segment <= number <= self.next_segment + SEEK_GAP_SEGMENTS
+            if not (self.running and in_range):
+                self._start(number)
+            self._throttle()
+
+            while not os.path.exists(path):
+                remaining = deadline - time.time()
+                if remaining <= 0 or (not self.running and not os.path.exists(path)):
+                    return path if os.path.exists(path) else None
+                self._cond.wait(min(remaining, 1.0))
+            return path
+
+    def start(self, number=0):
+        """Uruchamia produkcję od segmentu number bez czekania na wynik"""
+        with self._cond:
+            self.last_access = time.time()
+            self.last_requested = number
+            self._start(number)
+
+    def wait_for(self, number, timeout, cancel_event=None):
+        """Czeka na segment bez zmiany pozycji odtwarzania; zwraca True, jeśli segment powstał"""
+        deadline = time.time() + timeout
+        path = self.segment_path(number)
+        with self._cond:
+            while not os.path.exists(path):
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.running or (cancel_event is not None and cancel_event.is_set()):
+                    return os.path.exists(path)
+                self._cond.wait(min(remaining, 0.5))
+            return True
+
+    def _command(self, start_segment):
+        start = start_segment * self.segment_seconds
+        params = TRANSCODE_RESOLUTIONS[self.resolution]
+        command = [
+            'ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error',
+            '-ss', f'{start:.3f}', '-i', self.input_file,
+            '-map', '0:v:0', '-map', '0:a:0?',
+        ]
+        command.extend(params)
+        command.extend([
+            '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+            # Klatki kluczowe dokładnie na granicach segmentów - segmenty z różnych uruchomień pasują do siebie
+            '-force_key_frames', f'expr:gte(t,n_forced*{self.segment_seconds})',
+            '-sc_threshold', '0', '-g', '100000',
+            '-c:a', 'aac', '-b:a', str(AUDIO_BITRATE), '-ac', '2',
+        ])
+        if self.threads:
+            command.extend(['-threads', str(self.threads)])
+        command.extend([
+            '-output_ts_offset', f'{start:.3f}',
+            '-f', 'segment', '-segment_format', 'mpegts',
+            '-segment_time', str(self.segment_seconds),
+            '-segment_start_number', str(start_segment),
+            # Zakończone segmenty zgłaszane są na stdout
+            '-segment_list', 'pipe:1', '-segment_list_type', 'csv',
+            os.path.join(self.work_dir, 'seg_%05d.ts.part'),
+        ])
+        return command
+
+    def _start(self, start_segment):
+        self._stop_process()
+        self.work_dir = os.path.join(self.cache_dir, f'.work-{start_segment}-{int(time.time() * 1000)}')
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.start_segment = self.next_segment = start_segment
+        self.paused = False
+        self.error = None
+        self.stats['restarts'] += 1
+
+        process = subprocess.Popen(with_priority(self._command(start_segment), self.niceness),
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        self.process = process
+        threading.Thread(target=self._collect, args=(process, self.work_dir),
+                         name=f'hls-{self.media_id}-{self.resolution}', daemon=True).start()
+
+    def _collect(self, process, work_dir):
+        # Przeniesienie zakończonych segmentów do pamięci podręcznej
+        for line in process.stdout:
+            name = line.strip().split(',')[0]
+            match = re.match(r'seg_(\d+)\.ts\.part$', name)
+            if not match:
+                continue
+            number = int(match.group(1))
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                os.replace(os.path.join(work_dir, name), self.segment_path(number))
+            except OSError:
+                continue
+            with self._cond:
+                if self.process is process:
+                    self.next_segment = number + 1
+                    self.stats['produced'] += 1
+                    self._throttle()
+                self._cond.notify_all()
+
+        stderr = process.stderr.read()
+        process.wait()
+        with self._cond:
+            if self.process is process and process.returncode not in (0, -signal.SIGTERM):
+                self.error = stderr[-2000:]
+                print(f"Błąd HLS dla {self.input_file}: {self.error}")
+            self._cond.notify_all()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _throttle(self):
+        # Wstrzymanie FFmpeg, gdy wyprzedza odtwarzacz o więcej niż ahead_segments
+        if not self.running:
+            return
+        too_far = self.next_segment > self.last_requested + self.ahead_segments
+        if too_far and not self.paused:
+            self.process.send_signal(signal.SIGSTOP)
+            self.paused = True
+        elif not too_far and self.paused:
+            self.process.send_signal(signal.SIGCONT)
+            self.paused = False
+
+    def _stop_process(self):
+        if self.running:
+            if self.paused:
+                self.process.send_signal(signal.SIGCONT)
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        self.paused = False
+
+    def stop(self):
+        with self._cond:
+            self._stop_process()
+            self._cond.notify_all()
+
+    def idle_for(self):
+        return time.time() - self.last_access
+
+    def to_dict(self):
+        return {
+            'media_id': self.media_id,
+            'resolution': self.resolution,
+            'running': self.running,
+            'paused': self.paused,
+            'prefetch': self.prefetch,
+            'start_segment': self.start_segment,
+            'next_segment': self.next_segment,
+            'last_requested': self.last_requested,
+            'total_segments': self.total_segments,
+            'idle_seconds': round(self.idle_for(), 1),
+            'stats': dict(self.stats),
+        }
+
+# Menedżer sesji HLS i pamięci podręcznej segmentów
+class HlsManager:
+    def __init__(self):
+        self.root = None
+        self.segment_seconds = DEFAULT_SEGMENT_SECONDS
+        self.ahead_segments = DEFAULT_AHEAD_SEGMENTS
+        self.idle_timeout = DEFAULT_IDLE_TIMEOUT
+        self.segment_wait = DEFAULT_SEGMENT_WAIT
+        self.max_sessions = DEFAULT_MAX_SESSIONS
+        self.max_bytes = DEFAULT_CACHE_MAX_BYTES
+        self.threads = None
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._monitor = None
+        self._last_evict = 0
+        self.stats = {'evicted': 0, 'evicted_bytes': 0, 'idle_stops': 0,
+                      'warm_started': 0, 'warm_skipped': 0, 'warm_takeovers': 0}
+
+    def init_app(self, app):
+        config = app.config
+        self.root = os.path.join(config['TRANSCODE_DIR'], 'hls')
+        self.segment_seconds = config.get('HLS_SEGMENT_SECONDS', DEFAULT_SEGMENT_SECONDS)
+        self.ahead_segments = config.get('HLS_AHEAD_SEGMENTS', DEFAULT_AHEAD_SEGMENTS)
+        self.idle_timeout = config.get('HLS_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT)
+        self.max_sessions = config.get('HLS_MAX_SESSIONS', DEFAULT_MAX_SESSIONS)
+        self.max_bytes = config.get('HLS_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)
+        cores = os.cpu_count() or 2
+        self.threads = max(1, cores // self.max_sessions)
+
+    def cache_dir(self, media_id, fingerprint, resolution):
+        return os.path.join(self.root, str(media_id), fingerprint, resolution)
+
+    def media_playlist(self, duration):
+        return build_media_playlist(duration, self.segment_seconds)
+
+    def get_segment(self, media_id, input_file, resolution, duration, number):
+        """
+        Zwraca ścieżkę gotowego segmentu (z pamięci podręcznej lub świeżo utworzonego)
+        albo None, jeśli segmentu nie udało się przygotować w czasie segment_wait.
+        """
+        if resolution not in TRANSCODE_RESOLUTIONS:
+            raise ValueError(f"Nieobsługiwana rozdzielczość: {resolution}")
+
+        fingerprint = source_fingerprint(input_file)
+        key = (media_id, resolution, fingerprint)
+        cache_dir = self.cache_dir(media_id, fingerprint, resolution)
+
+        # Segment w pamięci podręcznej nie wymaga sesji
+        path = os.path.join(cache_dir, f'{number:05d}.ts')
+        with self._lock:
+            session = self._sessions.get(key)
+        if session is None and os.path.exists(path):
+            touch_entry(path)
+            return path
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                self._limit_sessions()
+                session = HlsSession(media_id, input_file, resolution, duration, cache_dir,
+                                     self.segment_seconds, self.ahead_segments, self.threads)
+                self._sessions[key] = session
+            elif session.prefetch:
+                # Odtwarzacz przejmuje sesję rozgrzewającą - dalej działa jak zwykła
+                # (uruchomiony już proces zachowuje obniżony priorytet do końca)
+                session.prefetch = False
+                session.ahead_segments = self.ahead_segments
+                session.niceness = None
+                self.stats['warm_takeovers'] += 1
+            self._ensure_monitor()
+
+        path = session.get_segment(number, self.segment_wait)
+        if path:
+            touch_entry(path)
+        return path
+
+    def warm(self, media_id, input_file, resolution, duration, segments=2, cancel_event=None,
+             niceness=None):
+        """
+        Przygotowuje pierwsze segmenty pliku, zanim odtwarzacz o nie poprosi
+        (np. następny utwór z playlisty). Nie zajmuje miejsca aktywnego odtwarzacza:
+        przy limicie sesji nic nie robi. Po przygotowaniu segmentów lub ustawieniu
+        cancel_event sesja jest zatrzymywana, chyba że przejął ją odtwarzacz.
+        Zwraca True, jeśli segmenty są w pamięci podręcznej.
+        """
+        if resolution not in TRANSCODE_RESOLUTIONS:
+            raise ValueError(f"Nieobsługiwana rozdzielczość: {resolution}")
+
+        fingerprint = source_fingerprint(input_file)
+        key = (media_id, resolution, fingerprint)
+        cache_dir = self.cache_dir(media_id, fingerprint, resolution)
+        count = min(segments, segment_count(duration, self.segment_seconds))
+        if all(os.path.exists(os.path.join(cache_dir, f'{number:05d}.ts')) for number in range(count)):
+            return True
+
+        with self._lock:
+            if key in self._sessions:
+                return True
+            if len(self._sessions) >= self.max_sessions:
+                self.stats['warm_skipped'] += 1
+                return False
+            # Producent zatrzyma się (SIGSTOP) po count segmentach
+            session = HlsSession(media_id, input_file, resolution, duration, cache_dir,
+                                 self.segment_seconds, count - 1, self.threads, niceness)
+            session.prefetch = True
+            self._sessions[key] = session
+            self.stats['warm_started'] += 1
+            self._ensure_monitor()
+
+        session.start(0)
+        ready = session.wait_for(count - 1, self.segment_wait * count, cancel_event)
+
+        with self._lock:
+            if session.prefetch:
+                session.stop()
+                if self._sessions.get(key) is session:
+                    del self._sessions[key]
+        return ready
+
+    def _limit_sessions(self):
+        # Przy limicie sesji zatrzymywana jest najdawniej używana
+        while len(self._sessions) >= self.max_sessions:
+            key, session = max(self._sessions.items(), key=lambda item: item[1].idle_for())
+            session.stop()
+            del self._sessions[key]
+
+    def _ensure_monitor(self):
+        if self._monitor is None or not self._monitor.is_alive():
+            self._monitor = threading.Thread(target=self._monitor_loop, name='hls-monitor', daemon=True)
+            self._monitor.start()
+
+    def _monitor_loop(self):
+        while True:
+            time.sleep(MONITOR_INTERVAL)
+            with self._lock:
+                for key, session in list(self._sessions.items()):
+                    # Odtwarzacz nie pobiera segmentów - zatrzymanie produkcji
+                    if session.idle_for() > self.idle_timeout:
+                        if session.running:
+                            self.stats['idle_stops'] += 1
+                        session.stop()
+                        del self._sessions[key]
+                active_dirs = tuple(session.cache_dir for session in self._sessions.values())
+
+            if time.time() - self._last_evict > EVICT_INTERVAL:
+                self._last_evict = time.time()
+                self.evict(active_dirs)
+
+    def evict(self, protected_dirs=()):
+        """Usuwa najdawniej używane segmenty ponad HLS_CACHE_MAX_BYTES (bez aktywnych sesji)"""
+        if not self.root or not os.path.isdir(self.root):
+            return 0
+        removed, removed_bytes = evict_lru(
+            self.root, self.max_bytes, ('.ts',),
+            keep=lambda path: path.startswith(protected_dirs) if protected_dirs else False
+        )
+        self.stats['evicted'] += removed
+        self.stats['evicted_bytes'] += removed_bytes
+        return removed
+
+    def status(self):
+        with self._lock:
+            return {
+                'sessions': [session.to_dict() for session in self._sessions.values()],
+                'stats': dict(self.stats),
+            }
+
+# Globalny menedżer HLS
+hls_manager = HlsManager()
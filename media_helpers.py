@@ -2,64 +2,59 @@
 import os
 import subprocess
 import json
-import hashlib
-import mimetypes
 from datetime import datetime
 import shutil
-import re
+import time
+import concurrent.futures
+import multiprocessing
+import atexit
+import tempfile
+import threading
+from collections import deque
 
-# Inicjalizacja serwera DLNA/UPnP
-def init_dlna_server(config):
-    """
-    Inicjalizuje serwer DLNA/UPnP dla udostępniania mediów w sieci
-    """
-    # Tu zaimplementuj inicjalizację serwera DLNA
-    # Możesz użyć minidlna, coherence lub podobnych bibliotek
-    try:
-        # Przykład dla minidlna
-        config_file = os.path.join(os.path.dirname(__file__), 'minidlna.conf')
-        with open(config_file, 'w') as f:
-            f.write(f"media_dir={','.join(config['MEDIA_DIRS'])}\n")
-            f.write(f"port={config['DLNA_SERVER_PORT']}\n")
-            f.write(f"friendly_name=HomeHub Media Server\n")
-            f.write(f"inotify=yes\n")
-            
-        # Restart serwera minidlna
-        subprocess.run(['service', 'minidlna', 'restart'], check=True)
-        return True
-    except Exception as e:
-        print(f"Błąd inicjalizacji serwera DLNA: {str(e)}")
-        return False
+from audio_helpers import read_audio_info
+from thumbnail_helpers import ThumbnailStore, thumbnail_store, content_fingerprint, scale_image, DEFAULT_RENDITION
+from search_helpers import index_media_items, remove_media_items
 
-# Skanowanie mediów
-def scan_media_directory(directory, db, recursive=True, generate_thumbnails=True, config=None):
+# Domyślne formaty plików multimedialnych
+DEFAULT_MEDIA_FORMATS = {
+    'video': ['mp4', 'mkv', 'avi', 'mov'],
+    'audio': ['mp3', 'flac', 'ogg', 'wav'],
+    'image': ['jpg', 'jpeg', 'png', 'gif', 'webp']
+}
+
+# Domyślne parametry skanowania
+DEFAULT_SCAN_BATCH_SIZE = 200
+# Do tylu plików (typowa partia obserwatora katalogów) praca trafia do wątków zamiast puli procesów
+DEFAULT_SCAN_INLINE_MAX = 8
+SQL_IN_CHUNK = 500
+
+def get_media_formats(config):
+    return (config.get('MEDIA_FORMATS') if config else None) or DEFAULT_MEDIA_FORMATS
+
+# Typ mediów pliku na podstawie rozszerzenia (None - plik nieobsługiwany)
+def media_type_for_path(file_path, media_formats):
+    ext = os.path.splitext(file_path)[1].lower().lstrip('.')
+    for media_type, extensions in media_formats.items():
+        if ext in extensions:
+            return media_type
+    return None
+
+# Wyszukanie plików multimedialnych w katalogu
+def discover_media_files(directory, media_formats, recursive=True):
     """
-    Skanuje katalog w poszukiwaniu plików multimedialnych i dodaje je do bazy danych
+    Zwraca listę krotek (ścieżka, typ mediów) dla plików o obsługiwanych rozszerzeniach
     """
-    if not os.path.exists(directory):
-        raise FileNotFoundError(f"Katalog {directory} nie istnieje")
-    
-    media_formats = config.get('MEDIA_FORMATS', {
-        'video': ['mp4', 'mkv', 'avi', 'mov'],
-        'audio': ['mp3', 'flac', 'ogg', 'wav'],
-        'image': ['jpg', 'jpeg', 'png', 'gif', 'webp']
-    }) if config else {
-        'video': ['mp4', 'mkv', 'avi', 'mov'],
-        'audio': ['mp3', 'flac', 'ogg', 'wav'],
-        'image': ['jpg', 'jpeg', 'png', 'gif', 'webp']
-    }
-    
-    # Funkcja zwracająca typ mediów na podstawie rozszerzenia
+    extension_types = {}
+    for media_type, extensions in media_formats.items():
+        for ext in extensions:
+            extension_types[ext] = media_type
+
     def get_media_type(file_path):
         ext = os.path.splitext(file_path)[1].lower().lstrip('.')
-        for media_type, extensions in media_formats.items():
-            if ext in extensions:
-                return media_type
-        return None
-    
+        return extension_types.get(ext)
+
     found_files = []
-    
-    # Skanowanie katalogu
     if recursive:
         for root, _, files in os.walk(directory):
             for file in files:
@@ -74,181 +69,749 @@ def scan_media_directory(directory, db, recursive=True, generate_thumbnails=True
                 media_type = get_media_type(file_path)
                 if media_type:
                     found_files.append((file_path, media_type))
-    
-    # Dodawanie plików do bazy danych
+    return found_files
+
+# Wyjątek zgłaszany po anulowaniu skanowania
+class ScanCancelled(Exception):
+    pass
+
+# Statystyki skanowania
+class ScanStats:
+    def __init__(self):
+        self.discovered = 0
+        self.probed = 0
+        self.thumbnailed = 0
+        self.failed = 0
+        self.added = 0
+        self.updated = 0
+        self.skipped = 0
+        self.renamed = 0
+        self.removed = 0
+        self.to_process = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.probe_started = None
+        self.stage_ms = {'discover': 0.0, 'probe': 0.0, 'thumbnail': 0.0, 'db': 0.0}
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def processed(self):
+        return self.probed + self.failed
+
+    def progress(self):
+        """Postęp w procentach (liczony względem plików wymagających analizy)"""
+        if self.finished is not None:
+            return 100
+        if not self.to_process:
+            return 0
+        return min(99, int(self.processed * 100 / self.to_process))
+
+    def eta_seconds(self):
+        if self.finished is not None:
+            return 0
+        if not self.probe_started or not self.processed:
+            return None
+        rate = self.processed / max(time.time() - self.probe_started, 1e-6)
+        return round((self.to_process - self.processed) / rate, 1)
+
+    def files_per_sec(self):
+        elapsed = (self.finished or time.time()) - self.started
+        return round(self.processed / elapsed, 2) if elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            'discovered': self.discovered,
+            'probed': self.probed,
+            'thumbnailed': self.thumbnailed,
+            'failed': self.failed,
+            'added': self.added,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'renamed': self.renamed,
+            'removed': self.removed,
+            'to_process': self.to_process,
+            'progress': self.progress(),
+            'eta_seconds': self.eta_seconds(),
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'files_per_sec': self.files_per_sec(),
+            'stage_ms': {stage: round(ms, 3) for stage, ms in self.stage_ms.items()},
+            'elapsed_s': round((self.finished or time.time()) - self.started, 3),
+        }
+
+# Przetworzenie pojedynczego pliku (wykonywane w procesie roboczym)
+def extract_media_file(file_path, media_type, generate_thumbnails, config):
+    """
+    Pobiera metadane i generuje miniaturę dla jednego pliku.
+    Funkcja jest wywoływana w puli procesów, więc zwraca tylko proste typy.
+    """
+    result = {
+        'file_path': file_path,
+        'media_type': media_type,
+        'file_size': 0,
+        'metadata': {},
+        'thumbnail_path': None,
+        'thumbnail_key': None,
+        'probe_ms': 0.0,
+        'thumbnail_ms': 0.0,
+        'thumbnail_bytes': 0,
+        'error': None,
+    }
+    try:
+        result['file_size'] = os.path.getsize(file_path)
+
+        # Jedno badanie pliku współdzielone przez metadane i miniaturę
+        start = time.perf_counter()
+        probe = probe_media(file_path, media_type) if media_type in ('video', 'audio') else None
+        result['metadata'] = get_media_metadata(file_path, media_type, probe=probe)
+        result['probe_ms'] = (time.perf_counter() - start) * 1000
+
+        if generate_thumbnails:
+            start = time.perf_counter()
+            store = ThumbnailStore.from_config(config)
+            key = generate_thumbnail(file_path, media_type, config, probe=probe, store=store)
+            if key:
+                result['thumbnail_key'] = key
+                result['thumbnail_path'] = store.path(key, DEFAULT_RENDITION)
+            result['thumbnail_bytes'] = store.written_bytes
+            result['thumbnail_ms'] = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+# Kontekst procesów roboczych skanera. Domyślny fork kopiowałby proces aplikacji
+# z działającymi wątkami (bufor liczników, HLS, DLNA, obserwator, żądania) - proces
+# potomny mógłby odziedziczyć zajętą blokadę (logging, sqlite, Pillow) i zawisnąć.
+# forkserver tworzy procesy z czystego procesu serwera z wczytanym media_helpers.
+def scan_mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    if 'forkserver' in methods:
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['media_helpers'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+# Utworzenie puli procesów roboczych dla skanera
+def create_scan_executor(workers):
+    try:
+        return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=scan_mp_context())
+    except (OSError, NotImplementedError, ValueError) as e:
+        # Brak obsługi procesów (np. ograniczone środowisko) - FFprobe/FFmpeg działają w podprocesach,
+        # a Pillow i odczyt plików zwalniają GIL, więc wątki nadal dają równoległość
+        print(f"Pula procesów niedostępna, używam wątków: {str(e)}")
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+# Wspólna pula skanera - procesy robocze startują raz (na żądanie, do limitu workers)
+# i są używane przez kolejne skanowania oraz obserwatora katalogów
+_scan_executor = None
+_scan_executor_workers = None
+_scan_executor_lock = threading.Lock()
+
+def get_scan_executor(workers):
+    global _scan_executor, _scan_executor_workers
+    with _scan_executor_lock:
+        executor = _scan_executor
+        # Pula po awarii procesu roboczego (BrokenProcessPool) nie przyjmuje zadań - tworzymy nową
+        if executor is not None and (getattr(executor, '_broken', False) or _scan_executor_workers != workers):
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = None
+        if executor is None:
+            if _scan_executor is None:
+                atexit.register(shutdown_scan_executor)
+            executor = _scan_executor = create_scan_executor(workers)
+            _scan_executor_workers = workers
+        return executor
+
+def shutdown_scan_executor():
+    global _scan_executor
+    with _scan_executor_lock:
+        executor, _scan_executor = _scan_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Mapowanie ścieżek na identyfikatory istniejących elementów
+def fetch_media_ids(cursor, file_paths):
+    ids = {}
+    file_paths = list(file_paths)
+    for i in range(0, len(file_paths), SQL_IN_CHUNK):
+        chunk = file_paths[i:i + SQL_IN_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f"SELECT id, file_path FROM media_items WHERE file_path IN ({placeholders})", chunk)
+        for media_id, file_path in cursor.fetchall():
+            ids[file_path] = media_id
+    return ids
+
+# Zapis partii wyników skanowania do bazy (executemany)
+def write_media_batch(cursor, results):
+    """
+    Wstawia nowe pliki (bez 'media_id') i aktualizuje zmienione (z 'media_id')
+    w media_items oraz tabelach metadanych. Zwraca mapę ścieżka -> id.
+    """
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    new_results = [r for r in results if r.get('media_id') is None]
+    changed_results = [r for r in results if r.get('media_id') is not None]
+
+    if new_results:
+        cursor.executemany(
+            """INSERT OR IGNORE INTO media_items 
+            (title, file_path, media_type, format, duration, file_size, thumbnail_path, thumbnail_key,
+             created_at, file_inode, file_mtime) 
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (os.path.splitext(os.path.basename(r['file_path']))[0], r['file_path'], r['media_type'],
+                 os.path.splitext(r['file_path'])[1][1:], r['metadata'].get('duration', 0),
+                 r['file_size'], r['thumbnail_path'], r.get('thumbnail_key'), now,
+                 r.get('inode'), r.get('mtime'))
+                for r in new_results
+            ]
+        )
+
+    if changed_results:
+        cursor.executemany(
+            """UPDATE media_items 
+            SET duration = ?, file_size = ?, thumbnail_path = COALESCE(?, thumbnail_path),
+                thumbnail_key = COALESCE(?, thumbnail_key), file_inode = ?, file_mtime = ? 
+            WHERE id = ?""",
+            [
+                (r['metadata'].get('duration', 0), r['file_size'], r['thumbnail_path'],
+                 r.get('thumbnail_key'), r.get('inode'), r.get('mtime'), r['media_id'])
+                for r in changed_results
+            ]
+        )
+
+    ids = fetch_media_ids(cursor, (r['file_path'] for r in new_results))
+    ids.update((r['file_path'], r['media_id']) for r in changed_results)
+
+    audio_rows = []
+    video_rows = []
+    for r in results:
+        media_id = ids.get(r['file_path'])
+        if media_id is None:
+            continue
+        metadata = r['metadata']
+        if r['media_type'] == 'audio' and 'audio_metadata' in metadata:
+            audio_meta = metadata['audio_metadata']
+            audio_rows.append((media_id, audio_meta.get('artist'), audio_meta.get('album'),
+                               audio_meta.get('genre'), audio_meta.get('track_number'),
+                               audio_meta.get('year'), audio_meta.get('bitrate'),
+                               audio_meta.get('sample_rate')))
+        elif r['media_type'] == 'video' and 'video_metadata' in metadata:
+            video_meta = metadata['video_metadata']
+            video_rows.append((media_id, video_meta.get('director'), video_meta.get('resolution'),
+                               video_meta.get('framerate'), video_meta.get('codec'),
+                               json.dumps(video_meta.get('subtitle_paths', []))))
+
+    if audio_rows:
+        cursor.executemany(
+            """INSERT OR REPLACE INTO audio_metadata 
+            (media_id, artist, album, genre, track_number, year, bitrate, sample_rate) 
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            audio_rows
+        )
+    if video_rows:
+        cursor.executemany(
+            """INSERT OR REPLACE INTO video_metadata 
+            (media_id, director, resolution, framerate, codec, subtitle_paths) 
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            video_rows
+        )
+    # Indeks wyszukiwania aktualizowany w tej samej transakcji co dane
+    index_media_items(cursor, set(ids.values()))
+    return ids
+
+# Kolumny manifestu znanych plików (odcisk pliku i dane potrzebne przy przeniesieniu)
+MANIFEST_COLUMNS = 'id, file_path, file_inode, file_size, file_mtime, thumbnail_path, thumbnail_key, title'
+
+# Wczytanie manifestu (odcisków plików) znanych elementów z katalogu
+def load_media_manifest(cursor, directory):
+    """
+    Zwraca mapę ścieżka -> wiersz (id, inode, rozmiar, mtime, miniatura, tytuł)
+    dla wszystkich elementów pod katalogiem - jednym zapytaniem po indeksie file_path.
+    """
+    prefix = os.path.join(os.path.abspath(directory), '')
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    cursor.execute(
+        f"SELECT {MANIFEST_COLUMNS} FROM media_items WHERE file_path >= ? AND file_path < ?",
+        (prefix, upper)
+    )
+    return {row[1]: _manifest_entry(row) for row in cursor.fetchall()}
+
+# Wpisy manifestu dla konkretnych ścieżek plików
+def load_media_entries(cursor, file_paths):
+    entries = {}
+    file_paths = list(file_paths)
+    for i in range(0, len(file_paths), SQL_IN_CHUNK):
+        chunk = file_paths[i:i + SQL_IN_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f"SELECT {MANIFEST_COLUMNS} FROM media_items WHERE file_path IN ({placeholders})", chunk)
+        entries.update((row[1], _manifest_entry(row)) for row in cursor.fetchall())
+    return entries
+
+def _manifest_entry(row):
+    return {'id': row[0], 'inode': row[2], 'size': row[3], 'mtime': row[4],
+            'thumbnail_path': row[5], 'thumbnail_key': row[6], 'title': row[7]}
+
+# Usunięcie elementów, których pliki zniknęły z dysku
+def prune_media_items(cursor, entries):
+    ids = [(entry['id'],) for entry in entries]
+    if not ids:
+        return 0
+    # Klucze obce nie są wymuszane (PRAGMA foreign_keys), więc metadane usuwamy jawnie
+    cursor.executemany("DELETE FROM audio_metadata WHERE media_id = ?", ids)
+    cursor.executemany("DELETE FROM video_metadata WHERE media_id = ?", ids)
+    cursor.executemany("DELETE FROM playlist_items WHERE media_id = ?", ids)
+    cursor.executemany("DELETE FROM media_items WHERE id = ?", ids)
+    remove_media_items(cursor, [entry['id'] for entry in entries])
+    # Miniatury z magazynu mogą być współdzielone przez pliki o tej samej zawartości -
+    # usuwa je LRU; tu kasujemy tylko stare miniatury przypisane do ścieżki
+    for entry in entries:
+        thumbnail_path = entry.get('thumbnail_path')
+        if thumbnail_path and not entry.get('thumbnail_key') and os.path.exists(thumbnail_path):
+            try:
+                os.remove(thumbnail_path)
+            except OSError as e:
+                print(f"Nie udało się usunąć miniatury {thumbnail_path}: {str(e)}")
+    return len(ids)
+
+# Skanowanie mediów
+def scan_media_directory(directory, db, recursive=True, generate_thumbnails=True, config=None, stats=None,
+                         incremental=True, cancel_event=None):
+    """
+    Skanuje katalog w poszukiwaniu plików multimedialnych i dodaje je do bazy danych.
+    Pobieranie metadanych i generowanie miniatur odbywa się w puli MEDIA_SCAN_WORKERS
+    procesów, a wyniki zapisywane są partiami po MEDIA_SCAN_BATCH_SIZE plików.
+
+    W trybie przyrostowym (incremental=True) pliki o niezmienionym odcisku
+    (inode, rozmiar, mtime) są pomijane, przeniesione pliki rozpoznawane są po
+    inode, a elementy, których pliki zniknęły, są usuwane z bazy.
+    Przy incremental=False wszystkie znalezione pliki są analizowane ponownie.
+
+    Ustawienie cancel_event (threading.Event) przerywa skanowanie - wyniki już
+    przetworzonych plików są zapisywane, po czym zgłaszany jest ScanCancelled.
+    """
+    if not os.path.exists(directory):
+        raise FileNotFoundError(f"Katalog {directory} nie istnieje")
+
+    directory = os.path.abspath(directory)
+    stats = stats if stats is not None else ScanStats()
+
+    # Wyszukanie plików
+    start = time.perf_counter()
+    found_files = discover_media_files(directory, get_media_formats(config), recursive)
+    stats.discovered = len(found_files)
+    stats.stage_ms['discover'] += (time.perf_counter() - start) * 1000
+
+    # Porównanie z manifestem znanych plików (jedno zapytanie zamiast SELECT na plik)
+    start = time.perf_counter()
+    manifest = load_media_manifest(db.cursor(), directory)
+    if not recursive:
+        manifest = {path: entry for path, entry in manifest.items() if os.path.dirname(path) == directory}
+    stats.stage_ms['db'] += (time.perf_counter() - start) * 1000
+
+    return sync_media_files(found_files, manifest, db, generate_thumbnails, config, stats, incremental,
+                            cancel_event, scope=directory)
+
+# Aktualizacja bazy dla wskazanych ścieżek (pliki i katalogi) bez skanowania całego katalogu
+def ingest_media_paths(paths, db, generate_thumbnails=True, config=None, stats=None):
+    """
+    Wywoływane przez obserwatora katalogów mediów dla ścieżek, których dotyczyły zdarzenia.
+    Istniejący plik jest dodawany lub aktualizowany, istniejący katalog przeglądany
+    rekurencyjnie, a elementy pod ścieżkami, które zniknęły, usuwane z bazy.
+    Przeniesienie, którego obie strony trafiły do jednej partii, rozpoznawane jest
+    po inode - element zachowuje id (playlisty, liczniki).
+    """
+    stats = stats if stats is not None else ScanStats()
+    media_formats = get_media_formats(config)
     cursor = db.cursor()
-    
-    added_count = 0
+
+    paths = sorted({os.path.abspath(path) for path in paths})
+    start = time.perf_counter()
+    found = {}
+    directories = []
+    for path in paths:
+        if os.path.isdir(path):
+            directories.append(path)
+            found.update(discover_media_files(path, media_formats))
+        elif os.path.isfile(path):
+            media_type = media_type_for_path(path, media_formats)
+            if media_type:
+                found[path] = media_type
+        else:
+            # Ścieżka zniknęła - mógł to być plik albo cały katalog
+            directories.append(path)
+    stats.discovered += len(found)
+    stats.stage_ms['discover'] += (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    manifest = load_media_entries(cursor, set(paths) | set(found))
+    for directory in directories:
+        manifest.update(load_media_manifest(cursor, directory))
+    stats.stage_ms['db'] += (time.perf_counter() - start) * 1000
+
+    return sync_media_files(list(found.items()), manifest, db, generate_thumbnails, config, stats)
+
+# Uzgodnienie bazy z listą znalezionych plików w obrębie manifestu
+def sync_media_files(found_files, manifest, db, generate_thumbnails=True, config=None, stats=None,
+                     incremental=True, cancel_event=None, scope=None):
+    """
+    found_files to pary (ścieżka, typ) znalezione na dysku, manifest - znane elementy
+    z tego samego zakresu. Elementy manifestu bez pliku są usuwane (lub rozpoznawane
+    jako przeniesione), a nowe i zmienione pliki analizowane w puli procesów.
+    Zwraca liczbę dodanych elementów.
+    """
+    stats = stats if stats is not None else ScanStats()
+    workers = (config.get('MEDIA_SCAN_WORKERS') if config else None) or os.cpu_count() or 2
+    batch_size = (config.get('MEDIA_SCAN_BATCH_SIZE') if config else None) or DEFAULT_SCAN_BATCH_SIZE
+    max_in_flight = (config.get('MEDIA_SCAN_QUEUE_DEPTH') if config else None) or workers * 4
+    inline_max = config.get('MEDIA_SCAN_INLINE_MAX', DEFAULT_SCAN_INLINE_MAX) if config else DEFAULT_SCAN_INLINE_MAX
+
+    # Konfiguracja przekazywana do procesów roboczych musi być serializowalna
+    worker_config = {
+        key: config.get(key) for key in ('THUMBNAIL_DIR', 'THUMBNAIL_MAX_BYTES', 'THUMBNAIL_RENDITIONS')
+    } if config else None
+
+    cursor = db.cursor()
+    start = time.perf_counter()
+    seen = set()
+    unknown = []
+    jobs = []
     for file_path, media_type in found_files:
-        file_size = os.path.getsize(file_path)
-        file_name = os.path.basename(file_path)
-        
-        # Sprawdzenie czy plik już istnieje w bazie
-        cursor.execute("SELECT id FROM media_items WHERE file_path = ?", (file_path,))
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Aktualizacja rozmiaru pliku i innych metadanych
-            cursor.execute(
-                "UPDATE media_items SET file_size = ? WHERE file_path = ?",
-                (file_size, file_path)
-            )
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            continue
+        fingerprint = {'inode': st.st_ino, 'size': st.st_size, 'mtime': st.st_mtime}
+        entry = manifest.get(file_path)
+        if entry is None:
+            unknown.append((file_path, media_type, fingerprint))
+            continue
+
+        seen.add(file_path)
+        unchanged = (entry['inode'] == st.st_ino and entry['size'] == st.st_size
+                     and entry['mtime'] == st.st_mtime)
+        if unchanged and incremental:
+            stats.skipped += 1
         else:
-            # Generowanie miniatury
-            thumbnail_path = None
-            if generate_thumbnails:
-                thumbnail_path = generate_thumbnail(file_path, media_type, config)
-            
-            # Pobieranie metadanych
-            metadata = get_media_metadata(file_path, media_type)
-            
-            # Domyślny tytuł to nazwa pliku bez rozszerzenia
-            title = os.path.splitext(file_name)[0]
-            duration = metadata.get('duration', 0)
-            
-            # Dodanie do bazy danych
-            cursor.execute(
-                """INSERT INTO media_items 
-                (title, file_path, media_type, format, duration, file_size, thumbnail_path, created_at) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (title, file_path, media_type, os.path.splitext(file_path)[1][1:], 
-                duration, file_size, thumbnail_path, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            jobs.append((file_path, media_type, fingerprint, entry['id']))
+
+    # Pliki, które zniknęły - kandydaci do wykrycia przeniesienia po inode
+    vanished = {path: entry for path, entry in manifest.items() if path not in seen}
+    vanished_by_inode = {entry['inode']: path for path, entry in vanished.items() if entry['inode'] is not None}
+
+    renames = []
+    for file_path, media_type, fingerprint in unknown:
+        old_path = vanished_by_inode.pop(fingerprint['inode'], None)
+        if old_path is not None and vanished[old_path]['size'] == fingerprint['size']:
+            entry = vanished.pop(old_path)
+            # Tytuł domyślny (nazwa pliku) podąża za nową nazwą; tytuł zmieniony ręcznie zostaje
+            title = entry['title']
+            if title == os.path.splitext(os.path.basename(old_path))[0]:
+                title = os.path.splitext(os.path.basename(file_path))[0]
+            renames.append((file_path, title, fingerprint['mtime'], entry['id']))
+            if entry['mtime'] != fingerprint['mtime'] or not incremental:
+                jobs.append((file_path, media_type, fingerprint, entry['id']))
+        else:
+            jobs.append((file_path, media_type, fingerprint, None))
+
+    if renames:
+        cursor.executemany(
+            "UPDATE media_items SET file_path = ?, title = ?, file_mtime = ? WHERE id = ?", renames
+        )
+        index_media_items(cursor, [media_id for _, _, _, media_id in renames])
+        stats.renamed += len(renames)
+    stats.removed += prune_media_items(cursor, list(vanished.values()))
+    db.commit()
+    stats.stage_ms['db'] += (time.perf_counter() - start) * 1000
+
+    pending_results = []
+
+    def flush_results():
+        if not pending_results:
+            return
+        start = time.perf_counter()
+        ids = write_media_batch(cursor, pending_results)
+        db.commit()
+        for r in pending_results:
+            if r.get('media_id') is not None:
+                stats.updated += 1
+            elif r['file_path'] in ids:
+                stats.added += 1
+        stats.stage_ms['db'] += (time.perf_counter() - start) * 1000
+        pending_results.clear()
+        # Miniatury powstają w procesach roboczych, więc ich rozmiar liczymy tutaj -
+        # długie skanowanie wraca do budżetu po drodze, nie dopiero na końcu
+        thumbnail_store.evict_if_needed()
+
+    def collect(result, fingerprint, media_id):
+        stats.stage_ms['probe'] += result['probe_ms']
+        stats.stage_ms['thumbnail'] += result['thumbnail_ms']
+        if result['error']:
+            stats.failed += 1
+            print(f"Błąd przetwarzania pliku {result['file_path']}: {result['error']}")
+            return
+        stats.probed += 1
+        if result['thumbnail_path']:
+            stats.thumbnailed += 1
+        if result['thumbnail_bytes']:
+            thumbnail_store.record_written(result['thumbnail_bytes'])
+        result.update(inode=fingerprint['inode'], mtime=fingerprint['mtime'], media_id=media_id)
+        pending_results.append(result)
+        if len(pending_results) >= batch_size:
+            flush_results()
+
+    # Rozdzielenie pracy na pulę procesów z ograniczoną liczbą zadań w toku
+    stats.to_process = len(jobs)
+    stats.probe_started = time.time()
+    cancelled = False
+    if jobs:
+        # Kilka plików przetwarzają wątki - bez przekazywania zadań do procesów i ich uruchamiania.
+        # FFprobe/FFmpeg działają w podprocesach, a Pillow zwalnia GIL. Większe zbiory trafiają
+        # do wspólnej puli procesów, której procesy robocze startują na żądanie.
+        local_executor = None
+        if len(jobs) <= inline_max:
+            executor = local_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(workers, len(jobs)), thread_name_prefix='media-scan'
             )
-            
-            # Pobieranie ID dodanego pliku
-            media_id = cursor.lastrowid
-            
-            # Dodawanie specyficznych metadanych
-            if media_type == 'audio' and 'audio_metadata' in metadata:
-                audio_meta = metadata['audio_metadata']
-                cursor.execute(
-                    """INSERT INTO audio_metadata 
-                    (media_id, artist, album, genre, track_number, year, bitrate, sample_rate) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (media_id, audio_meta.get('artist'), audio_meta.get('album'), 
-                     audio_meta.get('genre'), audio_meta.get('track_number'), 
-                     audio_meta.get('year'), audio_meta.get('bitrate'), 
-                     audio_meta.get('sample_rate'))
-                )
-            
-            elif media_type == 'video' and 'video_metadata' in metadata:
-                video_meta = metadata['video_metadata']
-                cursor.execute(
-                    """INSERT INTO video_metadata 
-                    (media_id, director, resolution, framerate, codec, subtitle_paths) 
-                    VALUES (?, ?, ?, ?, ?, ?)""",
-                    (media_id, video_meta.get('director'), video_meta.get('resolution'), 
-                     video_meta.get('framerate'), video_meta.get('codec'), 
-                     json.dumps(video_meta.get('subtitle_paths', [])))
+        else:
+            executor = get_scan_executor(workers)
+        in_flight = {}
+        try:
+            jobs_iter = iter(jobs)
+            exhausted = False
+            while in_flight or not exhausted:
+                if cancel_event is not None and cancel_event.is_set() and not cancelled:
+                    # Nie zlecamy nowych zadań; już uruchomione kończą się normalnie
+                    cancelled = exhausted = True
+                    for future in list(in_flight):
+                        if future.cancel():
+                            in_flight.pop(future)
+
+                while not exhausted and len(in_flight) < max_in_flight:
+                    try:
+                        file_path, media_type, fingerprint, media_id = next(jobs_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = executor.submit(extract_media_file, file_path, media_type,
+                                             generate_thumbnails, worker_config)
+                    in_flight[future] = (fingerprint, media_id)
+
+                stats.queue_depth = len(in_flight)
+                stats.max_queue_depth = max(stats.max_queue_depth, stats.queue_depth)
+                if not in_flight:
+                    break
+
+                done, _ = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED
                 )
-                
-            added_count += 1
-    
+                for future in done:
+                    fingerprint, media_id = in_flight.pop(future)
+                    try:
+                        collect(future.result(), fingerprint, media_id)
+                    except Exception as e:
+                        stats.failed += 1
+                        print(f"Błąd procesu roboczego skanera: {str(e)}")
+            stats.queue_depth = 0
+        finally:
+            # Przerwane skanowanie nie zostawia zadań w kolejce wspólnej puli
+            for future in in_flight:
+                future.cancel()
+            if local_executor is not None:
+                local_executor.shutdown(wait=True)
+
+    flush_results()
     db.commit()
-    return added_count
+    stats.finished = time.time()
+    if cancelled:
+        raise ScanCancelled(f"Skanowanie katalogu {scope} zostało anulowane")
+    return stats.added
 
-# Generowanie miniatury
-def generate_thumbnail(file_path, media_type, config):
+# Domyślny punkt miniatury filmu (sekundy)
+DEFAULT_THUMBNAIL_SEEK = 5.0
+
+# Jednorazowe badanie pliku
+def probe_media(file_path, media_type=None):
     """
-    Generuje miniaturę dla pliku multimedialnego
+    Zwraca słownik z formatem, strumieniami, tagami, czasem trwania oraz indeksem
+    dołączonej okładki (attached_pic). Wynik jest współdzielony przez odczyt
+    metadanych i generowanie miniatury. Pliki audio są najpierw czytane w procesie
+    (audio_helpers), FFprobe uruchamiany jest tylko dla plików, których nie udało
+    się tak odczytać. Zwraca None, jeśli pliku nie udało się zbadać.
     """
-    thumbnail_dir = config.get('THUMBNAIL_DIR', '/tmp/homehub/thumbnails') if config else '/tmp/homehub/thumbnails'
-    os.makedirs(thumbnail_dir, exist_ok=True)
+    if media_type == 'audio':
+        info = read_audio_info(file_path)
+        if info is not None:
+            return info
+    return ffprobe_media(file_path)
+
+# Badanie pliku przez FFprobe
+def ffprobe_media(file_path):
+    try:
+        result = subprocess.run([
+            'ffprobe',
+            '-v', 'quiet',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams',
+            file_path
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        info = json.loads(result.stdout)
+    except Exception as e:
+        print(f"Błąd badania pliku {file_path}: {str(e)}")
+        return None
     
-    # Generowanie unikalnej nazwy dla miniatury na podstawie ścieżki pliku
-    file_hash = hashlib.md5(file_path.encode()).hexdigest()
-    thumbnail_path = os.path.join(thumbnail_dir, f"{file_hash}.jpg")
+    format_info = info.get('format', {})
+    streams = info.get('streams', [])
     
     try:
+        duration = float(format_info.get('duration', 0))
+    except (TypeError, ValueError):
+        duration = 0.0
+    
+    # Okładka albumu to strumień wideo z dyspozycją attached_pic
+    attached_picture = None
+    for stream in streams:
+        if stream.get('codec_type') == 'video' and stream.get('disposition', {}).get('attached_pic'):
+            attached_picture = stream.get('index')
+            break
+    
+    return {
+        'format': format_info,
+        'streams': streams,
+        'tags': {key.lower(): value for key, value in format_info.get('tags', {}).items()},
+        'duration': duration,
+        'attached_picture': attached_picture,
+        'reader': 'ffprobe',
+    }
+
+# Pierwszy strumień danego typu (z pominięciem okładek)
+def _first_stream(probe, codec_type):
+    for stream in probe.get('streams', []):
+        if stream.get('codec_type') == codec_type and not stream.get('disposition', {}).get('attached_pic'):
+            return stream
+    return None
+
+# Wybór punktu w filmie, z którego pobierana jest klatka miniatury
+def thumbnail_seek_time(duration):
+    """
+    Domyślnie 5 sekunda; dla krótszych klipów środek nagrania,
+    a przy nieznanej długości pierwsza klatka.
+    """
+    if not duration or duration <= 0:
+        return 0.0
+    if duration <= DEFAULT_THUMBNAIL_SEEK * 2:
+        return round(duration / 2, 3)
+    return DEFAULT_THUMBNAIL_SEEK
+
+# Generowanie miniatury
+def generate_thumbnail(file_path, media_type, config, probe=None, store=None):
+    """
+    Generuje miniatury pliku we wszystkich rozmiarach magazynu miniatur i zwraca
+    ich klucz (odcisk zawartości) lub None. Plik o tej samej zawartości, co już
+    znany (np. przeniesiony), nie jest ponownie przetwarzany. Wynik probe_media
+    (jeśli podany) pozwala wybrać poprawny punkt klatki i pominąć pliki audio bez okładki.
+    """
+    store = store or ThumbnailStore.from_config(config)
+    
+    try:
+        key = content_fingerprint(file_path)
+        if store.has(key):
+            store.stats['reused'] += 1
+            return key
+        
+        if media_type in ('video', 'audio') and probe is None:
+            probe = probe_media(file_path, media_type)
+        
         if media_type == 'video':
-            # Użycie FFmpeg do wyodrębnienia klatki z filmu
-            subprocess.run([
-                'ffmpeg',
-                '-i', file_path,
-                '-ss', '00:00:05',  # 5 sekunda filmu
-                '-vframes', '1',
-                '-vf', 'scale=320:-1',
-                '-y',
-                thumbnail_path
-            ], stderr=subprocess.PIPE, check=True)
+            seek = thumbnail_seek_time(probe['duration'] if probe else DEFAULT_THUMBNAIL_SEEK * 2)
             
-        elif media_type == 'audio':
-            # Próba wyodrębnienia okładki z pliku audio
-            try:
+            def render(output, width):
+                # Użycie FFmpeg do wyodrębnienia klatki z filmu (-ss przed -i - szybkie przewijanie)
                 subprocess.run([
                     'ffmpeg',
+                    '-ss', f'{seek:.3f}',
                     '-i', file_path,
-                    '-an',
-                    '-vcodec', 'copy',
+                    '-vframes', '1',
+                    '-vf', f"scale='min({width},iw)':-2",
                     '-y',
-                    thumbnail_path
-                ], stderr=subprocess.PIPE, check=False)
-                
-                # Sprawdź czy miniatura została wygenerowana
-                if not os.path.exists(thumbnail_path) or os.path.getsize(thumbnail_path) == 0:
-                    # Użyj domyślnej miniatury dla audio
-                    default_audio_thumbnail = os.path.join(os.path.dirname(__file__), 'static/img/media/audio_thumbnail.jpg')
-                    shutil.copy(default_audio_thumbnail, thumbnail_path)
-            except:
-                # Użyj domyślnej miniatury dla audio
-                default_audio_thumbnail = os.path.join(os.path.dirname(__file__), 'static/img/media/audio_thumbnail.jpg')
-                shutil.copy(default_audio_thumbnail, thumbnail_path)
+                    output
+                ], stderr=subprocess.PIPE, check=True)
+            
+        elif media_type == 'audio':
+            attached_picture = probe.get('attached_picture') if probe else None
+            if probe and probe.get('picture_data'):
+                def render(output, width):
+                    # Okładka odczytana już z tagów - skalowanie bez uruchamiania FFmpeg
+                    source = output + '.cover'
+                    try:
+                        with open(source, 'wb') as f:
+                            f.write(probe['picture_data'])
+                        scale_image(source, output, width)
+                    finally:
+                        os.remove(source)
+            elif attached_picture is not None:
+                def render(output, width):
+                    # Wyodrębnienie dołączonej okładki z pliku audio
+                    subprocess.run([
+                        'ffmpeg',
+                        '-i', file_path,
+                        '-map', f'0:{attached_picture}',
+                        '-an',
+                        '-vframes', '1',
+                        '-vf', f"scale='min({width},iw)':-2",
+                        '-y',
+                        output
+                    ], stderr=subprocess.PIPE, check=True)
+            else:
+                # Brak okładki - interfejs pokazuje domyślną miniaturę audio
+                return None
                 
         elif media_type == 'image':
-            # Utwórz miniaturę obrazu
-            subprocess.run([
-                'convert',
-                file_path,
-                '-thumbnail', '320x240>',
-                thumbnail_path
-            ], stderr=subprocess.PIPE, check=True)
-            
-        return thumbnail_path
+            def render(output, width):
+                scale_image(file_path, output, width)
+        else:
+            return None
+        
+        store.save(key, render)
+        return key
     except Exception as e:
         print(f"Błąd generowania miniatury dla {file_path}: {str(e)}")
         return None
 
 # Pobieranie metadanych
-def get_media_metadata(file_path, media_type):
+def get_media_metadata(file_path, media_type, probe=None):
     """
-    Pobiera metadane z pliku multimedialnego
+    Pobiera metadane z pliku multimedialnego (na podstawie wyniku probe_media)
     """
     metadata = {}
+    if media_type not in ('video', 'audio'):
+        return metadata
+    
+    if probe is None:
+        probe = probe_media(file_path, media_type)
+    if probe is None:
+        return metadata
     
     try:
+        # Podstawowe metadane
+        metadata['duration'] = probe['duration']
+        
         if media_type == 'video':
-            # Użycie FFprobe do pobrania metadanych wideo
-            result = subprocess.run([
-                'ffprobe',
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                '-show_streams',
-                file_path
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            
-            info = json.loads(result.stdout)
-            
-            # Podstawowe metadane
-            format_info = info.get('format', {})
-            duration = float(format_info.get('duration', 0))
-            metadata['duration'] = duration
-            
             # Metadane wideo
             video_metadata = {}
-            for stream in info.get('streams', []):
-                if stream.get('codec_type') == 'video':
-                    width = stream.get('width', 0)
-                    height = stream.get('height', 0)
-                    video_metadata['resolution'] = f"{width}x{height}"
-                    
-                    if 'r_frame_rate' in stream:
-                        rate_parts = stream['r_frame_rate'].split('/')
-                        if len(rate_parts) == 2 and int(rate_parts[1]) != 0:
-                            video_metadata['framerate'] = float(rate_parts[0]) / float(rate_parts[1])
-                    
-                    video_metadata['codec'] = stream.get('codec_name', '')
-                    break
+            stream = _first_stream(probe, 'video')
+            if stream:
+                width = stream.get('width', 0)
+                height = stream.get('height', 0)
+                video_metadata['resolution'] = f"{width}x{height}"
+                
+                if 'r_frame_rate' in stream:
+                    rate_parts = stream['r_frame_rate'].split('/')
+                    if len(rate_parts) == 2 and int(rate_parts[1]) != 0:
+                        video_metadata['framerate'] = float(rate_parts[0]) / float(rate_parts[1])
+                
+                video_metadata['codec'] = stream.get('codec_name', '')
             
             # Wyszukanie ścieżek napisów
             subtitle_paths = []
@@ -262,26 +825,9 @@ def get_media_metadata(file_path, media_type):
             metadata['video_metadata'] = video_metadata
             
         elif media_type == 'audio':
-            # Użycie FFprobe do pobrania metadanych audio
-            result = subprocess.run([
-                'ffprobe',
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                '-show_streams',
-                file_path
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            
-            info = json.loads(result.stdout)
-            
-            # Podstawowe metadane
-            format_info = info.get('format', {})
-            duration = float(format_info.get('duration', 0))
-            metadata['duration'] = duration
-            
             # Metadane tagu
             audio_metadata = {}
-            tags = format_info.get('tags', {})
+            tags = probe['tags']
             
             audio_metadata['artist'] = tags.get('artist', '')
             audio_metadata['album'] = tags.get('album', '')
@@ -290,11 +836,10 @@ def get_media_metadata(file_path, media_type):
             audio_metadata['year'] = tags.get('date', '')
             
             # Metadane strumienia audio
-            for stream in info.get('streams', []):
-                if stream.get('codec_type') == 'audio':
-                    audio_metadata['bitrate'] = int(stream.get('bit_rate', 0))
-                    audio_metadata['sample_rate'] = int(stream.get('sample_rate', 0))
-                    break
+            stream = _first_stream(probe, 'audio')
+            if stream:
+                audio_metadata['bitrate'] = int(stream.get('bit_rate', 0))
+                audio_metadata['sample_rate'] = int(stream.get('sample_rate', 0))
             
             metadata['audio_metadata'] = audio_metadata
     
@@ -303,40 +848,206 @@ def get_media_metadata(file_path, media_type):
     
     return metadata
 
+# Parametry transkodowania dla rozdzielczości i formatów wyjściowych
+TRANSCODE_RESOLUTIONS = {
+    '480p': ['-vf', 'scale=-2:480', '-b:v', '1M'],
+    '720p': ['-vf', 'scale=-2:720', '-b:v', '2.5M'],
+    '1080p': ['-vf', 'scale=-2:1080', '-b:v', '5M'],
+}
+TRANSCODE_FORMATS = {
+    'mp4': ['-c:v', 'libx264', '-c:a', 'aac', '-movflags', '+faststart', '-f', 'mp4'],
+    'webm': ['-c:v', 'libvpx-vp9', '-c:a', 'libopus', '-f', 'webm'],
+    'mp3': ['-vn', '-c:a', 'libmp3lame', '-q:a', '2', '-f', 'mp3'],
+}
+
+# Formaty transkodowania audio na żywo: argumenty FFmpeg, typ MIME, domyślna przepływność (kb/s)
+LIVE_AUDIO_FORMATS = {
+    'opus': (['-c:a', 'libopus', '-f', 'ogg'], 'audio/ogg', 96),
+    'mp3': (['-c:a', 'libmp3lame', '-f', 'mp3'], 'audio/mpeg', 128),
+    'aac': (['-c:a', 'aac', '-f', 'adts'], 'audio/aac', 128),
+}
+LIVE_MIN_BITRATE = 16
+LIVE_MAX_BITRATE = 320
+# Rozmiar fragmentu odczytywanego z potoku i domyślny rozmiar potoku (granica bufora)
+DEFAULT_LIVE_CHUNK_BYTES = 16 * 1024
+DEFAULT_LIVE_PIPE_BYTES = 128 * 1024
+
+# Polecenie uruchamiane z obniżonym priorytetem (None - bez zmian). Zamiast preexec_fn,
+# który w procesie z wątkami może zakleszczyć proces potomny przed exec, używamy nice.
+def with_priority(command, niceness):
+    if not niceness or not shutil.which('nice'):
+        return command
+    return ['nice', '-n', str(niceness)] + list(command)
+
+# Wyjątek zgłaszany po anulowaniu transkodowania
+class TranscodeCancelled(Exception):
+    pass
+
+# Budowanie polecenia FFmpeg dla transkodowania
+def build_transcode_command(input_file, output_file, format='mp4', resolution='720p', threads=None):
+    command = ['ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error', '-i', input_file, '-y']
+    if format != 'mp3':
+        command.extend(TRANSCODE_RESOLUTIONS.get(resolution, TRANSCODE_RESOLUTIONS['720p']))
+    command.extend(TRANSCODE_FORMATS.get(format, TRANSCODE_FORMATS['mp4']))
+    if threads:
+        command.extend(['-threads', str(threads)])
+    # Postęp w formacie klucz=wartość na stdout
+    command.extend(['-progress', 'pipe:1', '-nostats'])
+    command.append(output_file)
+    return command
+
 # Transkodowanie mediów
-def transcode_media(input_file, output_file, format='mp4', resolution='720p'):
+def transcode_media(input_file, output_file, format='mp4', resolution='720p', progress=None,
+                    cancel_event=None, threads=None, niceness=None):
     """
-    Transkoduje plik multimedialny do określonego formatu i rozdzielczości
+    Transkoduje plik multimedialny do określonego formatu i rozdzielczości.
+    Wynik zapisywany jest do pliku tymczasowego i przenoszony na output_file
+    dopiero po udanym zakończeniu, więc nigdy nie jest widoczny plik niepełny.
+    progress(sekundy) wywoływane jest przy każdym raporcie postępu FFmpeg;
+    ustawienie cancel_event przerywa proces (zgłaszany jest TranscodeCancelled).
+    niceness > 0 obniża priorytet procesu FFmpeg (np. dla zadań wyprzedzających).
     """
-    # Określanie parametrów na podstawie żądanej rozdzielczości
-    resolution_params = {
-        '480p': ['-vf', 'scale=-1:480', '-b:v', '1M'],
-        '720p': ['-vf', 'scale=-1:720', '-b:v', '2.5M'],
-        '1080p': ['-vf', 'scale=-1:1080', '-b:v', '5M'],
-    }
-    
-    params = resolution_params.get(resolution, resolution_params['720p'])
-    
-    # Parametry wyjściowego formatu
-    format_params = {
-        'mp4': ['-c:v', 'libx264', '-c:a', 'aac', '-movflags', '+faststart'],
-        'webm': ['-c:v', 'libvpx-vp9', '-c:a', 'libopus'],
-        'mp3': ['-vn', '-c:a', 'libmp3lame', '-q:a', '2'],
-    }
-    
-    output_params = format_params.get(format, format_params['mp4'])
-    
-    # Budowanie pełnego polecenia
-    command = ['ffmpeg', '-i', input_file, '-y']
-    command.extend(params)
-    command.extend(output_params)
-    command.append(output_file)
-    
-    # Uruchomienie procesu transkodowania
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
-    
-    if process.returncode != 0:
-        raise Exception(f"FFmpeg error: {stderr.decode()}")
-    
-    return output_file
\ No newline at end of file
+    # Wątek w nazwie - anulowane i nowe zadanie dla tego samego pliku mogą chwilę działać razem
+    tmp_output = f"{output_file}.{os.getpid()}.{threading.get_ident()}.part"
+    command = with_priority(build_transcode_command(input_file, tmp_output, format, resolution, threads),
+                            niceness)
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    # Błędy FFmpeg trafiają do pliku tymczasowego - brak ryzyka zablokowania potoku
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
+        try:
+            for line in process.stdout:
+                if cancelled():
+                    process.terminate()
+                    break
+                key, _, value = line.strip().partition('=')
+                if key in ('out_time_us', 'out_time_ms') and progress and value.isdigit():
+                    # Obie wartości FFmpeg podaje w mikrosekundach
+                    progress(int(value) / 1000000)
+            process.wait()
+
+            if cancelled():
+                raise TranscodeCancelled(f"Transkodowanie {input_file} zostało anulowane")
+            if process.returncode != 0:
+                stderr_file.seek(0)
+                raise Exception(f"FFmpeg error: {stderr_file.read().decode(errors='replace')[-2000:]}")
+        except BaseException:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            if os.path.exists(tmp_output):
+                os.remove(tmp_output)
+            raise
+
+    os.replace(tmp_output, output_file)
+    return output_file
+
+# Polecenie FFmpeg transkodujące ścieżkę audio na standardowe wyjście
+def build_live_audio_command(input_file, format='opus', bitrate=None, start=0):
+    codec_args, _, default_bitrate = LIVE_AUDIO_FORMATS[format]
+    command = ['ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error']
+    if start:
+        # -ss przed -i - szybkie przewinięcie wejścia zamiast dekodowania od początku
+        command.extend(['-ss', f'{start:.3f}'])
+    command.extend(['-i', input_file, '-map', '0:a:0', '-vn'])
+    command.extend(codec_args)
+    # -flush_packets 1 - każdy pakiet od razu trafia do potoku (krótszy czas do pierwszego bajtu)
+    command.extend(['-b:a', f'{bitrate or default_bitrate}k', '-flush_packets', '1', 'pipe:1'])
+    return command
+
+# Transkodowanie na żywo - wyjście FFmpeg czytane bezpośrednio z potoku, bez plików
+class LiveTranscode:
+    """
+    Iterowalna odpowiedź HTTP (chunked) z kolejnymi fragmentami wyjścia FFmpeg.
+
+    Bufor jest ograniczony do rozmiaru potoku (pipe_bytes): serwer WSGI pobiera następny
+    fragment dopiero po wysłaniu poprzedniego, więc przy wolnym kliencie potok się
+    zapełnia i FFmpeg wstrzymuje zapis. close() - wywoływane przez serwer WSGI również
+    po rozłączeniu klienta - zabija proces FFmpeg.
+    """
+    def __init__(self, command, chunk_size=DEFAULT_LIVE_CHUNK_BYTES, pipe_bytes=DEFAULT_LIVE_PIPE_BYTES,
+                 on_close=None):
+        self.command = command
+        self.chunk_size = chunk_size
+        self.pipe_bytes = pipe_bytes
+        self.on_close = on_close
+        self.process = None
+        self.bytes_sent = 0
+        self.ttfb_ms = None
+        self.completed = False
+        self._first_chunk = b''
+        self._stderr = deque(maxlen=20)
+        self._stderr_thread = None
+        self._closed = False
+
+    def start(self):
+        """
+        Uruchamia FFmpeg i czeka na pierwszy fragment wyjścia, żeby błąd (np. uszkodzony
+        plik) można było zgłosić zwykłą odpowiedzią, zanim wysłane zostaną nagłówki 200.
+        """
+        started = time.perf_counter()
+        try:
+            # Błąd uruchomienia (np. brak FFmpeg) również przechodzi przez close() - zwalnia miejsce strumienia
+            self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                            bufsize=0)
+            self._set_pipe_size()
+            # Wątek opróżniający stderr - pełny potok błędów nie może zablokować FFmpeg
+            self._stderr_thread = threading.Thread(target=self._drain_stderr, name='live-transcode-stderr',
+                                                   daemon=True)
+            self._stderr_thread.start()
+            self._first_chunk = os.read(self.process.stdout.fileno(), self.chunk_size)
+            if not self._first_chunk:
+                self.process.wait()
+                self._stderr_thread.join(timeout=1)
+                raise Exception(f"FFmpeg error: {self.error_output() or self.process.returncode}")
+        except BaseException:
+            self.close()
+            raise
+        self.ttfb_ms = (time.perf_counter() - started) * 1000
+        return self
+
+    def _set_pipe_size(self):
+        # F_SETPIPE_SZ (Linux) - jawna granica bufora między FFmpeg a serwerem
+        try:
+            import fcntl
+            if hasattr(fcntl, 'F_SETPIPE_SZ') and self.pipe_bytes:
+                fcntl.fcntl(self.process.stdout.fileno(), fcntl.F_SETPIPE_SZ, self.pipe_bytes)
+        except (ImportError, OSError):
+            pass
+
+    def _drain_stderr(self):
+        for line in self.process.stderr:
+            self._stderr.append(line.decode(errors='replace').rstrip())
+
+    def error_output(self):
+        return '\n'.join(self._stderr)[-2000:]
+
+    def __iter__(self):
+        if self._first_chunk:
+            chunk, self._first_chunk = self._first_chunk, b''
+            self.bytes_sent += len(chunk)
+            yield chunk
+        fd = self.process.stdout.fileno()
+        while not self._closed:
+            chunk = os.read(fd, self.chunk_size)
+            if not chunk:
+                break
+            self.bytes_sent += len(chunk)
+            yield chunk
+        if not self._closed:
+            self.completed = self.process.wait() == 0
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+            self.process.stdout.close()
+        if self.on_close is not None:
+            self.on_close(self)
@@ -0,0 +1,137 @@
+# media_tasks.py
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from db_helpers import get_pool
+from media_helpers import scan_media_directory, ScanStats, ScanCancelled
+from thumbnail_helpers import thumbnail_store
+
+# Liczba zakończonych zadań przechowywanych do odczytu statusu
+MAX_FINISHED_TASKS = 50
+
+# Zadanie skanowania katalogu uruchamiane w tle
+class ScanTask:
+    def __init__(self, directory, recursive=True, generate_thumbnails=True, incremental=True):
+        self.id = uuid.uuid4().hex
+        self.directory = directory
+        self.recursive = recursive
+        self.generate_thumbnails = generate_thumbnails
+        self.incremental = incremental
+        self.status = 'queued'
+        self.error = None
+        self.stats = ScanStats()
+        self.cancel_event = threading.Event()
+        self.created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def to_dict(self):
+        stats = self.stats.to_dict()
+        # Postęp 100% tylko dla zadania zakończonego powodzeniem
+        progress = 100 if self.status == 'complete' else min(stats['progress'], 99)
+        return {
+            'task_id': self.id,
+            'directory': self.directory,
+            'status': self.status,
+            'progress': progress,
+            'found_files': stats['discovered'],
+            'discovered': stats['discovered'],
+            'probed': stats['probed'],
+            'thumbnailed': stats['thumbnailed'],
+            'failed': stats['failed'],
+            'eta_seconds': stats['eta_seconds'] if self.active else 0,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'stats': stats,
+        }
+
+# Menedżer zadań skanowania (jedno aktywne zadanie na katalog)
+class ScanTaskManager:
+    def __init__(self):
+        self._config = None
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._config = app.config
+
+    def start(self, directory, recursive=True, generate_thumbnails=True, incremental=True):
+        """
+        Uruchamia skanowanie w tle. Zwraca (zadanie, utworzono) - jeśli katalog
+        jest już skanowany, zwracane jest istniejące zadanie i False.
+        """
+        directory = os.path.realpath(directory)
+        with self._lock:
+            for task in self._tasks.values():
+                if task.active and task.directory == directory:
+                    return task, False
+
+            task = ScanTask(directory, recursive, generate_thumbnails, incremental)
+            self._tasks[task.id] = task
+            self._trim()
+
+        thread = threading.Thread(target=self._run, args=(task,), name=f'media-scan-{task.id[:8]}', daemon=True)
+        thread.start()
+        return task, True
+
+    def get(self, task_id):
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def cancel(self, task_id):
+        task = self.get(task_id)
+        if task is None:
+            return None
+        if task.active:
+            task.cancel_event.set()
+        return task
+
+    def list(self):
+        with self._lock:
+            return list(self._tasks.values())
+
+    def _trim(self):
+        finished = [task for task in self._tasks.values() if not task.active]
+        for task in finished[:-MAX_FINISHED_TASKS]:
+            del self._tasks[task.id]
+
+    def _run(self, task):
+        pool = get_pool(self._config)
+        db = pool.acquire()
+        task.status = 'running'
+        try:
+            scan_media_directory(
+                task.directory, db,
+                recursive=task.recursive,
+                generate_thumbnails=task.generate_thumbnails,
+                config=self._config,
+                stats=task.stats,
+                incremental=task.incremental,
+                cancel_event=task.cancel_event,
+            )
+            task.status = 'complete'
+        except ScanCancelled:
+            task.status = 'cancelled'
+        except Exception as e:
+            task.status = 'error'
+            task.error = str(e)
+            print(f"Błąd skanowania katalogu {task.directory}: {str(e)}")
+        finally:
+            task.finished_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            pool.release(db)
+
+        # Po skanowaniu magazyn miniatur wraca do budżetu
+        if task.generate_thumbnails:
+            try:
+                thumbnail_store.evict()
+            except Exception as e:
+                print(f"Błąd porządkowania miniatur: {str(e)}")
+
+# Globalny menedżer zadań skanowania
+scan_tasks = ScanTaskManager()
@@ -0,0 +1,317 @@
+# migrations.py
+import os
+import re
+import sqlite3
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+# Podział skryptu SQL na pojedyncze polecenia (executescript zatwierdza transakcję,
+# więc schemat wykonujemy polecenie po poleceniu w transakcji migracji)
+def split_sql_script(script):
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statement = buffer.strip()
+            if statement.rstrip(';').strip():
+                statements.append(statement)
+            buffer = ''
+    return statements
+
+# Migracja 1 - schemat bazowy z pliku schema.sql
+def _apply_base_schema(db):
+    with open(SCHEMA_FILE, 'r') as f:
+        for statement in split_sql_script(f.read()):
+            db.execute(statement)
+
+# Migracja 7 - indeks pełnotekstowy mediów wypełniony istniejącymi danymi
+def _create_media_search(db):
+    from search_helpers import MEDIA_SEARCH_TABLES, create_media_search_sql, rebuild_media_search
+    for table in MEDIA_SEARCH_TABLES:
+        db.execute(create_media_search_sql(table))
+    rebuild_media_search(db)
+
+# Migracja 10 - tabele indeksu dla każdego typu i dłuższe indeksy prefiksów
+def _recreate_media_search(db):
+    from search_helpers import MEDIA_SEARCH_TABLES
+    for table in MEDIA_SEARCH_TABLES:
+        db.execute(f'DROP TABLE IF EXISTS {table}')
+    _create_media_search(db)
+
+# Lista migracji: (wersja, opis, lista poleceń SQL lub funkcja przyjmująca połączenie)
+# Nowe migracje dopisujemy zawsze na końcu z kolejnym numerem wersji.
+MIGRATIONS = [
+    (1, 'Schemat bazowy', _apply_base_schema),
+    (2, 'Indeksy dla kolumn używanych w WHERE/ORDER BY', [
+        'CREATE INDEX IF NOT EXISTS idx_shared_files_file_path ON shared_files (file_path)',
+        'CREATE INDEX IF NOT EXISTS idx_devices_status ON devices (status)',
+        'CREATE INDEX IF NOT EXISTS idx_media_items_type_title ON media_items (media_type, title)',
+        'CREATE INDEX IF NOT EXISTS idx_media_items_title ON media_items (title)',
+        'CREATE INDEX IF NOT EXISTS idx_access_logs_timestamp ON access_logs (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_playlist_items_position ON playlist_items (playlist_id, position)',
+        'CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_users_role ON users (role)',
+    ]),
+    (3, 'Liczniki statystyk panelu administratora utrzymywane przez wyzwalacze', [
+        '''CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )''',
+        "INSERT OR REPLACE INTO stats_counters (name, value) SELECT 'users', COUNT(*) FROM users",
+        "INSERT OR REPLACE INTO stats_counters (name, value) SELECT 'admins', COUNT(*) FROM users WHERE role = 'admin'",
+        "INSERT OR REPLACE INTO stats_counters (name, value) SELECT 'devices', COUNT(*) FROM devices",
+        "INSERT OR REPLACE INTO stats_counters (name, value) SELECT 'access_logs', COUNT(*) FROM access_logs",
+        '''CREATE TRIGGER IF NOT EXISTS trg_users_insert_stats AFTER INSERT ON users
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'users';
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'admins' AND NEW.role = 'admin';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_users_delete_stats AFTER DELETE ON users
+        BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'users';
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'admins' AND OLD.role = 'admin';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_users_role_stats AFTER UPDATE OF role ON users
+        WHEN (OLD.role = 'admin') != (NEW.role = 'admin')
+        BEGIN
+            UPDATE stats_counters
+            SET value = value + (CASE WHEN NEW.role = 'admin' THEN 1 ELSE -1 END)
+            WHERE name = 'admins';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_devices_insert_stats AFTER INSERT ON devices
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'devices';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_devices_delete_stats AFTER DELETE ON devices
+        BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'devices';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_access_logs_insert_stats AFTER INSERT ON access_logs
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'access_logs';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_access_logs_delete_stats AFTER DELETE ON access_logs
+        BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'access_logs';
+        END''',
+    ]),
+    (4, 'Odcisk pliku (inode, mtime) dla przyrostowego skanowania mediów', [
+        'ALTER TABLE media_items ADD COLUMN file_inode INTEGER',
+        'ALTER TABLE media_items ADD COLUMN file_mtime REAL',
+    ]),
+    (5, 'Klucz miniatury w magazynie adresowanym zawartością', [
+        'ALTER TABLE media_items ADD COLUMN thumbnail_key TEXT',
+    ]),
+    (6, 'Liczniki mediów (łącznie i według typu) utrzymywane przez wyzwalacze', [
+        "INSERT OR REPLACE INTO stats_counters (name, value) SELECT 'media', COUNT(*) FROM media_items",
+        "INSERT OR REPLACE INTO stats_counters (name, value) "
+        "SELECT 'media_' || t.media_type, COUNT(m.id) FROM (SELECT 'video' AS media_type "
+        "UNION ALL SELECT 'audio' UNION ALL SELECT 'image') t "
+        "LEFT JOIN media_items m ON m.media_type = t.media_type GROUP BY t.media_type",
+        '''CREATE TRIGGER IF NOT EXISTS trg_media_items_insert_stats AFTER INSERT ON media_items
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name IN ('media', 'media_' || NEW.media_type);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_media_items_delete_stats AFTER DELETE ON media_items
+        BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name IN ('media', 'media_' || OLD.media_type);
+        END''',
+    ]),
+    (7, 'Indeks pełnotekstowy FTS5 (tytuł, wykonawca, album, gatunek, reżyser, nazwa pliku)',
+     _create_media_search),
+    (8, 'Ułamkowe pozycje elementów playlist (REAL z odstępem 1024) i indeks playlist użytkownika', [
+        '''CREATE TABLE playlist_items_new (
+            playlist_id INTEGER,
+            media_id INTEGER,
+            position REAL NOT NULL,
+            PRIMARY KEY (playlist_id, media_id),
+            FOREIGN KEY (playlist_id) REFERENCES playlists (id) ON DELETE CASCADE,
+            FOREIGN KEY (media_id) REFERENCES media_items (id) ON DELETE CASCADE
+        )''',
+        '''INSERT INTO playlist_items_new (playlist_id, media_id, position)
+        SELECT playlist_id, media_id,
+               1024.0 * ROW_NUMBER() OVER (PARTITION BY playlist_id ORDER BY position, media_id)
+        FROM playlist_items''',
+        'DROP TABLE playlist_items',
+        'ALTER TABLE playlist_items_new RENAME TO playlist_items',
+        # media_id w indeksie - kursor (position, media_id) bez dodatkowego sortowania
+        'CREATE INDEX IF NOT EXISTS idx_playlist_items_position ON playlist_items (playlist_id, position, media_id)',
+        'CREATE INDEX IF NOT EXISTS idx_playlists_user ON playlists (user_id, name)',
+    ]),
+    (9, 'Indeksy metadanych audio dla katalogu DLNA i licznik zmian biblioteki (SystemUpdateID)', [
+        'CREATE INDEX IF NOT EXISTS idx_audio_metadata_artist ON audio_metadata (artist, album, track_number)',
+        'CREATE INDEX IF NOT EXISTS idx_audio_metadata_album ON audio_metadata (album, track_number)',
+        'CREATE INDEX IF NOT EXISTS idx_audio_metadata_genre ON audio_metadata (genre)',
+        "INSERT OR REPLACE INTO stats_counters (name, value) VALUES ('media_updates', 1)",
+        # Zmiany widoczne w katalogu; liczniki odtworzeń i dostępu nie unieważniają odpowiedzi
+        '''CREATE TRIGGER IF NOT EXISTS trg_media_items_insert_updates AFTER INSERT ON media_items
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'media_updates';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_media_items_delete_updates AFTER DELETE ON media_items
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'media_updates';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_media_items_update_updates
+        AFTER UPDATE OF title, file_path, media_type, format, duration, file_size, thumbnail_key ON media_items
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'media_updates';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_audio_metadata_insert_updates AFTER INSERT ON audio_metadata
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'media_updates';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_video_metadata_insert_updates AFTER INSERT ON video_metadata
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'media_updates';
+        END''',
+    ]),
+    (10, 'Osobne tabele FTS5 dla typów mediów i indeksy prefiksów 2-5 znaków', _recreate_media_search),
+    # Usuwanie elementów mediów z playlist (skaner) - klucz główny zaczyna się od playlist_id
+    (11, 'Indeks elementów playlist według media_id', [
+        'CREATE INDEX IF NOT EXISTS idx_playlist_items_media ON playlist_items (media_id)',
+    ]),
+]
+
+# Zapytania aplikacji, dla których sprawdzamy plan wykonania
+KNOWN_QUERIES = [
+    ('login', 'SELECT * FROM users WHERE username = ?', (None,)),
+    ('user_by_id', 'SELECT * FROM users WHERE id = ?', (None,)),
+    ('users_by_created', 'SELECT * FROM users ORDER BY created_at DESC', ()),
+    ('admin_count', "SELECT COUNT(*) FROM users WHERE role = 'admin'", ()),
+    ('user_settings', 'SELECT default_city, theme FROM user_settings WHERE user_id = ?', (None,)),
+    ('device_by_mac', 'SELECT * FROM devices WHERE mac_address = ?', (None,)),
+    ('devices_by_status', 'SELECT * FROM devices WHERE status = ?', (None,)),
+    ('access_logs_recent', 'SELECT * FROM access_logs ORDER BY timestamp DESC LIMIT 50', ()),
+    ('admin_stats', 'SELECT name, value FROM stats_counters WHERE name IN (?, ?, ?, ?)',
+     ('users', 'admins', 'devices', 'access_logs')),
+    ('admin_users_page',
+     'SELECT id, username, email, role, created_at, last_login FROM users '
+     'WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?',
+     (None, None, 50)),
+    ('admin_logs_page',
+     'SELECT l.*, u.username FROM access_logs l LEFT JOIN users u ON u.id = l.user_id '
+     'WHERE l.id < ? ORDER BY l.id DESC LIMIT ?', (None, 50)),
+    ('shared_file_by_path',
+     'UPDATE shared_files SET access_count = access_count + 1, last_accessed = ? WHERE file_path = ?',
+     (None, None)),
+    ('shared_file_delete', 'DELETE FROM shared_files WHERE file_path = ?', (None,)),
+    ('shared_file_by_link', 'SELECT * FROM shared_files WHERE shared_link = ?', (None,)),
+    ('media_by_path', 'SELECT id FROM media_items WHERE file_path = ?', (None,)),
+    ('media_by_id', 'SELECT * FROM media_items WHERE id = ?', (None,)),
+    ('media_thumbnail', 'SELECT file_path, media_type, thumbnail_key, thumbnail_path FROM media_items WHERE id = ?',
+     (None,)),
+    ('media_manifest',
+     'SELECT id, file_path, file_inode, file_size, file_mtime, thumbnail_path, thumbnail_key, title '
+     'FROM media_items WHERE file_path >= ? AND file_path < ?', (None, None)),
+    ('media_list_all',
+     'SELECT m.id, m.title, m.media_type, a.artist AS a_artist, v.resolution AS v_resolution FROM media_items m '
+     'LEFT JOIN audio_metadata a ON a.media_id = m.id LEFT JOIN video_metadata v ON v.media_id = m.id '
+     'WHERE (m.title, m.id) > (?, ?) ORDER BY m.title, m.id LIMIT ?', ('', 0, 21)),
+    ('media_list_type',
+     'SELECT m.id, m.title, m.media_type, a.artist AS a_artist FROM media_items m '
+     'LEFT JOIN audio_metadata a ON a.media_id = m.id '
+     'WHERE m.media_type = ? AND (m.title, m.id) > (?, ?) ORDER BY m.title, m.id LIMIT ?',
+     ('audio', '', 0, 21)),
+    ('media_count', 'SELECT value FROM stats_counters WHERE name = ?', ('media',)),
+    ('media_search_type',
+     'SELECT rowid, bm25(media_search_audio) AS score FROM media_search_audio '
+     'WHERE media_search_audio MATCH ? AND rowid > ? ORDER BY score LIMIT ?',
+     ('"a"*', 0, 50)),
+    ('dlna_artists',
+     "SELECT artist, COUNT(*) FROM audio_metadata WHERE artist > '' GROUP BY artist ORDER BY artist LIMIT ? OFFSET ?",
+     (100, 0)),
+    ('dlna_artist_tracks',
+     'SELECT m.id, m.title FROM audio_metadata a CROSS JOIN media_items m ON m.id = a.media_id '
+     'WHERE a.artist = ? ORDER BY a.album, a.track_number, a.media_id LIMIT ? OFFSET ?', (None, 100, 0)),
+    ('dlna_album_tracks',
+     'SELECT m.id, m.title FROM audio_metadata a CROSS JOIN media_items m ON m.id = a.media_id '
+     'WHERE a.album = ? ORDER BY a.track_number, a.media_id LIMIT ? OFFSET ?', (None, 100, 0)),
+    ('dlna_genre_tracks',
+     'SELECT m.id, m.title FROM audio_metadata a CROSS JOIN media_items m ON m.id = a.media_id '
+     'WHERE a.genre = ? ORDER BY m.title, m.id LIMIT ? OFFSET ?', (None, 100, 0)),
+    ('audio_metadata', 'SELECT * FROM audio_metadata WHERE media_id = ?', (None,)),
+    ('video_metadata', 'SELECT * FROM video_metadata WHERE media_id = ?', (None,)),
+    ('playlist_items', 'SELECT * FROM playlist_items WHERE playlist_id = ? ORDER BY position', (None,)),
+    ('playlist_items_page',
+     'SELECT p.position, m.id, m.title, a.artist AS a_artist FROM playlist_items p '
+     'CROSS JOIN media_items m ON m.id = p.media_id LEFT JOIN audio_metadata a ON a.media_id = m.id '
+     'WHERE p.playlist_id = ? AND (p.position, p.media_id) > (?, ?) ORDER BY p.position, p.media_id LIMIT ?',
+     (None, 0, 0, 51)),
+    ('playlist_neighbour',
+     'SELECT MIN(position) FROM playlist_items WHERE playlist_id = ? AND position > ? AND media_id != ?',
+     (None, 0, 0)),
+    ('playlists_by_user',
+     'SELECT p.id, p.name, p.created_at, p.modified_at, COUNT(i.media_id) AS item_count FROM playlists p '
+     'LEFT JOIN playlist_items i ON i.playlist_id = p.id WHERE p.user_id = ? GROUP BY p.id ORDER BY p.name',
+     (None,)),
+    ('playlist_items_remove_media', 'DELETE FROM playlist_items WHERE media_id = ?', (None,)),
+]
+
+# Odczyt aktualnej wersji schematu
+def get_schema_version(db):
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+# Uruchomienie brakujących migracji
+def run_migrations(db, logger=None):
+    """
+    Wykonuje migracje o numerze wyższym niż PRAGMA user_version.
+    Każda migracja razem ze zmianą user_version wykonywana jest w jednej
+    transakcji (DDL w SQLite jest transakcyjne) - przerwana migracja jest
+    wycofywana w całości i zostanie powtórzona przy następnym uruchomieniu.
+    Zwraca listę zastosowanych wersji.
+    """
+    applied = []
+    if db.in_transaction:
+        db.commit()
+    current = get_schema_version(db)
+
+    for version, description, migration in MIGRATIONS:
+        if version <= current:
+            continue
+
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # Inny proces mógł zastosować migrację, gdy czekaliśmy na blokadę zapisu
+            if get_schema_version(db) >= version:
+                db.commit()
+                continue
+            if callable(migration):
+                migration(db)
+            else:
+                for statement in migration:
+                    db.execute(statement)
+            # PRAGMA nie obsługuje parametrów - wersja pochodzi z listy MIGRATIONS
+            db.execute(f'PRAGMA user_version = {int(version)}')
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+
+        applied.append(version)
+        if logger:
+            logger.info(f"Zastosowano migrację {version}: {description}")
+
+    return applied
+
+# Wyszukiwanie pełnych skanów tabel w planach znanych zapytań
+def find_full_scans(db, queries=None):
+    scans = []
+    for name, sql, params in (queries or KNOWN_QUERIES):
+        plan = db.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        for row in plan:
+            detail = row[-1]
+            # Np. "SCAN media_items" lub "SCAN TABLE media_items" (starsze wersje SQLite);
+            # skan po indeksie ("USING INDEX"/"USING COVERING INDEX") jest dopuszczalny
+            if re.match(r'SCAN (TABLE )?\w+$', detail.strip()):
+                scans.append((name, detail))
+    return scans
+
+# Sprawdzenie planów zapytań - zgłasza błąd przy pełnym skanie tabeli
+def check_query_plans(db, queries=None):
+    scans = find_full_scans(db, queries)
+    if scans:
+        details = '; '.join(f"{name}: {detail}" for name, detail in scans)
+        raise RuntimeError(f"Pełny skan tabeli w zapytaniach: {details}")
+    return True
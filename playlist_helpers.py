@@ -0,0 +1,156 @@
+# playlist_helpers.py
+
+# Odstęp między pozycjami po przenumerowaniu - miejsce na ok. 30 kolejnych wstawień
+# w tym samym miejscu, zanim potrzebne będzie przenumerowanie
+POSITION_GAP = 1024.0
+# Najmniejsza dopuszczalna odległość między sąsiednimi pozycjami (precyzja REAL)
+MIN_POSITION_GAP = 1e-6
+# Maksymalna liczba elementów dodawanych lub usuwanych jednym żądaniem
+MAX_BATCH_ITEMS = 1000
+
+# Pozycja między dwoma sąsiadami (None - początek lub koniec listy)
+def position_between(before, after):
+    """
+    Zwraca pozycję ściśle między before i after albo None, jeśli odstęp jest
+    zbyt mały i playlistę trzeba najpierw przenumerować.
+    """
+    if before is None and after is None:
+        return POSITION_GAP
+    if before is None:
+        return after - POSITION_GAP
+    if after is None:
+        return before + POSITION_GAP
+    if after - before < MIN_POSITION_GAP:
+        return None
+    return before + (after - before) / 2
+
+# Kolejne pozycje dla count elementów wstawianych między before i after
+def positions_between(before, after, count):
+    if after is None:
+        start = before if before is not None else 0.0
+        return [start + POSITION_GAP * (i + 1) for i in range(count)]
+    if before is None:
+        return [after - POSITION_GAP * (count - i) for i in range(count)]
+    step = (after - before) / (count + 1)
+    if step < MIN_POSITION_GAP:
+        return None
+    return [before + step * (i + 1) for i in range(count)]
+
+# Przenumerowanie playlisty (równe odstępy POSITION_GAP) - tylko gdy zabraknie miejsca
+def rebalance_playlist(db, playlist_id):
+    rows = db.execute(
+        'SELECT media_id FROM playlist_items WHERE playlist_id = ? ORDER BY position, media_id',
+        (playlist_id,)
+    ).fetchall()
+    db.executemany(
+        'UPDATE playlist_items SET position = ? WHERE playlist_id = ? AND media_id = ?',
+        [(POSITION_GAP * (i + 1), playlist_id, row[0]) for i, row in enumerate(rows)]
+    )
+    return len(rows)
+
+# Pozycja elementu na playliście (None, jeśli go nie ma)
+def item_position(db, playlist_id, media_id):
+    row = db.execute(
+        'SELECT position FROM playlist_items WHERE playlist_id = ? AND media_id = ?',
+        (playlist_id, media_id)
+    ).fetchone()
+    return row[0] if row else None
+
+# Sąsiedzi miejsca wstawienia: (pozycja poprzednika, pozycja następnika)
+def _neighbours(db, playlist_id, after_media_id=None, before_media_id=None, exclude=None):
+    """
+    after_media_id - wstaw za tym elementem; before_media_id - przed nim;
+    bez obu - na koniec. exclude to przenoszony element, pomijany przy szukaniu sąsiada.
+    Zgłasza KeyError, jeśli wskazanego elementu nie ma na playliście.
+    """
+    exclude = exclude if exclude is not None else -1
+    if after_media_id is not None:
+        before = item_position(db, playlist_id, after_media_id)
+        if before is None:
+            raise KeyError(after_media_id)
+        row = db.execute(
+            'SELECT MIN(position) FROM playlist_items WHERE playlist_id = ? AND position > ? AND media_id != ?',
+            (playlist_id, before, exclude)
+        ).fetchone()
+        return before, row[0]
+    if before_media_id is not None:
+        after = item_position(db, playlist_id, before_media_id)
+        if after is None:
+            raise KeyError(before_media_id)
+        row = db.execute(
+            'SELECT MAX(position) FROM playlist_items WHERE playlist_id = ? AND position < ? AND media_id != ?',
+            (playlist_id, after, exclude)
+        ).fetchone()
+        return row[0], after
+    row = db.execute(
+        'SELECT MAX(position) FROM playlist_items WHERE playlist_id = ? AND media_id != ?',
+        (playlist_id, exclude)
+    ).fetchone()
+    return row[0], None
+
+# Dodanie wielu elementów naraz (na koniec albo za/przed wskazanym elementem)
+def add_playlist_items(db, playlist_id, media_ids, after_media_id=None, before_media_id=None):
+    """
+    Elementy już obecne na playliście i nieistniejące media są pomijane.
+    Zwraca listę dodanych id. Nie zatwierdza transakcji.
+    """
+    media_ids = list(dict.fromkeys(media_ids))
+    if not media_ids:
+        return []
+    placeholders = ', '.join('?' * len(media_ids))
+    existing = {row[0] for row in db.execute(
+        f'SELECT id FROM media_items WHERE id IN ({placeholders}) '
+        f'AND id NOT IN (SELECT media_id FROM playlist_items WHERE playlist_id = ?)',
+        media_ids + [playlist_id]
+    ).fetchall()}
+    media_ids = [media_id for media_id in media_ids if media_id in existing]
+    if not media_ids:
+        return []
+
+    before, after = _neighbours(db, playlist_id, after_media_id, before_media_id)
+    positions = positions_between(before, after, len(media_ids))
+    if positions is None:
+        rebalance_playlist(db, playlist_id)
+        before, after = _neighbours(db, playlist_id, after_media_id, before_media_id)
+        positions = positions_between(before, after, len(media_ids))
+
+    db.executemany(
+        'INSERT INTO playlist_items (playlist_id, media_id, position) VALUES (?, ?, ?)',
+        [(playlist_id, media_id, position) for media_id, position in zip(media_ids, positions)]
+    )
+    return media_ids
+
+# Usunięcie wielu elementów naraz - pozostałe pozycje się nie zmieniają
+def remove_playlist_items(db, playlist_id, media_ids):
+    cursor = db.executemany(
+        'DELETE FROM playlist_items WHERE playlist_id = ? AND media_id = ?',
+        [(playlist_id, media_id) for media_id in dict.fromkeys(media_ids)]
+    )
+    return cursor.rowcount
+
+# Przeniesienie elementu - zapis jednego wiersza
+def move_playlist_item(db, playlist_id, media_id, after_media_id=None, before_media_id=None):
+    """
+    Nowa pozycja to środek między sąsiadami w miejscu docelowym. Tylko gdy odstęp
+    spadnie poniżej MIN_POSITION_GAP, playlista jest raz przenumerowywana.
+    Zwraca (nowa pozycja, czy przenumerowano) albo None, jeśli elementu nie ma na playliście.
+    Zgłasza KeyError dla nieznanego elementu docelowego. Nie zatwierdza transakcji.
+    """
+    if item_position(db, playlist_id, media_id) is None:
+        return None
+    if media_id in (after_media_id, before_media_id):
+        raise ValueError('Element nie może być przeniesiony względem samego siebie')
+
+    before, after = _neighbours(db, playlist_id, after_media_id, before_media_id, exclude=media_id)
+    position = position_between(before, after)
+    rebalanced = position is None
+    if rebalanced:
+        rebalance_playlist(db, playlist_id)
+        before, after = _neighbours(db, playlist_id, after_media_id, before_media_id, exclude=media_id)
+        position = position_between(before, after)
+
+    db.execute(
+        'UPDATE playlist_items SET position = ? WHERE playlist_id = ? AND media_id = ?',
+        (position, playlist_id, media_id)
+    )
+    return position, rebalanced
@@ -0,0 +1,233 @@
+# prefetch_helpers.py
+import concurrent.futures
+import os
+import threading
+import time
+
+from transcode_helpers import transcode_queue, transcode_cache
+from hls_helpers import hls_manager
+
+# Domyślne ustawienia wyprzedzającego przygotowania następnych utworów playlisty
+DEFAULT_PREFETCH_AHEAD = 2
+DEFAULT_PREFETCH_WORKERS = 1
+DEFAULT_HLS_SEGMENTS = 2
+DEFAULT_READAHEAD_BYTES = 8 * 1024 * 1024
+# Kontekst (użytkownik, playlista) bez żądań przez tyle sekund jest zapominany
+DEFAULT_CONTEXT_TTL = 3600
+# Niski priorytet procesów FFmpeg rozgrzewających HLS
+DEFAULT_NICENESS = 10
+
+# Następne elementy playlisty po bieżącym (tylko playlisty danego użytkownika)
+NEXT_ITEMS_QUERY = '''SELECT m.id, m.file_path, m.media_type, m.duration
+    FROM playlist_items cur
+    JOIN playlists pl ON pl.id = cur.playlist_id AND pl.user_id = ?
+    CROSS JOIN playlist_items p ON p.playlist_id = cur.playlist_id
+        AND (p.position, p.media_id) > (cur.position, cur.media_id)
+    CROSS JOIN media_items m ON m.id = p.media_id
+    WHERE cur.playlist_id = ? AND cur.media_id = ?
+    ORDER BY p.position, p.media_id LIMIT ?'''
+
+# Przygotowanie jednego elementu (odczyt z wyprzedzeniem, transkodowanie lub segmenty HLS)
+class PrefetchTarget:
+    def __init__(self, media_id, mode):
+        self.media_id = media_id
+        self.mode = mode
+        self.state = 'pending'
+        self.job = None
+        self.cancel_event = threading.Event()
+        self.started = time.time()
+
+    @property
+    def ready(self):
+        if self.job is not None:
+            return self.job.status == 'complete'
+        return self.state == 'ready'
+
+    def cancel(self):
+        self.cancel_event.set()
+        # Zadanie transkodowania anulujemy tylko, jeśli nikt inny o nie nie prosił
+        if self.job is not None and self.job.active and self.job.requests == 1 and self.job.priority == 'low':
+            transcode_queue.cancel(self.job.id)
+        return not self.ready
+
+# Stan odtwarzania jednej playlisty przez jednego użytkownika
+class PrefetchContext:
+    def __init__(self):
+        self.current = None
+        self.mode = None
+        self.targets = {}
+        self.last_seen = time.time()
+
+# Wyprzedzające przygotowanie następnych elementów playlisty
+class PlaylistPrefetcher:
+    """
+    Żądania strumienia, transkodowania i HLS z parametrem ?playlist=<id> informują,
+    który element playlisty jest odtwarzany. Dla PREFETCH_AHEAD następnych elementów
+    przygotowywane jest to, czego odtwarzacz będzie potrzebował w tym samym trybie:
+    - stream: początek pliku wczytywany do pamięci podręcznej systemu (posix_fadvise),
+    - transcode: zadanie o niskim priorytecie w kolejce transkodowania,
+    - hls: pierwsze segmenty (HlsManager.warm, proces FFmpeg z obniżonym priorytetem).
+    Po przeskoczeniu utworu przygotowania spoza nowego okna są anulowane.
+    """
+    def __init__(self):
+        self.enabled = True
+        self.ahead = DEFAULT_PREFETCH_AHEAD
+        self.workers = DEFAULT_PREFETCH_WORKERS
+        self.hls_segments = DEFAULT_HLS_SEGMENTS
+        self.readahead_bytes = DEFAULT_READAHEAD_BYTES
+        self.context_ttl = DEFAULT_CONTEXT_TTL
+        self.niceness = DEFAULT_NICENESS
+        self._contexts = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self.stats = {'transitions': 0, 'hits': 0, 'partial': 0, 'misses': 0, 'skips': 0,
+                      'started': 0, 'cancelled': 0, 'failed': 0}
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('PREFETCH_ENABLED', True)
+        self.ahead = config.get('PREFETCH_AHEAD', DEFAULT_PREFETCH_AHEAD)
+        self.workers = config.get('PREFETCH_WORKERS') or DEFAULT_PREFETCH_WORKERS
+        self.hls_segments = config.get('PREFETCH_HLS_SEGMENTS', DEFAULT_HLS_SEGMENTS)
+        self.readahead_bytes = config.get('PREFETCH_READAHEAD_BYTES', DEFAULT_READAHEAD_BYTES)
+        self.niceness = config.get('TRANSCODE_LOW_PRIORITY_NICENESS', DEFAULT_NICENESS)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='prefetch'
+            )
+        return self._executor
+
+    def notify(self, db, user_id, playlist_id, media_id, mode, format=None, resolution=None):
+        """
+        Wywoływane przy żądaniu odtworzenia elementu media_id z playlisty playlist_id.
+        mode: 'stream', 'transcode' (wymaga format i resolution) lub 'hls' (wymaga resolution).
+        Kolejne żądania tego samego elementu (np. Range, kolejne segmenty) nic nie kosztują.
+        """
+        if not self.enabled or not self.ahead:
+            return
+        key = (user_id, playlist_id)
+        with self._lock:
+            context = self._contexts.get(key)
+            if context is not None and context.current == media_id and context.mode == mode:
+                context.last_seen = time.time()
+                return
+
+        upcoming = db.execute(NEXT_ITEMS_QUERY, (user_id, playlist_id, media_id, self.ahead)).fetchall()
+
+        with self._lock:
+            self._forget_stale()
+            context = self._contexts.setdefault(key, PrefetchContext())
+            if context.current is not None and context.current != media_id:
+                self.stats['transitions'] += 1
+                target = context.targets.get(media_id)
+                if target is None:
+                    self.stats['misses'] += 1
+                elif target.ready:
+                    self.stats['hits'] += 1
+                else:
+                    self.stats['partial'] += 1
+                # Przejście do elementu spoza przygotowanego okna - przeskok
+                if context.targets and media_id not in context.targets:
+                    self.stats['skips'] += 1
+
+            window = {row['id']: row for row in upcoming}
+            for target_id, target in list(context.targets.items()):
+                # Przygotowanie bieżącego elementu zostaje - odtwarzacz właśnie z niego korzysta
+                if target_id == media_id:
+                    del context.targets[target_id]
+                elif target_id not in window or target.mode != mode:
+                    if target.cancel():
+                        self.stats['cancelled'] += 1
+                    del context.targets[target_id]
+
+            new_targets = []
+            for row in upcoming:
+                if row['id'] in context.targets or not self._supports(row['media_type'], mode, format):
+                    continue
+                target = PrefetchTarget(row['id'], mode)
+                context.targets[row['id']] = target
+                new_targets.append((target, dict(row)))
+            context.current = media_id
+            context.mode = mode
+            context.last_seen = time.time()
+
+        for target, row in new_targets:
+            self.stats['started'] += 1
+            if mode == 'transcode':
+                self._start_transcode(target, row, format, resolution)
+            else:
+                self._get_executor().submit(self._run, target, row, resolution)
+
+    @staticmethod
+    def _supports(media_type, mode, format):
+        if media_type == 'image':
+            return False
+        if mode == 'hls':
+            return media_type == 'video'
+        if mode == 'transcode' and format != 'mp3':
+            return media_type == 'video'
+        return True
+
+    def _start_transcode(self, target, row, format, resolution):
+        if not os.path.exists(row['file_path']):
+            target.state = 'failed'
+            return
+        output_file = transcode_cache.output_path(row['id'], row['file_path'], format, resolution)
+        if os.path.exists(output_file):
+            target.state = 'ready'
+            return
+        target.job, _ = transcode_queue.submit(row['id'], row['file_path'], output_file, format, resolution,
+                                               row['duration'], priority='low')
+        target.state = 'running'
+
+    def _run(self, target, row, resolution):
+        if target.cancel_event.is_set():
+            return
+        target.state = 'running'
+        try:
+            if target.mode == 'hls':
+                ready = hls_manager.warm(row['id'], row['file_path'], resolution, row['duration'] or 0,
+                                         self.hls_segments, target.cancel_event, self.niceness)
+            else:
+                ready = self._readahead(row['file_path'])
+            target.state = 'ready' if ready else 'failed'
+        except Exception as e:
+            target.state = 'failed'
+            print(f"Błąd przygotowania {row['file_path']}: {str(e)}")
+        if target.state == 'failed' and not target.cancel_event.is_set():
+            self.stats['failed'] += 1
+
+    def _readahead(self, file_path):
+        # Wczytanie początku pliku do pamięci podręcznej systemu - pierwsze bajty
+        # następnego utworu nie czekają na dysk (np. uśpiony dysk sieciowy)
+        with open(file_path, 'rb') as f:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, self.readahead_bytes, os.POSIX_FADV_WILLNEED)
+            else:
+                f.read(self.readahead_bytes)
+        return True
+
+    def _forget_stale(self):
+        cutoff = time.time() - self.context_ttl
+        for key, context in list(self._contexts.items()):
+            if context.last_seen < cutoff:
+                for target in context.targets.values():
+                    target.cancel()
+                del self._contexts[key]
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            contexts = len(self._contexts)
+            pending = sum(1 for context in self._contexts.values()
+                          for target in context.targets.values() if not target.ready)
+        measured = stats['hits'] + stats['partial'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / measured, 4) if measured else None
+        stats['contexts'] = contexts
+        stats['pending'] = pending
+        return stats
+
+# Globalny mechanizm wyprzedzającego przygotowania
+playlist_prefetcher = PlaylistPrefetcher()
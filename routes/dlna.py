@@ -0,0 +1,151 @@
+# routes/dlna.py
+from flask import Blueprint, request, current_app, send_file, abort
+import os
+import ipaddress
+import uuid
+
+from dlna_helpers import (dlna_server, device_description, parse_soap_request, soap_response, soap_fault,
+                          UpnpError, CONTENT_DIRECTORY, CONNECTION_MANAGER, CONTENT_DIRECTORY_SCPD,
+                          CONNECTION_MANAGER_SCPD, SOURCE_PROTOCOL_INFO, DLNA_MIME_TYPES, DLNA_FLAGS,
+                          DLNA_ENVIRON_KEY, DEFAULT_MAX_AGE)
+from thumbnail_helpers import thumbnail_store, DEFAULT_RENDITION
+
+# Funkcja do importowania get_db bez cyklicznych importów
+def get_db():
+    from app import get_db as app_get_db
+    return app_get_db()
+
+# Inicjalizacja blueprint (odbiorniki DLNA nie logują się - dostęp tylko z sieci lokalnej)
+dlna_bp = Blueprint('dlna', __name__, url_prefix='/dlna')
+
+# Możliwości wyszukiwania zgłaszane odbiornikom (GetSearchCapabilities)
+SEARCH_CAPABILITIES = 'dc:title,dc:creator,upnp:artist,upnp:album,upnp:genre,upnp:class'
+
+@dlna_bp.before_request
+def restrict_to_local_network():
+    # Ścieżki /dlna/ obsługiwane są tylko na porcie DLNA, a nie na porcie aplikacji
+    if not request.environ.get(DLNA_ENVIRON_KEY):
+        abort(404)
+    try:
+        address = ipaddress.ip_address(request.remote_addr)
+    except ValueError:
+        abort(403)
+    if not (address.is_private or address.is_loopback or address.is_link_local):
+        abort(403)
+
+# Odpowiedź XML
+def xml_response(content, status=200):
+    response = current_app.response_class(content, status=status, mimetype='text/xml')
+    response.headers['Content-Type'] = 'text/xml; charset="utf-8"'
+    return response
+
+# Opis urządzenia
+@dlna_bp.route('/description.xml')
+def description():
+    return xml_response(device_description(current_app.config))
+
+# Opisy usług
+@dlna_bp.route('/ContentDirectory.xml')
+def content_directory_scpd():
+    return xml_response(CONTENT_DIRECTORY_SCPD)
+
+@dlna_bp.route('/ConnectionManager.xml')
+def connection_manager_scpd():
+    return xml_response(CONNECTION_MANAGER_SCPD)
+
+# Odczyt liczby całkowitej z argumentów akcji
+def int_argument(args, name):
+    try:
+        return max(int(args.get(name) or 0), 0)
+    except ValueError:
+        raise UpnpError(402, 'Invalid Args')
+
+# Sterowanie usługą ContentDirectory (Browse, Search)
+@dlna_bp.route('/control/ContentDirectory', methods=['POST'])
+def content_directory_control():
+    directory = dlna_server.content_directory
+    try:
+        action, args = parse_soap_request(request.get_data())
+        if action in ('Browse', 'Search'):
+            db = get_db()
+            start = int_argument(args, 'StartingIndex')
+            requested = int_argument(args, 'RequestedCount')
+            if action == 'Browse':
+                result = directory.browse(db, args.get('ObjectID', '0'), args.get('BrowseFlag'), start,
+                                          requested, request.host_url)
+            else:
+                result = directory.search(db, args.get('ContainerID', '0'), args.get('SearchCriteria', '*'),
+                                          start, requested, request.host_url)
+            didl, returned, total, update_id = result
+            values = [('Result', didl), ('NumberReturned', returned), ('TotalMatches', total),
+                      ('UpdateID', update_id)]
+        elif action == 'GetSystemUpdateID':
+            values = [('Id', directory.update_id(get_db()))]
+        elif action == 'GetSearchCapabilities':
+            values = [('SearchCaps', SEARCH_CAPABILITIES)]
+        elif action == 'GetSortCapabilities':
+            values = [('SortCaps', '')]
+        else:
+            raise UpnpError(401, 'Invalid Action')
+    except UpnpError as e:
+        return xml_response(soap_fault(e.code, e.description), 500)
+    return xml_response(soap_response(CONTENT_DIRECTORY, action, values))
+
+# Sterowanie usługą ConnectionManager (wymagana przez specyfikację MediaServer)
+@dlna_bp.route('/control/ConnectionManager', methods=['POST'])
+def connection_manager_control():
+    try:
+        action, args = parse_soap_request(request.get_data())
+        if action == 'GetProtocolInfo':
+            values = [('Source', SOURCE_PROTOCOL_INFO), ('Sink', '')]
+        elif action == 'GetCurrentConnectionIDs':
+            values = [('ConnectionIDs', '0')]
+        elif action == 'GetCurrentConnectionInfo':
+            if args.get('ConnectionID', '0') != '0':
+                raise UpnpError(706, 'Invalid connection reference')
+            values = [('RcsID', -1), ('AVTransportID', -1), ('ProtocolInfo', ''), ('PeerConnectionManager', ''),
+                      ('PeerConnectionID', -1), ('Direction', 'Output'), ('Status', 'OK')]
+        else:
+            raise UpnpError(401, 'Invalid Action')
+    except UpnpError as e:
+        return xml_response(soap_fault(e.code, e.description), 500)
+    return xml_response(soap_response(CONNECTION_MANAGER, action, values))
+
+# Subskrypcje zdarzeń - część odbiorników nie przegląda serwera, który ich nie przyjmuje.
+# Zdarzenia nie są wysyłane; odbiorniki odczytują SystemUpdateID przy przeglądaniu.
+@dlna_bp.route('/event/<service>', methods=['SUBSCRIBE', 'UNSUBSCRIBE'])
+def event_subscription(service):
+    if service not in ('ContentDirectory', 'ConnectionManager'):
+        abort(404)
+    response = current_app.response_class(status=200)
+    if request.method == 'SUBSCRIBE':
+        response.headers['SID'] = request.headers.get('SID') or f'uuid:{uuid.uuid4()}'
+        response.headers['TIMEOUT'] = f"Second-{current_app.config.get('DLNA_MAX_AGE', DEFAULT_MAX_AGE)}"
+    return response
+
+# Plik mediów dla odbiornika (Range - przewijanie, nagłówki DLNA)
+@dlna_bp.route('/media/<int:media_id>', methods=['GET', 'HEAD'])
+def media_file(media_id):
+    media = get_db().execute('SELECT file_path, format FROM media_items WHERE id = ?', (media_id,)).fetchone()
+    if not media or not os.path.exists(media['file_path']):
+        abort(404)
+
+    st = os.stat(media['file_path'])
+    mimetype = DLNA_MIME_TYPES.get((media['format'] or '').lower())
+    response = send_file(media['file_path'], mimetype=mimetype, conditional=True,
+                         etag=f"{media_id}-{st.st_size:x}-{int(st.st_mtime):x}",
+                         last_modified=st.st_mtime, max_age=0)
+    response.headers['transferMode.dlna.org'] = 'Streaming'
+    response.headers['contentFeatures.dlna.org'] = DLNA_FLAGS
+    return response
+
+# Okładka / miniatura elementu
+@dlna_bp.route('/thumbnail/<int:media_id>')
+def media_thumbnail(media_id):
+    media = get_db().execute('SELECT thumbnail_key FROM media_items WHERE id = ?', (media_id,)).fetchone()
+    path = None
+    if media and media['thumbnail_key']:
+        path = thumbnail_store.path(media['thumbnail_key'], DEFAULT_RENDITION)
+    if path is None or not os.path.exists(path):
+        abort(404)
+    return send_file(path, mimetype='image/jpeg', max_age=3600)
@@ -7,6 +7,9 @@ import mimetypes
 import hashlib
 import shutil
 
+from counter_helpers import record_file_access
+from settings_helpers import get_user_theme
+
 # Function to import get_db without circular imports
 def get_db():
     from app import get_db as app_get_db
@@ -28,34 +31,6 @@ def generate_secure_link():
     """Generate a secure, unique link for sharing"""
     return hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:16]
 
-def init_file_sharing_tables():
-    """Initialize tables for file sharing"""
-    try:
-        db = get_db()
-        # Create shared_files table if not exists
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS shared_files (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                file_path TEXT NOT NULL,
-                filename TEXT NOT NULL,
-                file_size INTEGER DEFAULT 0,
-                is_directory BOOLEAN DEFAULT 0,
-                shared_link TEXT UNIQUE,
-                link_expiration DATETIME,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                last_accessed DATETIME,
-                access_count INTEGER DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        db.commit()
-        current_app.logger.info("File sharing tables initialized successfully")
-        return True
-    except Exception as e:
-        current_app.logger.error(f"Error initializing file sharing tables: {str(e)}")
-        return False
-
 def ensure_dir_exists():
     """Ensure the shared directory exists and is writable"""
     try:
@@ -91,12 +66,8 @@ def on_load(state):
             else:
                 app.logger.error(f"Failed to create base directory: {BASE_SHARE_DIR}")
             
-            # Initialize tables
-            success_db = init_file_sharing_tables()
-            if not success_db:
-                app.logger.error("Failed to initialize file sharing tables")
-                
-            if os.path.exists(BASE_SHARE_DIR) and success_db:
+            # Tables are created by the schema migrations at startup (migrations.py)
+            if os.path.exists(BASE_SHARE_DIR):
                 app.logger.info("File sharing system initialized successfully")
         except Exception as e:
             app.logger.error(f"Error initializing file sharing system: {str(e)}")
@@ -107,13 +78,7 @@ def on_load(state):
 def file_sharing_page():
     """Main file sharing page"""
     # Get user theme
-    db = get_db()
-    settings = db.execute('SELECT theme FROM user_settings WHERE user_id = ?',
-                        (g.user_id,)).fetchone()
-    theme = settings['theme'] if settings else 'light'
-    
-    # Also attempt to initialize tables on first access to the page
-    init_file_sharing_tables()
+    theme = get_user_theme(g.user_id)
     
     return render_template('file_sharing.html', 
                         app_name=current_app.config['APP_NAME'], 
@@ -127,9 +92,6 @@ def file_sharing_page():
 @login_required
 def list_files():
     """List files in a specified directory"""
-    # Initialize tables
-    init_file_sharing_tables()
-    
     path_param = request.args.get('path', '')
     
     try:
@@ -445,18 +407,8 @@ def download_file():
         directory = os.path.dirname(real_path)
         filename = os.path.basename(real_path)
         
-        # Update last accessed and access count
-        try:
-            db = get_db()
-            db.execute(
-                'UPDATE shared_files SET last_accessed = ?, access_count = access_count + 1 WHERE file_path = ?',
-                (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), real_path)
-            )
-            db.commit()
-            current_app.logger.info(f"File access recorded for {real_path}")
-        except Exception as e:
-            current_app.logger.warning(f"Error updating file access: {str(e)}")
-            # Continue with download even if update fails
+        # Update last accessed and access count (buffered, flushed in batches)
+        record_file_access(file_path=real_path)
         
         return send_from_directory(directory, filename, as_attachment=True)
     except Exception as e:
@@ -502,16 +454,8 @@ def preview_file():
         # Podziel typy plików na kategorie do obsługi podglądu
         file_category = get_file_category(real_path)
         
-        # Aktualizuj statystyki dostępu
-        try:
-            db = get_db()
-            db.execute(
-                'UPDATE shared_files SET last_accessed = ?, access_count = access_count + 1 WHERE file_path = ?',
-                (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), real_path)
-            )
-            db.commit()
-        except Exception as e:
-            current_app.logger.warning(f"Error updating file access: {str(e)}")
+        # Aktualizuj statystyki dostępu (zapis buforowany)
+        record_file_access(file_path=real_path)
         
         # W zależności od kategorii pliku, zwróć odpowiedni response
         if file_category == 'image':
@@ -645,12 +589,8 @@ def access_shared_file(share_link):
                 current_app.logger.warning(f"Attempt to access expired share link: {share_link}")
                 return render_template('error.html', error='Link udostępniania wygasł'), 410
         
-        # Update last accessed and access count
-        db.execute(
-            'UPDATE shared_files SET last_accessed = ?, access_count = access_count + 1 WHERE shared_link = ?',
-            (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), share_link)
-        )
-        db.commit()
+        # Update last accessed and access count (buffered, flushed in batches)
+        record_file_access(shared_link=share_link)
         
         # Send file
         real_path = file_info['file_path']
@@ -1,10 +1,44 @@
 # routes/media_center.py
 from flask import Blueprint, request, jsonify, render_template, g, current_app, send_file
 import os
-import json
-import mimetypes
 from datetime import datetime
-import subprocess
+
+from counter_helpers import counter_buffer, record_media_play
+from settings_helpers import get_user_theme
+from media_tasks import scan_tasks
+from media_helpers import generate_thumbnail, probe_media
+from thumbnail_helpers import thumbnail_store, DEFAULT_RENDITION
+from transcode_helpers import transcode_queue, transcode_cache, live_transcoder
+from hls_helpers import hls_manager, hls_ladder, build_master_playlist, segment_count
+from media_helpers import TRANSCODE_FORMATS, TRANSCODE_RESOLUTIONS
+from media_helpers import LIVE_AUDIO_FORMATS, LIVE_MIN_BITRATE, LIVE_MAX_BITRATE
+from search_helpers import (search_media as search_media_index, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT,
+                            MEDIA_SEARCH_TYPES)
+from playlist_helpers import (add_playlist_items, remove_playlist_items, move_playlist_item,
+                              MAX_BATCH_ITEMS)
+from prefetch_helpers import playlist_prefetcher
+
+# Czas przechowywania miniatur w pamięci przeglądarki, gdy URL zawiera klucz (?v=)
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+
+# Funkcja do importowania get_db bez cyklicznych importów
+def get_db():
+    from app import get_db as app_get_db
+    return app_get_db()
+
+# Połączenie tylko do odczytu dla endpointów, które niczego nie zapisują
+def get_read_db():
+    from app import get_read_db as app_get_read_db
+    return app_get_read_db()
+
+# Funkcja do importowania login_required bez cyklicznych importów
+def login_required(f):
+    from auth_helpers import login_required as auth_login_required
+    return auth_login_required(f)
+
+def admin_required(f):
+    from auth_helpers import admin_required as auth_admin_required
+    return auth_admin_required(f)
 
 # Inicjalizacja blueprint
 media_center_bp = Blueprint('media_center', __name__)
@@ -14,10 +48,7 @@ media_center_bp = Blueprint('media_center', __name__)
 @login_required
 def media_center_page():
     # Pobierz ustawienia użytkownika
-    db = get_db()
-    settings = db.execute('SELECT theme FROM user_settings WHERE user_id = ?',
-                         (g.user_id,)).fetchone()
-    theme = settings['theme'] if settings else 'light'
+    theme = get_user_theme(g.user_id)
     
     return render_template('media_center.html', 
                          app_name=current_app.config['APP_NAME'],
@@ -25,49 +56,176 @@ def media_center_page():
                          role=g.role,
                          theme=theme)
 
+# Kolumny media_items dostępne w projekcji listy (parametr fields)
+MEDIA_LIST_COLUMNS = ('id', 'title', 'file_path', 'media_type', 'format', 'duration', 'file_size',
+                      'thumbnail_path', 'thumbnail_key', 'created_at', 'last_accessed', 'play_count')
+# Kolumny metadanych dołączanych przez LEFT JOIN - w odpowiedzi zagnieżdżone w 'metadata'
+MEDIA_LIST_METADATA = {
+    'audio': ('audio_metadata', 'a', ('artist', 'album', 'genre', 'track_number', 'year', 'bitrate',
+                                      'sample_rate')),
+    'video': ('video_metadata', 'v', ('director', 'resolution', 'framerate', 'codec', 'subtitle_paths')),
+}
+# Kolumny potrzebne zawsze: kursor (title, id) i rozpoznanie tabeli metadanych
+MEDIA_LIST_REQUIRED = ('id', 'title', 'media_type')
+MEDIA_PAGE_SIZE = 20
+MEDIA_MAX_PAGE_SIZE = 200
+
+# Wybór kolumn na podstawie parametru fields (np. "title,thumbnail_key,duration,artist")
+def media_list_projection(fields):
+    """
+    Zwraca (kolumny media_items, {typ: kolumny metadanych}). Bez fields zwracane
+    są wszystkie kolumny; "metadata" oznacza wszystkie kolumny metadanych,
+    a pojedyncze nazwy (np. artist, resolution) - tylko te kolumny.
+    """
+    if not fields:
+        return list(MEDIA_LIST_COLUMNS), {t: list(m[2]) for t, m in MEDIA_LIST_METADATA.items()}
+
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = requested - set(MEDIA_LIST_COLUMNS) - {'metadata'} - {
+        column for _, _, columns in MEDIA_LIST_METADATA.values() for column in columns
+    }
+    if unknown:
+        raise ValueError(f"Nieznane pola: {', '.join(sorted(unknown))}")
+
+    columns = [c for c in MEDIA_LIST_COLUMNS if c in requested or c in MEDIA_LIST_REQUIRED]
+    metadata = {}
+    for media_type, (_, _, metadata_columns) in MEDIA_LIST_METADATA.items():
+        selected = [c for c in metadata_columns if 'metadata' in requested or c in requested]
+        if selected:
+            metadata[media_type] = selected
+    return columns, metadata
+
+# SELECT z media_items i dołączonymi (LEFT JOIN) tabelami metadanych
+def media_list_select(columns, metadata, media_type=None, source='media_items m', extra=()):
+    select = [f'm.{c}' for c in columns] + list(extra)
+    joins = []
+    for metadata_type, metadata_columns in metadata.items():
+        # Metadane innego typu niż filtrowany nie mogą wystąpić - pomijamy JOIN
+        if media_type and media_type != metadata_type:
+            continue
+        table, alias, _ = MEDIA_LIST_METADATA[metadata_type]
+        joins.append(f'LEFT JOIN {table} {alias} ON {alias}.media_id = m.id')
+        select.extend(f'{alias}.{c} AS {alias}_{c}' for c in metadata_columns)
+    return f"SELECT {', '.join(select)} FROM {source} {' '.join(joins)}"
+
+# Budowanie zapytania listy mediów: jeden LEFT JOIN zamiast zapytania o metadane dla każdego wiersza
+def build_media_list_query(columns, metadata, media_type=None, after=None, limit=MEDIA_PAGE_SIZE):
+    """
+    Stronicowanie kursorowe po (title, id) korzysta z indeksu (media_type, title)
+    lub (title) - koszt strony nie zależy od jej numeru, w przeciwieństwie do OFFSET.
+    """
+    query = media_list_select(columns, metadata, media_type)
+    conditions = []
+    params = []
+    if media_type:
+        conditions.append('m.media_type = ?')
+        params.append(media_type)
+    if after is not None:
+        conditions.append('(m.title, m.id) > (?, ?)')
+        params.extend(after)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY m.title, m.id LIMIT ?'
+    params.append(limit)
+    return query, params
+
+# Szacunkowa liczba mediów z liczników utrzymywanych przez wyzwalacze (migracja 6)
+def estimate_media_count(db, media_type=None):
+    name = f'media_{media_type}' if media_type else 'media'
+    row = db.execute('SELECT value FROM stats_counters WHERE name = ?', (name,)).fetchone()
+    return row['value'] if row else None
+
+# Zamiana wiersza z JOIN na słownik z zagnieżdżonymi metadanymi
+def media_list_row(row, columns, metadata):
+    item = {c: row[c] for c in columns}
+    metadata_columns = metadata.get(item['media_type'])
+    if metadata_columns:
+        alias = MEDIA_LIST_METADATA[item['media_type']][1]
+        values = {c: row[f'{alias}_{c}'] for c in metadata_columns}
+        # Brak wiersza w tabeli metadanych - LEFT JOIN zwraca same NULL
+        if any(v is not None for v in values.values()):
+            item['metadata'] = values
+    if 'play_count' in item:
+        # Przyrosty są zapisywane razem z last_accessed - klucz bufora zawsze zawiera tę kolumnę,
+        # a znacznik czasu kopiujemy tylko wtedy, gdy klient o niego prosił
+        with_timestamp = 'last_accessed' in item
+        counter_buffer.overlay(item, 'media_items', 'id', 'play_count', 'last_accessed')
+        if not with_timestamp:
+            item.pop('last_accessed', None)
+    return item
+
 # API - Pobieranie listy mediów
 @media_center_bp.route('/api/media/list')
 @login_required
 def list_media():
     media_type = request.args.get('type', 'all')  # 'all', 'video', 'audio', 'image'
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    limit = request.args.get('limit', request.args.get('per_page', MEDIA_PAGE_SIZE, type=int), type=int)
+    limit = max(1, min(limit, MEDIA_MAX_PAGE_SIZE))
+    after_title = request.args.get('after_title')
+    after_id = request.args.get('after_id', type=int)
     
-    # Budowanie zapytania SQL
-    query = 'SELECT * FROM media_items'
-    params = []
+    try:
+        columns, metadata = media_list_projection(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if media_type != 'all':
-        query += ' WHERE media_type = ?'
-        params.append(media_type)
+    media_type = None if media_type == 'all' else media_type
+    after = (after_title, after_id) if after_title is not None and after_id is not None else None
+    query, params = build_media_list_query(columns, metadata, media_type, after, limit + 1)
     
-    query += ' ORDER BY title LIMIT ? OFFSET ?'
-    params.extend([per_page, (page-1) * per_page])
+    db = get_read_db()
+    rows = db.execute(query, params).fetchall()
+    items = [media_list_row(row, columns, metadata) for row in rows[:limit]]
     
-    # Wykonanie zapytania
-    db = get_db()
-    items = db.execute(query, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = {'after_title': last['title'], 'after_id': last['id']}
     
-    # Konwersja na format JSON
-    result = []
-    for item in items:
-        media_item = dict(item)
-        
-        # Pobierz dodatkowe metadane
-        if item['media_type'] == 'audio':
-            metadata = db.execute('SELECT * FROM audio_metadata WHERE media_id = ?', 
-                                (item['id'],)).fetchone()
-            if metadata:
-                media_item['metadata'] = dict(metadata)
-        elif item['media_type'] == 'video':
-            metadata = db.execute('SELECT * FROM video_metadata WHERE media_id = ?', 
-                                (item['id'],)).fetchone()
-            if metadata:
-                media_item['metadata'] = dict(metadata)
-        
-        result.append(media_item)
+    return jsonify({
+        'items': items,
+        'next': next_cursor,
+        'total_estimate': estimate_media_count(db, media_type),
+    })
+
+# API - Wyszukiwanie mediów (indeks pełnotekstowy media_search)
+# Wyniki to najlepiej dopasowane elementy spośród MAX_RANKED_MATCHES (2000) najnowszych
+# dopasowań - przy bardzo ogólnych zapytaniach starsze pliki mogą nie trafić do wyników.
+# Klient powinien wtedy doprecyzować zapytanie; pełną listę zwraca /api/media/list.
+@media_center_bp.route('/api/media/search')
+@login_required
+def search_media():
+    text = request.args.get('q', '').strip()
+    media_type = request.args.get('type', 'all')
+    limit = max(1, min(request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int), MAX_SEARCH_LIMIT))
+    
+    try:
+        columns, metadata = media_list_projection(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify(result)
+    media_type = None if media_type == 'all' else media_type
+    if media_type is not None and media_type not in MEDIA_SEARCH_TYPES:
+        return jsonify({'error': f'Unknown media type: {media_type}'}), 400
+    db = get_read_db()
+    matches = search_media_index(db, text, media_type, limit)
+    if not matches:
+        return jsonify({'items': [], 'query': text})
+    
+    # Szczegóły znalezionych elementów jednym zapytaniem; kolejność według rankingu
+    ids = [media_id for media_id, _ in matches]
+    query = media_list_select(columns, metadata, media_type)
+    rows = db.execute(f"{query} WHERE m.id IN ({', '.join('?' * len(ids))})", ids).fetchall()
+    by_id = {row['id']: media_list_row(row, columns, metadata) for row in rows}
+    
+    items = []
+    for media_id, score in matches:
+        item = by_id.get(media_id)
+        if item is not None:
+            item['score'] = round(-score, 4)
+            items.append(item)
+    
+    return jsonify({'items': items, 'query': text})
 
 # API - Pobieranie strumienia mediów
 @media_center_bp.route('/api/media/stream/<int:media_id>')
@@ -83,17 +241,155 @@ def stream_media(media_id):
     if not os.path.exists(media['file_path']):
         return jsonify({'error': 'Media file not found'}), 404
     
-    # Aktualizuj statystyki odtwarzania
-    db.execute('''
-        UPDATE media_items 
-        SET play_count = play_count + 1, 
-            last_accessed = ? 
-        WHERE id = ?
-    ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), media_id))
-    db.commit()
+    # Odtworzenie liczone raz na sesję; żądania Range od środka pliku to przewijanie
+    range_header = request.headers.get('Range', '')
+    if not range_header or range_header.replace(' ', '').startswith('bytes=0-'):
+        record_media_play(media_id, g.user_id)
+    
+    notify_prefetcher(db, media_id, 'stream')
+    
+    # Range (206), If-None-Match/If-Modified-Since (304); ścieżka zamiast obiektu pliku
+    # pozwala serwerowi WSGI użyć wsgi.file_wrapper (sendfile), a przy USE_X_SENDFILE
+    # plik wysyła serwer proxy
+    st = os.stat(media['file_path'])
+    return send_file(media['file_path'], conditional=True,
+                     etag=f"{media_id}-{st.st_size:x}-{int(st.st_mtime):x}",
+                     last_modified=st.st_mtime, max_age=0)
+
+# API - transkodowanie audio na żywo (np. flac -> opus dla wolnego łącza), bez plików na dysku
+@media_center_bp.route('/api/media/stream/<int:media_id>/live')
+@login_required
+def live_audio_stream(media_id):
+    format = request.args.get('format', 'opus')
+    bitrate = request.args.get('bitrate', type=int)
+    start = request.args.get('start', 0.0, type=float)
     
-    # Zwróć plik lub przekieruj do transkodowania
-    return send_file(media['file_path'])
+    if format not in LIVE_AUDIO_FORMATS:
+        return jsonify({'error': 'Nieobsługiwany format'}), 400
+    if bitrate is not None and not LIVE_MIN_BITRATE <= bitrate <= LIVE_MAX_BITRATE:
+        return jsonify({'error': f'Przepływność poza zakresem {LIVE_MIN_BITRATE}-{LIVE_MAX_BITRATE} kb/s'}), 400
+    if start < 0:
+        return jsonify({'error': 'Nieprawidłowy punkt startu'}), 400
+    
+    db = get_db()
+    media = db.execute('SELECT file_path, media_type FROM media_items WHERE id = ?', (media_id,)).fetchone()
+    if not media or media['media_type'] != 'audio':
+        return jsonify({'error': 'Media not found'}), 404
+    if not os.path.exists(media['file_path']):
+        return jsonify({'error': 'Media file not found'}), 404
+    
+    try:
+        stream = live_transcoder.open(media['file_path'], format, bitrate, start)
+    except Exception as e:
+        current_app.logger.error(f"Błąd transkodowania na żywo {media['file_path']}: {str(e)}")
+        return jsonify({'error': 'Błąd transkodowania'}), 500
+    if stream is None:
+        response = jsonify({'error': 'Zbyt wiele równoczesnych strumieni'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    if not start:
+        record_media_play(media_id, g.user_id)
+    
+    # Brak Content-Length - odpowiedź wysyłana jest fragmentami (chunked) w miarę postępu FFmpeg
+    response = current_app.response_class(stream, mimetype=LIVE_AUDIO_FORMATS[format][1],
+                                          direct_passthrough=True)
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['Accept-Ranges'] = 'none'
+    # Serwer proxy (nginx) nie powinien buforować strumienia
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Odtwarzanie z playlisty (?playlist=<id>) - przygotowanie następnych elementów
+def notify_prefetcher(db, media_id, mode, format=None, resolution=None):
+    playlist_id = request.args.get('playlist', type=int)
+    if playlist_id is None:
+        return
+    try:
+        playlist_prefetcher.notify(db, g.user_id, playlist_id, media_id, mode, format, resolution)
+    except Exception as e:
+        # Przygotowanie z wyprzedzeniem nie może zablokować odtwarzania
+        current_app.logger.warning(f"Błąd przygotowania następnych elementów playlisty {playlist_id}: {str(e)}")
+
+# Pobranie danych filmu potrzebnych do strumieniowania HLS
+def load_hls_media(media_id):
+    db = get_db()
+    media = db.execute(
+        '''SELECT m.file_path, m.media_type, m.duration, v.resolution 
+        FROM media_items m LEFT JOIN video_metadata v ON v.media_id = m.id 
+        WHERE m.id = ?''',
+        (media_id,)
+    ).fetchone()
+    if not media or media['media_type'] != 'video' or not os.path.exists(media['file_path']):
+        return None
+    
+    media = dict(media)
+    if not media['duration']:
+        probe = probe_media(media['file_path'], 'video')
+        media['duration'] = probe['duration'] if probe else 0
+    return media
+
+# Odpowiedź z playlistą HLS
+def playlist_response(content):
+    response = current_app.response_class(content, mimetype='application/vnd.apple.mpegurl')
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# API - Playlista główna HLS (drabinka jakości)
+@media_center_bp.route('/api/media/hls/<int:media_id>/master.m3u8')
+@login_required
+def hls_master_playlist(media_id):
+    media = load_hls_media(media_id)
+    if media is None:
+        return jsonify({'error': 'Media not found'}), 404
+    
+    source_height, aspect = None, 16 / 9
+    if media['resolution'] and 'x' in media['resolution']:
+        width, height = (int(value) for value in media['resolution'].split('x'))
+        if width and height:
+            source_height, aspect = height, width / height
+    
+    # Kontekst playlisty przechodzi do playlist segmentów (adresy względne gubią parametry)
+    playlist_id = request.args.get('playlist', type=int)
+    query = f'?playlist={playlist_id}' if playlist_id is not None else ''
+    return playlist_response(build_master_playlist(hls_ladder(source_height), aspect, query))
+
+# API - Playlista segmentów HLS dla jednej jakości
+@media_center_bp.route('/api/media/hls/<int:media_id>/<resolution>/index.m3u8')
+@login_required
+def hls_media_playlist(media_id, resolution):
+    if resolution not in TRANSCODE_RESOLUTIONS:
+        return jsonify({'error': 'Nieobsługiwana rozdzielczość'}), 400
+    media = load_hls_media(media_id)
+    if media is None or not media['duration']:
+        return jsonify({'error': 'Media not found'}), 404
+    notify_prefetcher(get_db(), media_id, 'hls', resolution=resolution)
+    return playlist_response(hls_manager.media_playlist(media['duration']))
+
+# API - Segment HLS (tworzony na bieżąco tuż przed pozycją odtwarzania)
+@media_center_bp.route('/api/media/hls/<int:media_id>/<resolution>/<int:segment>.ts')
+@login_required
+def hls_segment(media_id, resolution, segment):
+    if resolution not in TRANSCODE_RESOLUTIONS:
+        return jsonify({'error': 'Nieobsługiwana rozdzielczość'}), 400
+    media = load_hls_media(media_id)
+    if media is None or not media['duration']:
+        return jsonify({'error': 'Media not found'}), 404
+    if segment >= segment_count(media['duration'], hls_manager.segment_seconds):
+        return jsonify({'error': 'Segment not found'}), 404
+    
+    if segment == 0:
+        record_media_play(media_id, g.user_id)
+    
+    path = hls_manager.get_segment(media_id, media['file_path'], resolution, media['duration'], segment)
+    if path is None:
+        response = jsonify({'error': 'Segment nie jest jeszcze gotowy'})
+        response.headers['Retry-After'] = '2'
+        return response, 503
+    
+    response = send_file(path, mimetype='video/mp2t', etag=False)
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
 
 # API - Transkodowanie na żądanie
 @media_center_bp.route('/api/media/transcode/<int:media_id>')
@@ -102,6 +398,9 @@ def transcode_media(media_id):
     format = request.args.get('format', 'mp4')
     resolution = request.args.get('resolution', '720p')
     
+    if format not in TRANSCODE_FORMATS or resolution not in TRANSCODE_RESOLUTIONS:
+        return jsonify({'error': 'Nieobsługiwany format lub rozdzielczość'}), 400
+    
     # Pobierz informacje o mediach
     db = get_db()
     media = db.execute('SELECT * FROM media_items WHERE id = ?', (media_id,)).fetchone()
@@ -109,17 +408,366 @@ def transcode_media(media_id):
     if not media:
         return jsonify({'error': 'Media not found'}), 404
     
-    # Ścieżka do transkodowanego pliku
-    transcoded_dir = os.path.join(current_app.config['TRANSCODE_DIR'], str(media_id))
-    os.makedirs(transcoded_dir, exist_ok=True)
-    transcoded_file = os.path.join(transcoded_dir, f"{os.path.splitext(os.path.basename(media['file_path']))[0]}_{resolution}.{format}")
+    if not os.path.exists(media['file_path']):
+        return jsonify({'error': 'Media file not found'}), 404
+    
+    notify_prefetcher(db, media_id, 'transcode', format, resolution)
     
-    # Sprawdź, czy transkodowany plik już istnieje
-    if os.path.exists(transcoded_file):
-        return send_file(transcoded_file)
+    # Sprawdź, czy transkodowany plik dla bieżącej wersji źródła już istnieje
+    # (plik pojawia się dopiero po zakończeniu transkodowania)
+    transcoded_file, cached = transcode_cache.lookup(media_id, media['file_path'], format, resolution)
+    if cached:
+        return send_file(transcoded_file, conditional=True)
     
-    # Uruchom transkodowanie w tle - tutaj potrzebny byłby system kolejkowania zadań
-    # Dla uproszczenia, zwracamy informację o rozpoczęciu transkodowania
-    return jsonify({'status': 'transcoding_started', 'message': 'Transkodowanie rozpoczęte'})
+    # Dodaj zadanie do kolejki (identyczne żądania łączone są w jedno zadanie)
+    job, created = transcode_queue.submit(media_id, media['file_path'], transcoded_file,
+                                          format, resolution, media['duration'], user_id=g.user_id)
+    if created:
+        current_app.logger.info(f"Transkodowanie {media_id} do {format}/{resolution} (zadanie {job.id})")
+    
+    result = job.to_dict()
+    result['message'] = 'Transkodowanie rozpoczęte' if created else 'Transkodowanie w toku'
+    return jsonify(result), 202
 
-# Pozostałe endpointy API dla playlist, wyszukiwania, itp.
\ No newline at end of file
+# API - postęp transkodowania
+@media_center_bp.route('/api/media/transcode/status/<job_id>')
+@login_required
+def transcode_status(job_id):
+    job = transcode_queue.get(job_id)
+    # Zadanie widzą tylko ci, którzy o nie prosili, oraz administrator
+    if job is None or (g.role != 'admin' and not job.requested_by(g.user_id)):
+        return jsonify({'error': 'Zadanie nie istnieje'}), 404
+    return jsonify(job.to_dict())
+
+# API - anulowanie transkodowania
+@media_center_bp.route('/api/media/transcode/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_transcode(job_id):
+    # Zadanie łączy żądania wielu użytkowników - zwykły użytkownik wycofuje tylko swoje żądanie,
+    # a FFmpeg zatrzymywany jest, gdy nikt inny na wynik nie czeka
+    if g.role == 'admin':
+        job = transcode_queue.cancel(job_id)
+    else:
+        job = transcode_queue.release(job_id, g.user_id)
+    if job is None:
+        return jsonify({'error': 'Zadanie nie istnieje'}), 404
+    return jsonify(job.to_dict())
+
+# API - Miniatura elementu mediów
+@media_center_bp.route('/api/media/thumbnail/<int:media_id>')
+@login_required
+def media_thumbnail(media_id):
+    size = request.args.get('size', DEFAULT_RENDITION)
+    if size not in thumbnail_store.renditions:
+        return jsonify({'error': 'Nieznany rozmiar miniatury'}), 400
+    
+    db = get_db()
+    media = db.execute(
+        'SELECT file_path, media_type, thumbnail_key, thumbnail_path FROM media_items WHERE id = ?',
+        (media_id,)
+    ).fetchone()
+    if not media:
+        return jsonify({'error': 'Media not found'}), 404
+    
+    key = media['thumbnail_key']
+    if key is None and media['thumbnail_path'] and os.path.exists(media['thumbnail_path']):
+        # Miniatura sprzed magazynu miniatur (jeden rozmiar, nazwana po ścieżce pliku)
+        return send_file(media['thumbnail_path'], mimetype='image/jpeg')
+    
+    path = thumbnail_store.path(key, size) if key else None
+    if path is None or not os.path.exists(path):
+        # Miniatura usunięta przez LRU lub jeszcze nie utworzona - generowanie na żądanie
+        if not os.path.exists(media['file_path']):
+            return jsonify({'error': 'Media file not found'}), 404
+        
+        new_key = generate_thumbnail(media['file_path'], media['media_type'], current_app.config,
+                                     store=thumbnail_store)
+        if new_key is None:
+            return jsonify({'error': 'Brak miniatury'}), 404
+        if new_key != key:
+            key = new_key
+            db.execute('UPDATE media_items SET thumbnail_key = ?, thumbnail_path = ? WHERE id = ?',
+                       (key, thumbnail_store.path(key), media_id))
+            db.commit()
+        path = thumbnail_store.path(key, size)
+        thumbnail_store.evict_if_needed()
+    
+    thumbnail_store.touch(path)
+    
+    # Zawartość pod kluczem nigdy się nie zmienia, więc ETag wynika z klucza i rozmiaru
+    etag = f'{key}-{size}'
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = send_file(path, mimetype='image/jpeg', etag=False)
+    response.set_etag(etag)
+    
+    if request.args.get('v') == key:
+        response.headers['Cache-Control'] = f'private, max-age={THUMBNAIL_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Sprawdzenie, czy katalog leży w jednym ze skonfigurowanych katalogów mediów
+def resolve_media_directory(directory):
+    media_dirs = current_app.config.get('MEDIA_DIRS', [])
+    if not directory:
+        return os.path.realpath(media_dirs[0]) if media_dirs else None
+    
+    real_directory = os.path.realpath(directory)
+    for media_dir in media_dirs:
+        real_media_dir = os.path.realpath(media_dir)
+        if real_directory == real_media_dir or real_directory.startswith(real_media_dir + os.sep):
+            return real_directory
+    return None
+
+# API - uruchomienie skanowania katalogu w tle (skanowanie dotyczy całego serwera)
+@media_center_bp.route('/api/media/scan', methods=['POST'])
+@admin_required
+def start_media_scan():
+    data = request.get_json(silent=True) or {}
+    
+    directory = resolve_media_directory(data.get('directory'))
+    if directory is None:
+        return jsonify({'error': 'Katalog spoza skonfigurowanych katalogów mediów'}), 400
+    if not os.path.isdir(directory):
+        return jsonify({'error': 'Katalog nie istnieje'}), 404
+    
+    task, created = scan_tasks.start(
+        directory,
+        recursive=bool(data.get('recursive', True)),
+        generate_thumbnails=bool(data.get('generate_thumbnails', True)),
+        incremental=bool(data.get('incremental', True))
+    )
+    
+    if not created:
+        return jsonify({'error': 'Ten katalog jest już skanowany', 'task_id': task.id}), 409
+    
+    current_app.logger.info(f"Rozpoczęto skanowanie mediów: {directory} (zadanie {task.id})")
+    return jsonify({'task_id': task.id, 'status': task.status}), 202
+
+# API - postęp skanowania
+@media_center_bp.route('/api/media/scan/status/<task_id>')
+@admin_required
+def media_scan_status(task_id):
+    task = scan_tasks.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Zadanie nie istnieje'}), 404
+    return jsonify(task.to_dict())
+
+# API - anulowanie skanowania
+@media_center_bp.route('/api/media/scan/<task_id>/cancel', methods=['POST'])
+@admin_required
+def cancel_media_scan(task_id):
+    task = scan_tasks.cancel(task_id)
+    if task is None:
+        return jsonify({'error': 'Zadanie nie istnieje'}), 404
+    return jsonify(task.to_dict())
+
+# Rozmiar strony elementów playlisty
+PLAYLIST_PAGE_SIZE = 50
+
+# Playlista zalogowanego użytkownika (None, jeśli nie istnieje lub należy do innego)
+def load_user_playlist(db, playlist_id):
+    playlist = db.execute(
+        'SELECT id, name, user_id, created_at, modified_at FROM playlists WHERE id = ? AND user_id = ?',
+        (playlist_id, g.user_id)
+    ).fetchone()
+    return dict(playlist) if playlist else None
+
+# Odczyt listy id mediów z treści żądania ([1, 2] lub [{"media_id": 1}, ...])
+def parse_media_ids(values):
+    if not isinstance(values, list) or len(values) > MAX_BATCH_ITEMS:
+        return None
+    # Elementy z polem position (format formularza playlisty) dodajemy w jego kolejności
+    if all(isinstance(value, dict) for value in values):
+        values = [value.get('media_id') for value in
+                  sorted(values, key=lambda value: value.get('position') or 0)]
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        return None
+    return values
+
+def touch_playlist(db, playlist_id):
+    db.execute('UPDATE playlists SET modified_at = ? WHERE id = ?',
+               (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), playlist_id))
+
+# API - lista playlist użytkownika
+@media_center_bp.route('/api/media/playlists')
+@login_required
+def list_playlists():
+    db = get_read_db()
+    playlists = db.execute(
+        '''SELECT p.id, p.name, p.created_at, p.modified_at, COUNT(i.media_id) AS item_count 
+        FROM playlists p LEFT JOIN playlist_items i ON i.playlist_id = p.id 
+        WHERE p.user_id = ? GROUP BY p.id ORDER BY p.name''',
+        (g.user_id,)
+    ).fetchall()
+    return jsonify([dict(playlist) for playlist in playlists])
+
+# API - utworzenie playlisty (opcjonalnie od razu z elementami)
+@media_center_bp.route('/api/media/playlists', methods=['POST'])
+@login_required
+def create_playlist():
+    data = request.get_json(silent=True) or {}
+    name = (data.get('name') or '').strip()
+    if not name:
+        return jsonify({'error': 'Podaj nazwę playlisty'}), 400
+    media_ids = parse_media_ids(data.get('items', []))
+    if media_ids is None:
+        return jsonify({'error': f'Nieprawidłowa lista elementów (najwyżej {MAX_BATCH_ITEMS})'}), 400
+    
+    db = get_db()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        cursor = db.execute(
+            'INSERT INTO playlists (name, user_id, created_at, modified_at) VALUES (?, ?, ?, ?)',
+            (name, g.user_id, now, now)
+        )
+        playlist_id = cursor.lastrowid
+        added = add_playlist_items(db, playlist_id, media_ids)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        current_app.logger.error(f"Błąd tworzenia playlisty: {str(e)}")
+        return jsonify({'error': 'Nie udało się utworzyć playlisty'}), 500
+    
+    return jsonify({'id': playlist_id, 'name': name, 'created_at': now, 'modified_at': now,
+                    'item_count': len(added)}), 201
+
+# API - zmiana nazwy playlisty
+@media_center_bp.route('/api/media/playlists/<int:playlist_id>', methods=['PATCH'])
+@login_required
+def rename_playlist(playlist_id):
+    data = request.get_json(silent=True) or {}
+    name = (data.get('name') or '').strip()
+    if not name:
+        return jsonify({'error': 'Podaj nazwę playlisty'}), 400
+    
+    db = get_db()
+    if load_user_playlist(db, playlist_id) is None:
+        return jsonify({'error': 'Playlista nie istnieje'}), 404
+    db.execute('UPDATE playlists SET name = ? WHERE id = ?', (name, playlist_id))
+    touch_playlist(db, playlist_id)
+    db.commit()
+    return jsonify(load_user_playlist(db, playlist_id))
+
+# API - usunięcie playlisty
+@media_center_bp.route('/api/media/playlists/<int:playlist_id>', methods=['DELETE'])
+@login_required
+def delete_playlist(playlist_id):
+    db = get_db()
+    if load_user_playlist(db, playlist_id) is None:
+        return jsonify({'error': 'Playlista nie istnieje'}), 404
+    # Klucze obce nie są wymuszane - elementy usuwamy jawnie
+    db.execute('DELETE FROM playlist_items WHERE playlist_id = ?', (playlist_id,))
+    db.execute('DELETE FROM playlists WHERE id = ?', (playlist_id,))
+    db.commit()
+    return jsonify({'deleted': playlist_id})
+
+# API - elementy playlisty ze stronicowaniem kursorowym (position, media_id)
+@media_center_bp.route('/api/media/playlists/<int:playlist_id>/items')
+@login_required
+def list_playlist_items(playlist_id):
+    limit = max(1, min(request.args.get('limit', PLAYLIST_PAGE_SIZE, type=int), MEDIA_MAX_PAGE_SIZE))
+    after_position = request.args.get('after_position', type=float)
+    after_id = request.args.get('after_id', type=int)
+    try:
+        columns, metadata = media_list_projection(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    db = get_read_db()
+    if load_user_playlist(db, playlist_id) is None:
+        return jsonify({'error': 'Playlista nie istnieje'}), 404
+    
+    # CROSS JOIN - pętla po indeksie (playlist_id, position, media_id), media po kluczu głównym
+    query = media_list_select(columns, metadata,
+                              source='playlist_items p CROSS JOIN media_items m ON m.id = p.media_id',
+                              extra=('p.position',))
+    params = [playlist_id]
+    query += ' WHERE p.playlist_id = ?'
+    if after_position is not None and after_id is not None:
+        query += ' AND (p.position, p.media_id) > (?, ?)'
+        params.extend([after_position, after_id])
+    query += ' ORDER BY p.position, p.media_id LIMIT ?'
+    params.append(limit + 1)
+    
+    rows = db.execute(query, params).fetchall()
+    items = []
+    for row in rows[:limit]:
+        item = media_list_row(row, columns, metadata)
+        item['position'] = row['position']
+        items.append(item)
+    
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = {'after_position': items[-1]['position'], 'after_id': items[-1]['id']}
+    return jsonify({'items': items, 'next': next_cursor})
+
+# API - dodanie wielu elementów do playlisty (na koniec lub za/przed wskazanym elementem)
+@media_center_bp.route('/api/media/playlists/<int:playlist_id>/items', methods=['POST'])
+@login_required
+def add_to_playlist(playlist_id):
+    data = request.get_json(silent=True) or {}
+    media_ids = parse_media_ids(data.get('media_ids'))
+    if not media_ids:
+        return jsonify({'error': f'Podaj media_ids (od 1 do {MAX_BATCH_ITEMS} elementów)'}), 400
+    
+    db = get_db()
+    if load_user_playlist(db, playlist_id) is None:
+        return jsonify({'error': 'Playlista nie istnieje'}), 404
+    try:
+        added = add_playlist_items(db, playlist_id, media_ids,
+                                   after_media_id=data.get('after_media_id'),
+                                   before_media_id=data.get('before_media_id'))
+    except KeyError as e:
+        db.rollback()
+        return jsonify({'error': f'Elementu {e.args[0]} nie ma na playliście'}), 400
+    touch_playlist(db, playlist_id)
+    db.commit()
+    return jsonify({'added': added, 'skipped': [media_id for media_id in media_ids if media_id not in added]})
+
+# API - usunięcie wielu elementów z playlisty
+@media_center_bp.route('/api/media/playlists/<int:playlist_id>/items', methods=['DELETE'])
+@login_required
+def remove_from_playlist(playlist_id):
+    data = request.get_json(silent=True) or {}
+    media_ids = parse_media_ids(data.get('media_ids'))
+    if not media_ids:
+        return jsonify({'error': f'Podaj media_ids (od 1 do {MAX_BATCH_ITEMS} elementów)'}), 400
+    
+    db = get_db()
+    if load_user_playlist(db, playlist_id) is None:
+        return jsonify({'error': 'Playlista nie istnieje'}), 404
+    removed = remove_playlist_items(db, playlist_id, media_ids)
+    touch_playlist(db, playlist_id)
+    db.commit()
+    return jsonify({'removed': removed})
+
+# API - przeniesienie elementu playlisty (zapis jednego wiersza)
+@media_center_bp.route('/api/media/playlists/<int:playlist_id>/items/<int:media_id>/move', methods=['POST'])
+@login_required
+def move_in_playlist(playlist_id, media_id):
+    data = request.get_json(silent=True) or {}
+    after_media_id = data.get('after_media_id')
+    before_media_id = data.get('before_media_id')
+    if after_media_id is not None and before_media_id is not None:
+        return jsonify({'error': 'Podaj after_media_id albo before_media_id'}), 400
+    
+    db = get_db()
+    if load_user_playlist(db, playlist_id) is None:
+        return jsonify({'error': 'Playlista nie istnieje'}), 404
+    try:
+        moved = move_playlist_item(db, playlist_id, media_id, after_media_id, before_media_id)
+    except KeyError as e:
+        db.rollback()
+        return jsonify({'error': f'Elementu {e.args[0]} nie ma na playliście'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if moved is None:
+        return jsonify({'error': 'Elementu nie ma na playliście'}), 404
+    
+    position, rebalanced = moved
+    touch_playlist(db, playlist_id)
+    db.commit()
+    return jsonify({'media_id': media_id, 'position': position, 'rebalanced': rebalanced})
\ No newline at end of file
@@ -12,6 +12,8 @@ import threading
 import json
 from datetime import datetime, timedelta
 
+from settings_helpers import get_user_theme
+
 # Funkcja do pobierania bazy danych
 def get_db():
     from app import get_db as app_get_db
@@ -35,11 +37,7 @@ last_scan_file = os.path.join(scan_data_dir, 'last_network_scan.json')
 @login_required
 def network_details():
     # Pobieranie preferencji użytkownika
-    db = get_db()
-    settings = db.execute('SELECT theme FROM user_settings WHERE user_id = ?',
-                          (g.user_id,)).fetchone()
-    
-    theme = settings['theme'] if settings else 'light'
+    theme = get_user_theme(g.user_id)
     
     return render_template('network_details.html', 
                           app_name=current_app.config['APP_NAME'],
@@ -9,6 +9,8 @@ import os
 from datetime import datetime, timedelta
 import random
 
+from settings_helpers import get_user_theme
+
 # Importy funkcji pomocniczych
 def get_db():
     from app import get_db as app_get_db
@@ -65,11 +67,7 @@ def save_speed_history(download_speed, upload_speed):
 @login_required
 def network_enhanced():
     # Pobieranie preferencji użytkownika
-    db = get_db()
-    settings = db.execute('SELECT theme FROM user_settings WHERE user_id = ?',
-                          (g.user_id,)).fetchone()
-    
-    theme = settings['theme'] if settings else 'light'
+    theme = get_user_theme(g.user_id)
     
     return render_template('network_enhanced.html', 
                           app_name=current_app.config['APP_NAME'],
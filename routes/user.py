@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, render_template, redirect, url_fo
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
+from settings_helpers import settings_cache, load_user_settings
+
 # Funkcja do importowania get_db bez cyklicznych importów
 def get_db():
     from app import get_db as app_get_db
@@ -144,6 +146,7 @@ def delete_user(user_id):
     try:
         db.execute('DELETE FROM users WHERE id = ?', (user_id,))
         db.commit()
+        settings_cache.invalidate(user_id)
         
         current_app.logger.info(f"Usunięto użytkownika ID: {user_id}")
         return jsonify({'success': True, 'message': 'Użytkownik usunięty pomyślnie'}), 200
@@ -169,6 +172,7 @@ def delete_user_form(user_id):
     try:
         db.execute('DELETE FROM users WHERE id = ?', (user_id,))
         db.commit()
+        settings_cache.invalidate(user_id)
         
         current_app.logger.info(f"Usunięto użytkownika ID: {user_id}")
         return redirect(url_for('admin_panel'))
@@ -223,20 +227,8 @@ def change_password():
 @user_bp.route('/api/user/settings', methods=['GET'])
 @login_required
 def get_user_settings():
-    db = get_db()
-    settings = db.execute('SELECT * FROM user_settings WHERE user_id = ?', 
-                         (session['user_id'],)).fetchone()
-    
-    # Jeśli użytkownik nie ma zapisanych ustawień, utwórz domyślne
-    if settings is None:
-        db.execute(
-            'INSERT INTO user_settings (user_id, default_city) VALUES (?, ?)',
-            (session['user_id'], 'Warsaw')
-        )
-        db.commit()
-        settings = {'default_city': 'Warsaw'}
-    else:
-        settings = dict(settings)
+    # Ustawienia z pamięci podręcznej; brakujące są tworzone z wartościami domyślnymi
+    settings = load_user_settings(session['user_id'], create=True)
     
     return jsonify(settings)
 
@@ -276,6 +268,7 @@ def update_user_settings():
                 )
         
         db.commit()
+        settings_cache.invalidate(session['user_id'])
         return jsonify({'success': True, 'message': 'Ustawienia zaktualizowane'})
     except Exception as e:
         db.rollback()
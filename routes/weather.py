@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app, session
 import requests
 
+from settings_helpers import load_user_settings
+
 # Funkcja do importowania get_db bez cyklicznych importów
 def get_db():
     from app import get_db as app_get_db
@@ -23,11 +25,9 @@ def get_weather():
     
     # Jeśli nie podano miasta, pobierz domyślne z ustawień użytkownika
     if not city:
-        db = get_db()
-        settings = db.execute('SELECT default_city FROM user_settings WHERE user_id = ?', 
-                             (session['user_id'],)).fetchone()
+        settings = load_user_settings(session['user_id'])
         
-        if settings and settings['default_city']:
+        if settings.get('default_city'):
             city = settings['default_city']
         else:
             city = 'Warsaw'  # Domyślna wartość jeśli nie ma ustawień
@@ -0,0 +1,216 @@
+# search_helpers.py
+import itertools
+import os
+import random
+import re
+
+# Kolumny indeksu pełnotekstowego i ich wagi w rankingu bm25 (ta sama kolejność)
+MEDIA_SEARCH_COLUMNS = ('title', 'artist', 'album', 'genre', 'director', 'file_name')
+MEDIA_SEARCH_WEIGHTS = (10.0, 5.0, 4.0, 2.0, 3.0, 1.0)
+# Domyślna i maksymalna liczba wyników wyszukiwania
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 200
+# Maksymalna liczba słów zapytania - dłuższe zapytania są przycinane
+MAX_QUERY_TERMS = 8
+# Minimalna długość słowa wyszukiwanego jako prefiks (krótszym odpowiada tylko całe słowo)
+MIN_PREFIX_LENGTH = 2
+# Liczba dopasowań oceniana przez bm25 - przy bardzo ogólnych zapytaniach ranking
+# obejmuje tylko najnowsze dopasowania, dzięki czemu czas odpowiedzi jest ograniczony
+MAX_RANKED_MATCHES = 2000
+# Typy mediów z osobną tabelą indeksu - wyszukiwanie z filtrem typu nie sięga do media_items
+MEDIA_SEARCH_TYPES = ('video', 'audio', 'image')
+
+# Tabela FTS5 (rowid = media_items.id); remove_diacritics pozwala szukać "piesn" zamiast "pieśń".
+# Indeksy prefiksów do 5 znaków - dłuższy prefiks bez indeksu wymaga scalenia list
+# wszystkich pasujących słów przy każdym zapytaniu
+def create_media_search_sql(table):
+    return f'''CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+    {', '.join(MEDIA_SEARCH_COLUMNS)},
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3 4 5'
+)'''
+
+# Tabela indeksu dla typu mediów (None - wszystkie typy)
+def media_search_table(media_type=None):
+    if media_type is None:
+        return 'media_search'
+    if media_type not in MEDIA_SEARCH_TYPES:
+        raise ValueError(f"Nieznany typ mediów: {media_type}")
+    return f'media_search_{media_type}'
+
+# Wszystkie tabele indeksu: wspólna i po jednej dla każdego typu
+MEDIA_SEARCH_TABLES = (media_search_table(),) + tuple(media_search_table(t) for t in MEDIA_SEARCH_TYPES)
+
+# Dane do indeksu wyszukiwania dla elementów o podanych id
+_INDEX_ROWS_QUERY = '''SELECT m.id, m.title, a.artist, a.album, a.genre, v.director, m.file_path, m.media_type
+    FROM media_items m
+    LEFT JOIN audio_metadata a ON a.media_id = m.id
+    LEFT JOIN video_metadata v ON v.media_id = m.id'''
+
+# Liczba id w jednym zapytaniu IN (...) - poniżej limitu parametrów SQLite
+_ID_CHUNK = 500
+
+# Odświeżenie wpisów indeksu wyszukiwania dla podanych elementów
+def index_media_items(cursor, ids):
+    """
+    Wywoływane przez skaner po zapisaniu partii (nowe, zmienione i przeniesione pliki).
+    Stare wpisy są zastępowane, więc funkcja jest idempotentna.
+    """
+    ids = list(ids)
+    for i in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[i:i + _ID_CHUNK]
+        placeholders = ', '.join('?' * len(chunk))
+        rows = cursor.execute(f'{_INDEX_ROWS_QUERY} WHERE m.id IN ({placeholders})', chunk).fetchall()
+        # Typ pliku mógł się zmienić (np. inne rozszerzenie po przeniesieniu) - usuwamy ze wszystkich tabel
+        remove_media_items(cursor, chunk)
+        _insert_index_rows(cursor, rows)
+    return len(ids)
+
+# Usunięcie elementów z indeksu wyszukiwania
+def remove_media_items(cursor, ids):
+    params = [(media_id,) for media_id in ids]
+    for table in MEDIA_SEARCH_TABLES:
+        cursor.executemany(f'DELETE FROM {table} WHERE rowid = ?', params)
+
+# Przebudowa całego indeksu (migracja, naprawa po ręcznych zmianach w bazie)
+def rebuild_media_search(db):
+    for table in MEDIA_SEARCH_TABLES:
+        db.execute(f'DELETE FROM {table}')
+    rows = db.execute(_INDEX_ROWS_QUERY).fetchall()
+    _insert_index_rows(db, rows)
+    # Scalenie segmentów indeksu po masowym wstawianiu
+    for table in MEDIA_SEARCH_TABLES:
+        db.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+    return len(rows)
+
+# Wpisy trafiają do wspólnej tabeli i do tabeli swojego typu
+def _insert_index_rows(cursor, rows):
+    by_table = {table: [] for table in MEDIA_SEARCH_TABLES}
+    for row in rows:
+        entry = _index_row(row)
+        by_table[media_search_table()].append(entry)
+        if row[-1] in MEDIA_SEARCH_TYPES:
+            by_table[media_search_table(row[-1])].append(entry)
+    for table, entries in by_table.items():
+        if entries:
+            cursor.executemany(
+                f"INSERT INTO {table} (rowid, {', '.join(MEDIA_SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                entries
+            )
+
+def _index_row(row):
+    media_id, title, artist, album, genre, director, file_path, _ = tuple(row)
+    # Nazwa pliku bez rozszerzenia; separatory (_ - .) zamieniamy na spacje, żeby były osobnymi słowami
+    file_name = re.sub(r'[_.\-]+', ' ', os.path.splitext(os.path.basename(file_path))[0])
+    return (media_id, title, artist, album, genre, director, file_name)
+
+# Zamiana tekstu wpisanego przez użytkownika na bezpieczne zapytanie FTS5
+def build_match_query(text):
+    """
+    Każde słowo staje się prefiksem ("beat"* AND "rev"*), więc wyniki pojawiają się
+    w trakcie pisania. Operatory i znaki specjalne składni FTS5 są ignorowane.
+    Zwraca None, jeśli w tekście nie ma żadnego słowa.
+    """
+    terms = re.findall(r'\w+', text or '')[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return ' AND '.join(
+        f'"{term}"*' if len(term) >= MIN_PREFIX_LENGTH else f'"{term}"' for term in terms
+    )
+
+# Wyszukiwanie mediów z rankingiem bm25
+def search_media(db, text, media_type=None, limit=DEFAULT_SEARCH_LIMIT):
+    """
+    Zwraca listę (id, wynik) posortowaną od najlepiej dopasowanych.
+    Mniejszy wynik bm25 oznacza lepsze dopasowanie.
+
+    bm25 liczony jest dla każdego dopasowania, więc przy ogólnych zapytaniach
+    (np. dwie litery w bibliotece 100k plików) ranking obejmuje tylko
+    MAX_RANKED_MATCHES najnowszych dopasowań - starsze pliki pasujące do zapytania
+    mogą nie zostać zwrócone. Granica wyznaczana jest po rowid z listy dopasowań
+    indeksu, bez liczenia rankingu. Filtr typu to osobna tabela indeksu,
+    więc całe zapytanie korzysta wyłącznie z FTS.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return []
+
+    table = media_search_table(media_type)
+    bound = db.execute(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?',
+        (match, MAX_RANKED_MATCHES)
+    ).fetchone()
+
+    weights = ', '.join(str(weight) for weight in MEDIA_SEARCH_WEIGHTS)
+    conditions = [f'{table} MATCH ?']
+    params = [match]
+    if bound is not None:
+        conditions.append('rowid > ?')
+        params.append(bound[0])
+    query = (f'SELECT rowid, bm25({table}, {weights}) AS score FROM {table} '
+             f"WHERE {' AND '.join(conditions)} ORDER BY score LIMIT ?")
+    params.append(limit)
+    return [(row[0], row[1]) for row in db.execute(query, params).fetchall()]
+
+# Strona wyników rankingu obejmującego wszystkie dopasowania (katalog DLNA)
+def search_media_page(db, text, media_type=None, start=0, count=DEFAULT_SEARCH_LIMIT):
+    """
+    W przeciwieństwie do search_media bm25 liczony jest dla każdego dopasowania,
+    więc kolejne strony (start) obejmują całą bibliotekę. Przy ogólnych zapytaniach
+    jest to wolniejsze, dlatego służy do przeglądania, a nie do wyszukiwania podczas wpisywania.
+    Remisy rankingu rozstrzyga rowid, więc strony się nie nakładają.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return []
+    table = media_search_table(media_type)
+    weights = ', '.join(str(weight) for weight in MEDIA_SEARCH_WEIGHTS)
+    rows = db.execute(
+        f'SELECT rowid, bm25({table}, {weights}) AS score FROM {table} WHERE {table} MATCH ? '
+        'ORDER BY score, rowid LIMIT ? OFFSET ?',
+        (match, count, start)
+    ).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+# Liczba wszystkich dopasowań zapytania (z filtrem typu) bez liczenia rankingu
+def count_search_matches(db, text, media_type=None):
+    match = build_match_query(text)
+    if match is None:
+        return 0
+    table = media_search_table(media_type)
+    return db.execute(f'SELECT COUNT(*) FROM {table} WHERE {table} MATCH ?', (match,)).fetchone()[0]
+
+# Syntetyczna biblioteka do pomiaru wyszukiwania (flask benchmark-search)
+def create_synthetic_library(db, count, seed=1):
+    """
+    Wstawia count elementów (60% audio, 30% wideo, 10% zdjęć) z tytułami i wykonawcami
+    losowanymi ze słownika o rozkładzie Zipfa - kilka częstych słów ("love", "night")
+    pasuje do dziesiątek tysięcy elementów, tak jak w prawdziwej bibliotece.
+    """
+    rnd = random.Random(seed)
+    letters = 'etaoinshrdlcumwfgypbvkjxqz'
+    frequencies = (12.7, 9.1, 8.2, 7.5, 7.0, 6.7, 6.3, 6.1, 6.0, 4.3, 4.0, 2.8, 2.8,
+                   2.4, 2.4, 2.2, 2.0, 2.0, 1.9, 1.5, 1.0, 0.8, 0.2, 0.2, 0.1, 0.1)
+    words = list(dict.fromkeys(''.join(rnd.choices(letters, frequencies, k=rnd.randint(3, 10)))
+                               for _ in range(20000)))
+    words[:10] = ['love', 'song', 'night', 'live', 'remix', 'the', 'of', 'dance', 'blue', 'heart']
+    # Skumulowane wagi liczone raz - choices() z samymi wagami sumuje je przy każdym wywołaniu
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+    def phrase(low, high):
+        return ' '.join(rnd.choices(words, cum_weights=cum_weights, k=rnd.randint(low, high)))
+
+    for number in range(count):
+        roll = rnd.random()
+        media_type = 'audio' if roll < 0.6 else 'video' if roll < 0.9 else 'image'
+        title = phrase(2, 5).title()
+        media_id = db.execute(
+            'INSERT INTO media_items (title, file_path, media_type) VALUES (?, ?, ?)',
+            (title, f"/media/{media_type}/{number}_{title.replace(' ', '_')}.bin", media_type)
+        ).lastrowid
+        if media_type == 'audio':
+            db.execute('INSERT INTO audio_metadata (media_id, artist, album, genre) VALUES (?, ?, ?, ?)',
+                       (media_id, phrase(2, 2), phrase(2, 2), rnd.choice(('Rock', 'Pop', 'Jazz', 'Blues'))))
+        elif media_type == 'video':
+            db.execute('INSERT INTO video_metadata (media_id, director) VALUES (?, ?)', (media_id, phrase(2, 2)))
+    return rebuild_media_search(db)
\ No newline at end of file
@@ -0,0 +1,90 @@
+# settings_helpers.py
+import threading
+import time
+from collections import OrderedDict
+
+from db_helpers import get_db, get_read_db
+
+# Domyślne ustawienia użytkownika (zgodne z wartościami DEFAULT w schema.sql)
+DEFAULT_SETTINGS = {'default_city': 'Warsaw', 'theme': 'light'}
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_ENTRIES = 1024
+
+# Pamięć podręczna ustawień użytkowników z czasem życia i jawnym unieważnianiem
+class SettingsCache:
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_SETTINGS_CACHE_TTL', DEFAULT_TTL)
+        self.max_entries = app.config.get('USER_SETTINGS_CACHE_SIZE', DEFAULT_MAX_ENTRIES)
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.stats['hits'] += 1
+            return dict(entry[1])
+
+    def set(self, user_id, settings):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, dict(settings))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Globalna pamięć podręczna ustawień
+settings_cache = SettingsCache()
+
+# Pobranie ustawień użytkownika (z pamięci podręcznej lub z bazy)
+def load_user_settings(user_id, create=False):
+    """
+    Zwraca słownik ustawień użytkownika. Przy braku wiersza user_settings
+    zwracane są wartości domyślne; create=True zapisuje je w bazie
+    (INSERT OR IGNORE - równoległe żądania nie kończą się błędem klucza).
+    Renderowanie stron korzysta z create=False i niczego nie zapisuje.
+    """
+    # '_stored' w pamięci podręcznej odróżnia wiersz z bazy od samych wartości domyślnych
+    settings = settings_cache.get(user_id)
+    if settings is not None and (settings.pop('_stored') or not create):
+        return settings
+
+    db = get_db() if create else get_read_db()
+    if create:
+        db.execute(
+            'INSERT OR IGNORE INTO user_settings (user_id, default_city, theme) VALUES (?, ?, ?)',
+            (user_id, DEFAULT_SETTINGS['default_city'], DEFAULT_SETTINGS['theme'])
+        )
+        db.commit()
+    row = db.execute('SELECT * FROM user_settings WHERE user_id = ?', (user_id,)).fetchone()
+    if row is not None:
+        settings = dict(row, _stored=True)
+    else:
+        settings = dict(DEFAULT_SETTINGS, user_id=user_id, _stored=False)
+
+    settings_cache.set(user_id, settings)
+    settings.pop('_stored')
+    return settings
+
+# Motyw użytkownika dla renderowanych stron
+def get_user_theme(user_id):
+    return load_user_settings(user_id).get('theme') or DEFAULT_SETTINGS['theme']
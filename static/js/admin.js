@@ -9,27 +9,26 @@ document.addEventListener('DOMContentLoaded', function() {
     // Obsługa przycisku dodawania użytkownika
     document.getElementById('add-user-btn').addEventListener('click', showAddUserModal);
     
-    // Obsługa przycisków edycji użytkownika
-    document.querySelectorAll('.edit-user-btn').forEach(button => {
-        button.addEventListener('click', function() {
-            const userId = this.dataset.id;
-            const username = this.dataset.username;
-            const email = this.dataset.email;
-            const role = this.dataset.role;
-            
-            showEditUserModal(userId, username, email, role);
-        });
+    // Obsługa przycisków edycji i usuwania (delegacja - wiersze ładowane są dynamicznie)
+    document.getElementById('users-table-body').addEventListener('click', function(e) {
+        const editButton = e.target.closest('.edit-user-btn');
+        if (editButton) {
+            showEditUserModal(editButton.dataset.id, editButton.dataset.username,
+                              editButton.dataset.email, editButton.dataset.role);
+            return;
+        }
+        
+        const deleteButton = e.target.closest('.delete-user-btn');
+        if (deleteButton) {
+            showDeleteConfirmation(deleteButton.dataset.id, deleteButton.dataset.username);
+        }
     });
     
-    // Obsługa przycisków usuwania użytkownika
-    document.querySelectorAll('.delete-user-btn').forEach(button => {
-        button.addEventListener('click', function() {
-            const userId = this.dataset.id;
-            const username = this.dataset.username;
-            
-            showDeleteConfirmation(userId, username);
-        });
-    });
+    // Leniwe ładowanie list użytkowników i logów
+    document.getElementById('users-load-more').addEventListener('click', loadUsers);
+    document.getElementById('logs-load-more').addEventListener('click', loadLogs);
+    loadUsers();
+    loadLogs();
     
     // Obsługa formularza użytkownika
     document.getElementById('user-form').addEventListener('submit', handleUserForm);
@@ -38,6 +37,102 @@ document.addEventListener('DOMContentLoaded', function() {
     document.getElementById('delete-form').addEventListener('submit', handleDeleteForm);
 });
 
+// Kursory stronicowania list panelu administratora
+let usersCursor = null;
+let logsCursor = null;
+
+/**
+ * Escapowanie tekstu wstawianego do HTML
+ * @param {*} value - Wartość do wyświetlenia
+ * @returns {string} Bezpieczny tekst
+ */
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value === null || value === undefined ? '' : String(value);
+    return div.innerHTML;
+}
+
+/**
+ * Ładowanie kolejnej strony użytkowników
+ */
+function loadUsers() {
+    const tbody = document.getElementById('users-table-body');
+    const params = new URLSearchParams({ limit: tbody.dataset.pageSize });
+    if (usersCursor) {
+        params.set('after_created', usersCursor.after_created);
+        params.set('after_id', usersCursor.after_id);
+    }
+    
+    fetch(`/api/admin/users?${params.toString()}`)
+        .then(response => response.json())
+        .then(data => {
+            const currentUserId = tbody.dataset.currentUserId;
+            data.items.forEach(user => {
+                const row = document.createElement('tr');
+                const roleBadge = user.role === 'admin'
+                    ? '<span class="badge badge-admin">Administrator</span>'
+                    : '<span class="badge badge-user">Użytkownik</span>';
+                const deleteButton = String(user.id) !== currentUserId
+                    ? `<button class="btn btn-danger btn-sm delete-user-btn"
+                               data-id="${user.id}"
+                               data-username="${escapeHtml(user.username)}">Usuń</button>`
+                    : '';
+                
+                row.innerHTML = `
+                    <td>${user.id}</td>
+                    <td class="username">${escapeHtml(user.username)}</td>
+                    <td class="email">${escapeHtml(user.email)}</td>
+                    <td>${roleBadge}</td>
+                    <td class="date">${escapeHtml(user.created_at)}</td>
+                    <td class="date">${escapeHtml(user.last_login || 'Nigdy')}</td>
+                    <td class="actions">
+                        <button class="btn btn-primary btn-sm edit-user-btn"
+                                data-id="${user.id}"
+                                data-username="${escapeHtml(user.username)}"
+                                data-email="${escapeHtml(user.email)}"
+                                data-role="${escapeHtml(user.role)}">Edytuj</button>
+                        ${deleteButton}
+                    </td>`;
+                tbody.appendChild(row);
+            });
+            
+            usersCursor = data.next;
+            document.getElementById('users-load-more').style.display = usersCursor ? '' : 'none';
+        })
+        .catch(() => showError('Nie udało się pobrać listy użytkowników.'));
+}
+
+/**
+ * Ładowanie kolejnej strony logów dostępu
+ */
+function loadLogs() {
+    const tbody = document.getElementById('logs-table-body');
+    const params = new URLSearchParams();
+    if (logsCursor) {
+        params.set('before_id', logsCursor.before_id);
+    }
+    
+    fetch(`/api/admin/logs?${params.toString()}`)
+        .then(response => response.json())
+        .then(data => {
+            data.items.forEach(log => {
+                const row = document.createElement('tr');
+                row.innerHTML = `
+                    <td>${log.id}</td>
+                    <td class="username">${escapeHtml(log.username || '-')}</td>
+                    <td>${escapeHtml(log.action)}</td>
+                    <td>${escapeHtml(log.ip_address)}</td>
+                    <td class="date">${escapeHtml(log.timestamp)}</td>
+                    <td>${log.success ? 'OK' : 'Błąd'}</td>`;
+                tbody.appendChild(row);
+            });
+            
+            logsCursor = data.next;
+            document.getElementById('logs-load-more').style.display = logsCursor ? '' : 'none';
+        })
+        .catch(() => showError('Nie udało się pobrać logów dostępu.'));
+}
+
 /**
  * Inicjalizacja modali
  */
@@ -52,6 +52,36 @@ function initMediaCenter() {
     loadPlaylists();
 }
 
+// Pola listy potrzebne do wyświetlenia siatki mediów
+const MEDIA_GRID_FIELDS = 'title,media_type,duration,file_size,thumbnail_path,thumbnail_key,artist,album,resolution';
+
+// Kursory kolejnych stron listy mediów (strona 1 nie ma kursora)
+let mediaPageCursors = [null];
+
+// Odtwarzana playlista: id i kolejność elementów (null - odtwarzanie spoza playlisty).
+// Serwer na podstawie parametru ?playlist przygotowuje z wyprzedzeniem następne utwory.
+let currentPlaylist = null;
+
+// Parametr zapytania wskazujący playlistę, z której odtwarzany jest element
+function playlistQuery(mediaId) {
+    if (!currentPlaylist || !currentPlaylist.items.some(item => item.id === mediaId)) {
+        return '';
+    }
+    return `?playlist=${currentPlaylist.id}`;
+}
+
+// Element playlisty sąsiadujący z odtwarzanym (offset -1 poprzedni, 1 następny)
+function playlistNeighbour(mediaId, offset) {
+    if (!currentPlaylist) {
+        return null;
+    }
+    const index = currentPlaylist.items.findIndex(item => item.id === mediaId);
+    if (index === -1) {
+        return null;
+    }
+    return currentPlaylist.items[index + offset] || null;
+}
+
 /**
  * Ładowanie elementów mediów z serwera
  */
@@ -67,8 +97,20 @@ function loadMediaItems(mediaType = 'all', page = 1, perPage = 20) {
     if (mediaType !== 'all') {
         params.append('type', mediaType);
     }
-    params.append('page', page);
-    params.append('per_page', perPage);
+    
+    currentPlaylist = null;
+    
+    // Nowa lista (zmiana typu, odświeżenie) - kursory poprzednich stron są nieaktualne
+    if (page === 1) {
+        mediaPageCursors = [null];
+    }
+    const cursor = mediaPageCursors[page - 1];
+    if (cursor) {
+        params.append('after_title', cursor.after_title);
+        params.append('after_id', cursor.after_id);
+    }
+    params.append('limit', perPage);
+    params.append('fields', MEDIA_GRID_FIELDS);
     
     // Pobranie danych z API
     fetch(`/api/media/list?${params.toString()}`)
@@ -81,8 +123,9 @@ function loadMediaItems(mediaType = 'all', page = 1, perPage = 20) {
         .then(data => {
             // Wyczyszczenie siatki mediów
             mediaGrid.innerHTML = '';
+            mediaPageCursors[page] = data.next;
             
-            if (data.length === 0) {
+            if (data.items.length === 0) {
                 mediaGrid.innerHTML = `
                     <div class="no-media-message">
                         <p>Nie znaleziono mediów typu ${mediaType}</p>
@@ -96,13 +139,16 @@ function loadMediaItems(mediaType = 'all', page = 1, perPage = 20) {
             }
             
             // Dodanie elementów mediów do siatki
-            data.forEach(item => {
+            data.items.forEach(item => {
                 const mediaElement = createMediaElement(item);
                 mediaGrid.appendChild(mediaElement);
             });
             
-            // Aktualizacja paginacji
-            updatePagination(page, Math.ceil(data.length / perPage), mediaType);
+            // Aktualizacja paginacji (liczba stron szacunkowa - z liczników w bazie)
+            const totalPages = data.total_estimate
+                ? Math.ceil(data.total_estimate / perPage)
+                : page + (data.next ? 1 : 0);
+            updatePagination(page, Math.max(totalPages, page + (data.next ? 1 : 0)), mediaType);
         })
         .catch(error => {
             console.error('Błąd:', error);
@@ -130,7 +176,9 @@ function createMediaElement(item) {
     mediaItem.dataset.type = item.media_type;
     
     // Określenie miniatury
-    let thumbnailSrc = item.thumbnail_path ? `/api/media/thumbnail/${item.id}` : getDefaultThumbnail(item.media_type);
+    let thumbnailSrc = item.thumbnail_path
+        ? `/api/media/thumbnail/${item.id}?size=card` + (item.thumbnail_key ? `&v=${item.thumbnail_key}` : '')
+        : getDefaultThumbnail(item.media_type);
     
     // Utworzenie HTML elementu
     mediaItem.innerHTML = `
@@ -380,7 +428,9 @@ function monitorScanProgress(taskId) {
                 progressBar.style.width = `${data.progress}%`;
                 
                 // Aktualizacja informacji
-                infoElement.textContent = data.status;
+                infoElement.textContent = data.eta_seconds
+                    ? `Przetworzono ${data.probed + data.failed} z ${data.stats.to_process} plików (pozostało ok. ${Math.ceil(data.eta_seconds)} s)`
+                    : data.status;
                 
                 // Jeśli skanowanie jest ukończone
                 if (data.status === 'complete') {
@@ -403,6 +453,11 @@ function monitorScanProgress(taskId) {
                     infoElement.textContent = `Błąd: ${data.error}`;
                     document.getElementById('start-scan-btn').disabled = false;
                 }
+                // Jeśli skanowanie zostało anulowane
+                else if (data.status === 'cancelled') {
+                    infoElement.textContent = `Skanowanie anulowane. Przetworzono ${data.probed} plików.`;
+                    document.getElementById('start-scan-btn').disabled = false;
+                }
                 // Jeśli skanowanie jest w trakcie
                 else {
                     // Sprawdź ponownie za 1 sekundę
@@ -453,16 +508,29 @@ function initMediaPlayer() {
     
     // Obsługa przycisku poprzedniego elementu
     playerPrev.addEventListener('click', function() {
-        // Logika przejścia do poprzedniego elementu
-        // To wymaga implementacji playlisty
+        playNeighbour(-1);
     });
     
     // Obsługa przycisku następnego elementu
     playerNext.addEventListener('click', function() {
-        // Logika przejścia do następnego elementu
-        // To wymaga implementacji playlisty
+        playNeighbour(1);
     });
     
+    // Przejście do sąsiedniego elementu odtwarzanej playlisty
+    function playNeighbour(offset) {
+        const item = playlistNeighbour(currentMediaId, offset);
+        if (item) {
+            window.playMedia(item.id, item.media_type);
+        }
+    }
+    
+    // Po zakończeniu utworu z playlisty odtwarzany jest następny
+    function onMediaEnded() {
+        isPlaying = false;
+        playerPlay.textContent = '▶️';
+        playNeighbour(1);
+    }
+    
     // Obsługa przycisku głośności
     playerVolume.addEventListener('click', function() {
         if (player && player.muted) {
@@ -494,21 +562,23 @@ function initMediaPlayer() {
         
         // Wyczyść kontener odtwarzacza
         playerContainer.innerHTML = '';
+        playerPlay.disabled = false;
+        const query = playlistQuery(mediaId);
         
         // Utwórz odpowiedni element odtwarzacza
         if (mediaType === 'video') {
             player = document.createElement('video');
-            player.src = `/api/media/stream/${mediaId}`;
+            // Przeglądarki z natywnym HLS (Safari, iOS) dostają strumień dopasowany do łącza
+            player.src = player.canPlayType('application/vnd.apple.mpegurl')
+                ? `/api/media/hls/${mediaId}/master.m3u8${query}`
+                : `/api/media/stream/${mediaId}${query}`;
             player.controls = false;
             player.autoplay = true;
             player.width = '100%';
             player.height = '100%';
             
             // Obsługa zakończenia odtwarzania
-            player.onended = function() {
-                isPlaying = false;
-                playerPlay.textContent = '▶️';
-            };
+            player.onended = onMediaEnded;
             
             // Obsługa aktualizacji czasu
             player.ontimeupdate = function() {
@@ -528,15 +598,12 @@ function initMediaPlayer() {
             
         } else if (mediaType === 'audio') {
             player = document.createElement('audio');
-            player.src = `/api/media/stream/${mediaId}`;
+            player.src = `/api/media/stream/${mediaId}${query}`;
             player.controls = false;
             player.autoplay = true;
             
             // Obsługa zakończenia odtwarzania
-            player.onended = function() {
-                isPlaying = false;
-                playerPlay.textContent = '▶️';
-            };
+            player.onended = onMediaEnded;
             
             // Obsługa aktualizacji czasu
             player.ontimeupdate = function() {
@@ -685,7 +752,7 @@ function loadPlaylists() {
  * Ładowanie elementów playlisty
  */
 function loadPlaylistItems(playlistId) {
-    fetch(`/api/media/playlists/${playlistId}/items`)
+    fetch(`/api/media/playlists/${playlistId}/items?limit=200&fields=${MEDIA_GRID_FIELDS}`)
         .then(response => {
             if (!response.ok) {
                 throw new Error('Błąd pobierania elementów playlisty');
@@ -696,14 +763,17 @@ function loadPlaylistItems(playlistId) {
             // Ładowanie elementów playlisty do siatki mediów
             const mediaGrid = document.getElementById('media-items-grid');
             mediaGrid.innerHTML = '';
+            document.getElementById('media-pagination').innerHTML = '';
             
-            if (data.length === 0) {
+            if (data.items.length === 0) {
                 mediaGrid.innerHTML = '<div class="no-media-message">Ta playlista jest pusta</div>';
                 return;
             }
             
+            currentPlaylist = { id: playlistId, items: data.items };
+            
             // Dodanie elementów playlisty do siatki
-            data.forEach(item => {
+            data.items.forEach(item => {
                 const mediaElement = createMediaElement(item);
                 mediaGrid.appendChild(mediaElement);
             });
@@ -726,11 +796,12 @@ function updatePagination(currentPage, totalPages, mediaType) {
         return;
     }
     
-    // Dodanie przycisków paginacji
+    // Dodanie przycisków paginacji - dostępne są tylko strony, do których znamy kursor
     for (let i = 1; i <= totalPages; i++) {
         const pageButton = document.createElement('button');
         pageButton.className = `pagination-btn ${i === currentPage ? 'active' : ''}`;
         pageButton.textContent = i;
+        pageButton.disabled = i > 1 && !mediaPageCursors[i - 1];
         
         // Obsługa kliknięcia przycisku strony
         pageButton.addEventListener('click', function() {
@@ -863,7 +934,7 @@ document.getElementById('media-search-input').addEventListener('input', function
  * Wyszukiwanie mediów
  */
 function searchMedia(query) {
-    fetch(`/api/media/search?q=${encodeURIComponent(query)}`)
+    fetch(`/api/media/search?q=${encodeURIComponent(query)}&fields=${MEDIA_GRID_FIELDS}`)
         .then(response => {
             if (!response.ok) {
                 throw new Error('Błąd wyszukiwania mediów');
@@ -871,17 +942,20 @@ function searchMedia(query) {
             return response.json();
         })
         .then(data => {
+            currentPlaylist = null;
+            
             // Aktualizacja siatki mediów
             const mediaGrid = document.getElementById('media-items-grid');
             mediaGrid.innerHTML = '';
+            document.getElementById('media-pagination').innerHTML = '';
             
-            if (data.length === 0) {
+            if (data.items.length === 0) {
                 mediaGrid.innerHTML = `<div class="no-media-message">Nie znaleziono mediów dla zapytania "${query}"</div>`;
                 return;
             }
             
             // Dodanie znalezionych elementów do siatki
-            data.forEach(item => {
+            data.items.forEach(item => {
                 const mediaElement = createMediaElement(item);
                 mediaGrid.appendChild(mediaElement);
             });
@@ -891,4 +965,4 @@ function searchMedia(query) {
             const mediaGrid = document.getElementById('media-items-grid');
             mediaGrid.innerHTML = '<div class="error-message">Wystąpił błąd podczas wyszukiwania mediów</div>';
         });
-}
\ No newline at end of file
+}
@@ -0,0 +1,129 @@
+# tests/conftest.py
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+# Moduły aplikacji leżą w katalogu głównym repozytorium
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import run_migrations
+
+
+# Baza w pliku tymczasowym ze wszystkimi migracjami
+@pytest.fixture
+def db(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'homeHub.db'))
+    conn.row_factory = sqlite3.Row
+    run_migrations(conn)
+    yield conn
+    conn.close()
+
+
+# Aplikacja z konfiguracją testową na bazie w pliku tymczasowym
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    pytest.importorskip('flask')
+    monkeypatch.setenv('FLASK_CONFIG', 'testing')
+    # Import aplikacji poza trybem debug tworzy katalog logs/ w bieżącym katalogu
+    monkeypatch.chdir(tmp_path)
+    import app as app_module
+
+    flask_app = app_module.app
+    monkeypatch.setitem(flask_app.config, 'DATABASE', str(tmp_path / 'app.db'))
+    monkeypatch.setitem(flask_app.config, 'MEDIA_DIRS', [str(tmp_path)])
+    app_module.init_db()
+    # Pamięć podręczna ustawień jest globalna, a id użytkowników powtarzają się między testami
+    from settings_helpers import settings_cache
+    settings_cache.clear()
+    return flask_app
+
+
+# Klient zalogowany jako administrator (użytkownik utworzony przez init_db)
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with app.app_context():
+        from db_helpers import get_db
+        admin = get_db().execute("SELECT id FROM users WHERE username = 'admin'").fetchone()
+    with client.session_transaction() as session:
+        session['user_id'] = admin['id']
+        session['username'] = 'admin'
+        session['role'] = 'admin'
+    return client
+
+
+# Fabryka klientów zalogowanych jako nowi zwykli użytkownicy
+@pytest.fixture
+def make_user_client(app):
+    from werkzeug.security import generate_password_hash
+    from db_helpers import get_db
+
+    def make(username='user'):
+        with app.app_context():
+            db = get_db()
+            cursor = db.execute(
+                "INSERT INTO users (username, password, email, role, created_at) "
+                "VALUES (?, ?, ?, 'user', '2024-01-01 00:00:00')",
+                (username, generate_password_hash(username), f'{username}@localdomain.lan')
+            )
+            db.commit()
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = cursor.lastrowid
+            session['username'] = username
+            session['role'] = 'user'
+        return client
+    return make
+
+
+@pytest.fixture
+def user_client(make_user_client):
+    return make_user_client()
+
+
+# Zastępstwo transcode_media: zadanie czeka na otwarcie bramki (lub anulowanie) i zapisuje wynik
+class FakeTranscode:
+    def __init__(self):
+        self.calls = []
+        self.gates = {}
+
+    def hold(self, input_file):
+        self.gates[input_file] = threading.Event()
+
+    def open(self, input_file=None):
+        for path, gate in self.gates.items():
+            if input_file is None or path == input_file:
+                gate.set()
+
+    def __call__(self, input_file, output_file, format='mp4', resolution='720p', progress=None,
+                 cancel_event=None, threads=None, niceness=None):
+        from media_helpers import TranscodeCancelled
+        self.calls.append((input_file, niceness))
+        gate = self.gates.get(input_file)
+        while gate is not None and not gate.wait(0.01):
+            if cancel_event is not None and cancel_event.is_set():
+                raise TranscodeCancelled()
+        with open(output_file, 'wb') as f:
+            f.write(b'transcoded')
+
+
+@pytest.fixture
+def fake_transcode(monkeypatch):
+    import transcode_helpers
+    fake = FakeTranscode()
+    monkeypatch.setattr(transcode_helpers, 'transcode_media', fake)
+    yield fake
+    fake.open()
+
+
+# Oczekiwanie na warunek spełniany przez wątek w tle
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('Przekroczono czas oczekiwania')
+        time.sleep(0.01)
@@ -0,0 +1,171 @@
+# tests/test_audio_tags.py
+import base64
+import io
+import struct
+import wave
+
+import pytest
+
+from audio_helpers import read_audio_info, _resolve_genre
+
+# MPEG-1 Layer III, 128 kbps, 44100 Hz, joint stereo - ramka ma 417 bajtów
+MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+
+def syncsafe(value):
+    return bytes((value >> shift) & 0x7f for shift in (21, 14, 7, 0))
+
+
+def id3v23(*frames):
+    body = b''.join(frame_id + struct.pack('>I', len(data)) + b'\x00\x00' + data for frame_id, data in frames)
+    return b'ID3\x03\x00\x00' + syncsafe(len(body)) + body
+
+
+def id3v1(title='', artist='', album='', track=0, genre=255):
+    def field(value, length):
+        return value.encode('latin-1').ljust(length, b'\x00')
+    return (b'TAG' + field(title, 30) + field(artist, 30) + field(album, 30) + b'2001'
+            + b'\x00' * 28 + b'\x00' + bytes([track, genre]))
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def vorbis_comments(*comments, vendor='test'):
+    data = struct.pack('<I', len(vendor)) + vendor.encode() + struct.pack('<I', len(comments))
+    for comment in comments:
+        encoded = comment.encode('utf-8')
+        data += struct.pack('<I', len(encoded)) + encoded
+    return data
+
+
+def flac_picture(image, mime='image/jpeg'):
+    return (struct.pack('>I', 3) + struct.pack('>I', len(mime)) + mime.encode() + struct.pack('>I', 0)
+            + b'\x00' * 16 + struct.pack('>I', len(image)) + image)
+
+
+def flac(*blocks):
+    data = b'fLaC'
+    for number, (block_type, body) in enumerate(blocks):
+        last = 0x80 if number == len(blocks) - 1 else 0
+        data += bytes([last | block_type]) + len(body).to_bytes(3, 'big') + body
+    return data
+
+
+def flac_stream_info(sample_rate, channels, total_samples):
+    packed = (sample_rate << 44) | ((channels - 1) << 41) | (15 << 36) | total_samples
+    return b'\x10\x00\x10\x00' + b'\x00' * 6 + packed.to_bytes(8, 'big') + b'\x00' * 16
+
+
+def ogg_page(packet, granule, sequence, flags=0):
+    lacing = bytes([255] * (len(packet) // 255) + [len(packet) % 255])
+    return (b'OggS\x00' + bytes([flags]) + struct.pack('<qIII', granule, 1, sequence, 0)
+            + bytes([len(lacing)]) + lacing + packet)
+
+
+def test_mp3_id3v2_and_id3v1_tags(tmp_path):
+    tag = id3v23(
+        (b'TIT2', b'\x01' + 'Pieśń'.encode('utf-16')),
+        (b'TPE1', b'\x00Artist'),
+        (b'TCON', b'\x00(17)'),
+        (b'APIC', b'\x00image/jpeg\x00\x03\x00' + b'\xff\xd8cover'),
+    )
+    path = write(tmp_path, 'song.mp3', tag + MP3_FRAME * 100 + id3v1(title='Old', album='Album', track=5))
+
+    info = read_audio_info(path)
+    assert info['reader'] == 'tags'
+    assert info['tags'] == {'title': 'Pieśń', 'artist': 'Artist', 'genre': 'Rock', 'album': 'Album',
+                            'date': '2001', 'track': '5'}
+    assert info['picture_data'] == b'\xff\xd8cover'
+    stream = info['streams'][0]
+    assert (stream['codec_name'], stream['sample_rate'], stream['channels']) == ('mp3', '44100', 2)
+    assert info['duration'] == pytest.approx(100 * 417 * 8 / 128000)
+
+
+def test_wav_header_and_info_chunk(tmp_path):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(8000)
+        w.writeframes(b'\x00\x00' * 16000)
+    info_chunk = b'INFO' + b'INAM' + struct.pack('<I', 6) + b'Title\x00'
+    path = write(tmp_path, 'clip.wav', buffer.getvalue() + b'LIST' + struct.pack('<I', len(info_chunk)) + info_chunk)
+
+    info = read_audio_info(path)
+    assert info['tags'] == {'title': 'Title'}
+    stream = info['streams'][0]
+    assert (stream['codec_name'], stream['sample_rate'], stream['channels']) == ('pcm_s16le', '8000', 1)
+    assert info['duration'] == pytest.approx(2.0)
+
+
+def test_flac_stream_info_comments_and_picture(tmp_path):
+    data = flac(
+        (0, flac_stream_info(44100, 2, 44100 * 3)),
+        (4, vorbis_comments('TITLE=Pieśń', 'ARTIST=First', 'artist=Second', 'TRACKNUMBER=7', 'COMMENT=x')),
+        (6, flac_picture(b'\xff\xd8cover')),
+    )
+    path = write(tmp_path, 'song.flac', data + b'\x00' * 1000)
+
+    info = read_audio_info(path)
+    assert info['tags'] == {'title': 'Pieśń', 'artist': 'First;Second', 'track': '7'}
+    assert info['picture_data'] == b'\xff\xd8cover'
+    stream = info['streams'][0]
+    assert (stream['codec_name'], stream['sample_rate'], stream['channels']) == ('flac', '44100', 2)
+    assert info['duration'] == pytest.approx(3.0)
+
+
+def test_flac_after_id3v2_tag(tmp_path):
+    data = id3v23((b'TIT2', b'\x00Ignored')) + flac((0, flac_stream_info(48000, 1, 96000)))
+    info = read_audio_info(write(tmp_path, 'tagged.flac', data))
+
+    assert info['format']['format_name'] == 'flac'
+    assert info['streams'][0]['channels'] == 1
+    assert info['duration'] == pytest.approx(2.0)
+
+
+def test_ogg_vorbis_headers_and_duration(tmp_path):
+    identification = (b'\x01vorbis' + struct.pack('<I', 0) + bytes([2])
+                      + struct.pack('<Iiii', 44100, 0, 160000, 0) + b'\xb8\x01')
+    # Komentarze dłuższe niż 255 bajtów - pakiet zapisany w kilku segmentach strony
+    comments = b'\x03vorbis' + vorbis_comments('TITLE=' + 'a' * 300, 'ALBUM=Album') + b'\x01'
+    data = (ogg_page(identification, 0, 0, flags=0x02) + ogg_page(comments, 0, 1)
+            + ogg_page(b'\x00' * 100, 44100 * 4, 2, flags=0x04))
+    info = read_audio_info(write(tmp_path, 'song.ogg', data))
+
+    assert info['tags'] == {'title': 'a' * 300, 'album': 'Album'}
+    stream = info['streams'][0]
+    assert (stream['codec_name'], stream['sample_rate'], stream['channels']) == ('vorbis', '44100', 2)
+    assert stream['bit_rate'] == '160000'
+    assert info['duration'] == pytest.approx(4.0)
+
+
+def test_opus_pre_skip_and_embedded_picture(tmp_path):
+    identification = b'OpusHead' + bytes([1, 2]) + struct.pack('<HIhB', 312, 44100, 0, 0)
+    picture = base64.b64encode(flac_picture(b'\x89PNGcover', 'image/png')).decode()
+    comments = b'OpusTags' + vorbis_comments('GENRE=Jazz', f'METADATA_BLOCK_PICTURE={picture}')
+    data = (ogg_page(identification, 0, 0, flags=0x02) + ogg_page(comments, 0, 1)
+            + ogg_page(b'\x00' * 100, 48000 * 2 + 312, 2, flags=0x04))
+    info = read_audio_info(write(tmp_path, 'voice.opus', data))
+
+    assert info['tags'] == {'genre': 'Jazz'}
+    assert info['picture_data'] == b'\x89PNGcover'
+    stream = info['streams'][0]
+    assert (stream['codec_name'], stream['sample_rate'], stream['channels']) == ('opus', '48000', 2)
+    assert info['duration'] == pytest.approx(2.0)
+
+
+def test_unknown_or_damaged_files_fall_back_to_ffprobe(tmp_path):
+    assert read_audio_info(write(tmp_path, 'noise.mp3', b'\x00' * 4096)) is None
+    assert read_audio_info(write(tmp_path, 'short.wav', b'RIFF\x00\x00\x00\x00WAVE')) is None
+    assert read_audio_info(str(tmp_path / 'missing.mp3')) is None
+
+
+def test_resolve_genre():
+    assert _resolve_genre('(17)') == 'Rock'
+    assert _resolve_genre('17') == 'Rock'
+    assert _resolve_genre('(17)Indie') == 'Indie'
+    assert _resolve_genre('Jazz') == 'Jazz'
@@ -0,0 +1,66 @@
+# tests/test_backup.py
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from backup_helpers import backup_database, verify_backup
+
+
+# Baza o rozmiarze wymagającym wielu kroków kopii
+def create_database(path, journal_mode):
+    conn = sqlite3.connect(path)
+    conn.execute(f'PRAGMA journal_mode={journal_mode}')
+    conn.execute('CREATE TABLE t (data BLOB)')
+    conn.executemany('INSERT INTO t VALUES (randomblob(4000))', [()] * 2000)
+    conn.commit()
+    conn.close()
+    return path
+
+
+# Zapisy co kilka milisekund (jak bufor liczników pod obciążeniem)
+@contextmanager
+def busy_writer(database):
+    stopped = threading.Event()
+
+    def write():
+        conn = sqlite3.connect(database, timeout=5)
+        while not stopped.is_set():
+            conn.execute('INSERT INTO t VALUES (randomblob(100))')
+            conn.commit()
+            time.sleep(0.002)
+        conn.close()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def test_backup_completes_under_concurrent_writes(tmp_path):
+    database = create_database(str(tmp_path / 'source.db'), 'WAL')
+    destination = str(tmp_path / 'backup.db')
+    with busy_writer(database):
+        result = backup_database(database, destination, pages_per_step=64, step_sleep=0.001,
+                                 max_restarts=0, probe_interval=0.01)
+    assert result['snapshot'] is True
+    assert result['restarts'] == 0
+    assert result['steps'] > 1
+    assert result['writer_probes'] > 0
+    ok, messages = verify_backup(destination)
+    assert ok, messages
+
+
+def test_backup_gives_up_after_max_restarts(tmp_path):
+    # Bez WAL nie ma migawki - zapisy innego połączenia restartują kopię
+    database = create_database(str(tmp_path / 'source.db'), 'DELETE')
+    with busy_writer(database):
+        with pytest.raises(RuntimeError):
+            backup_database(database, str(tmp_path / 'backup.db'), pages_per_step=16, step_sleep=0.01,
+                            max_restarts=2, probe_interval=0)
+    assert not (tmp_path / 'backup.db.part').exists()
@@ -0,0 +1,40 @@
+# tests/test_dlna.py
+import re
+
+import search_helpers
+from dlna_helpers import ContentDirectory
+from search_helpers import index_media_items
+
+CRITERIA = 'upnp:class derivedfrom "object.item.videoItem" and dc:title contains "love"'
+
+
+def add_videos(db, count):
+    ids = [db.execute('INSERT INTO media_items (title, file_path, media_type) VALUES (?, ?, ?)',
+                      (f'Love Song {i:02d}', f'/media/love_{i:02d}.mp4', 'video')).lastrowid
+           for i in range(count)]
+    index_media_items(db.cursor(), ids)
+    db.commit()
+
+
+def test_search_reports_total_matches_on_first_page(db):
+    add_videos(db, 25)
+    directory = ContentDirectory(page_size=10)
+
+    _, returned, total, _ = directory.search(db, '0', CRITERIA, 0, 10, 'http://host')
+    assert (returned, total) == (10, 25)
+
+    _, returned, total, _ = directory.search(db, '0', CRITERIA, 20, 10, 'http://host')
+    assert (returned, total) == (5, 25)
+
+
+def test_search_pages_cover_all_matches_beyond_ranking_limit(db, monkeypatch):
+    monkeypatch.setattr(search_helpers, 'MAX_RANKED_MATCHES', 15)
+    add_videos(db, 25)
+    directory = ContentDirectory(page_size=10)
+
+    seen = []
+    for start in (0, 10, 20):
+        result, returned, total, _ = directory.search(db, '0', CRITERIA, start, 10, 'http://host')
+        assert total == 25
+        seen += re.findall(r'<item id="([^"]+)"', result)
+    assert len(seen) == len(set(seen)) == 25
@@ -0,0 +1,70 @@
+# tests/test_live_transcode.py
+import pytest
+
+import transcode_helpers
+from media_helpers import LiveTranscode
+from transcode_helpers import LiveTranscoder
+
+
+@pytest.fixture
+def command(monkeypatch):
+    """Podmienia polecenie FFmpeg na dowolne polecenie piszące na stdout"""
+    commands = {'value': ['yes']}
+    monkeypatch.setattr(transcode_helpers, 'build_live_audio_command', lambda *args: commands['value'])
+    return commands
+
+
+def test_close_before_end_kills_process():
+    stream = LiveTranscode(['yes'], chunk_size=1024).start()
+    chunks = iter(stream)
+    assert next(chunks)
+    assert next(chunks)
+
+    stream.close()
+
+    assert stream.process.returncode is not None
+    assert not stream.completed
+
+
+def test_finished_stream_reports_completion(tmp_path):
+    source = tmp_path / 'track.bin'
+    source.write_bytes(b'a' * 5000)
+    stream = LiveTranscode(['cat', str(source)], chunk_size=1024).start()
+
+    assert b''.join(stream) == source.read_bytes()
+    stream.close()
+    assert stream.completed and stream.bytes_sent == 5000
+
+
+def test_open_rejects_streams_over_limit(command):
+    transcoder = LiveTranscoder()
+    transcoder.max_streams = 2
+    streams = [transcoder.open('track.flac'), transcoder.open('track.flac')]
+
+    assert transcoder.open('track.flac') is None
+    assert transcoder.status()['rejected'] == 1
+
+    streams[0].close()
+    replacement = transcoder.open('track.flac')
+    assert replacement is not None
+    for stream in streams[1:] + [replacement]:
+        stream.close()
+    status = transcoder.status()
+    assert (status['active'], status['started'], status['disconnected']) == (0, 3, 3)
+
+
+@pytest.mark.parametrize('failing', [['false'], ['/nonexistent/ffmpeg']])
+def test_failed_start_releases_slot(command, failing):
+    transcoder = LiveTranscoder()
+    transcoder.max_streams = 1
+    command['value'] = failing
+
+    with pytest.raises(Exception):
+        transcoder.open('track.flac')
+    assert transcoder.status()['active'] == 0
+    assert transcoder.status()['failed'] == 1
+
+    command['value'] = ['yes']
+    stream = transcoder.open('track.flac')
+    assert stream is not None
+    stream.close()
@@ -0,0 +1,31 @@
+# tests/test_media_list.py
+import pytest
+
+pytest.importorskip('flask')
+
+from counter_helpers import record_media_play
+from db_helpers import get_db
+
+
+@pytest.fixture
+def media_id(app):
+    with app.app_context():
+        db = get_db()
+        cursor = db.execute(
+            "INSERT INTO media_items (title, file_path, media_type, format, play_count) "
+            "VALUES ('Song', '/media/song.mp3', 'audio', 'mp3', 2)"
+        )
+        db.commit()
+        return cursor.lastrowid
+
+
+def test_list_overlays_pending_plays_without_timestamp(client, media_id):
+    record_media_play(media_id)
+
+    item = client.get('/api/media/list?fields=play_count').get_json()['items'][0]
+    assert item['play_count'] == 3
+    assert 'last_accessed' not in item
+
+    item = client.get('/api/media/list?fields=play_count,last_accessed').get_json()['items'][0]
+    assert item['play_count'] == 3
+    assert item['last_accessed'] is not None
@@ -0,0 +1,120 @@
+# tests/test_media_scan.py
+import os
+
+import pytest
+
+pytest.importorskip('PIL')
+from PIL import Image
+
+import media_helpers
+from media_helpers import scan_media_directory, ingest_media_paths, ScanStats
+
+
+@pytest.fixture
+def media_dir(tmp_path):
+    directory = tmp_path / 'media'
+    directory.mkdir()
+    for i in range(6):
+        Image.new('RGB', (640, 480), (i * 40, 0, 0)).save(directory / f'photo{i}.jpg')
+    return directory
+
+
+@pytest.fixture
+def config(tmp_path):
+    return {'THUMBNAIL_DIR': str(tmp_path / 'thumbnails'), 'MEDIA_SCAN_WORKERS': 2, 'MEDIA_SCAN_INLINE_MAX': 2}
+
+
+def media_paths(db):
+    return {row['file_path'] for row in db.execute('SELECT file_path FROM media_items')}
+
+
+def test_scan_uses_long_lived_pool_without_fork(db, media_dir, config):
+    stats = ScanStats()
+    assert scan_media_directory(str(media_dir), db, config=config, stats=stats) == 6
+    assert stats.failed == 0 and stats.thumbnailed == 6
+
+    executor = media_helpers._scan_executor
+    assert executor._mp_context.get_start_method() in ('forkserver', 'spawn')
+
+    # Większa partia obserwatora katalogów trafia do tej samej puli
+    new_files = []
+    for i in range(3):
+        new_files.append(str(media_dir / f'photo_new{i}.jpg'))
+        Image.new('RGB', (320, 240)).save(new_files[-1])
+    stats = ScanStats()
+    ingest_media_paths(new_files, db, config=config, stats=stats)
+    assert stats.added == 3
+    assert media_helpers._scan_executor is executor
+
+
+def test_small_batch_skips_process_pool(db, media_dir, config, monkeypatch):
+    def no_pool(workers):
+        raise AssertionError('pula procesów dla pojedynczego pliku')
+    monkeypatch.setattr(media_helpers, 'get_scan_executor', no_pool)
+
+    stats = ScanStats()
+    ingest_media_paths([str(media_dir / 'photo0.jpg')], db, config=config, stats=stats)
+    assert stats.added == 1 and stats.thumbnailed == 1
+
+
+def test_incremental_rescan_detects_rename_and_removal(db, media_dir, config):
+    scan_media_directory(str(media_dir), db, config=config)
+    renamed_id = db.execute('SELECT id FROM media_items WHERE title = ?', ('photo0',)).fetchone()['id']
+
+    os.rename(media_dir / 'photo0.jpg', media_dir / 'renamed.jpg')
+    os.remove(media_dir / 'photo1.jpg')
+    stats = ScanStats()
+    scan_media_directory(str(media_dir), db, config=config, stats=stats)
+
+    assert stats.renamed == 1 and stats.removed == 1 and stats.probed == 0
+    assert str(media_dir / 'photo1.jpg') not in media_paths(db)
+    row = db.execute('SELECT id, title FROM media_items WHERE file_path = ?',
+                     (str(media_dir / 'renamed.jpg'),)).fetchone()
+    assert (row['id'], row['title']) == (renamed_id, 'renamed')
+
+
+def test_scan_evicts_thumbnails_written_by_workers(db, media_dir, config, monkeypatch):
+    from thumbnail_helpers import thumbnail_store
+
+    # Budżet mniejszy niż miniatury sześciu zdjęć - sprzątanie musi ruszyć w trakcie skanowania
+    max_bytes = 20 * 1024
+    config.update(THUMBNAIL_MAX_BYTES=max_bytes, MEDIA_SCAN_BATCH_SIZE=2)
+    monkeypatch.setattr(thumbnail_store, 'root', config['THUMBNAIL_DIR'])
+    monkeypatch.setattr(thumbnail_store, 'max_bytes', max_bytes)
+    monkeypatch.setattr(thumbnail_store, '_bytes_since_evict', 0)
+    monkeypatch.setattr(thumbnail_store, 'stats', dict(thumbnail_store.stats, evicted=0))
+
+    scan_media_directory(str(media_dir), db, config=config)
+
+    assert thumbnail_store.stats['evicted'] > 0
+    assert thumbnail_store.usage()['bytes'] <= max_bytes
+
+
+def test_ingest_keeps_id_of_moved_file_and_removes_deleted_directory(db, media_dir, config):
+    album = media_dir / 'album'
+    album.mkdir()
+    for i in range(2):
+        Image.new('RGB', (320, 240)).save(album / f'track{i}.jpg')
+    scan_media_directory(str(media_dir), db, config=config)
+    moved_id = db.execute('SELECT id FROM media_items WHERE title = ?', ('photo0',)).fetchone()['id']
+
+    # Obie strony przeniesienia w jednej partii zdarzeń (IN_MOVED_FROM + IN_MOVED_TO)
+    (media_dir / 'moved').mkdir()
+    os.rename(media_dir / 'photo0.jpg', media_dir / 'moved' / 'photo0.jpg')
+    stats = ScanStats()
+    ingest_media_paths([str(media_dir / 'photo0.jpg'), str(media_dir / 'moved')], db, config=config, stats=stats)
+
+    assert (stats.renamed, stats.added, stats.removed) == (1, 0, 0)
+    row = db.execute('SELECT id FROM media_items WHERE file_path = ?',
+                     (str(media_dir / 'moved' / 'photo0.jpg'),)).fetchone()
+    assert row['id'] == moved_id
+
+    # Usunięty katalog zgłaszany jest jedną ścieżką - znikają wszystkie jego elementy
+    for name in os.listdir(album):
+        os.remove(album / name)
+    album.rmdir()
+    stats = ScanStats()
+    ingest_media_paths([str(album)], db, config=config, stats=stats)
+
+    assert stats.removed == 2
+    assert not any(path.startswith(str(album)) for path in media_paths(db))
@@ -0,0 +1,57 @@
+# tests/test_migrations.py
+import sqlite3
+
+import pytest
+
+import migrations
+from migrations import MIGRATIONS, run_migrations, get_schema_version, check_query_plans, split_sql_script
+
+
+def column_names(db, table):
+    return {row[1] for row in db.execute(f'PRAGMA table_info({table})')}
+
+
+def test_fresh_database_reaches_latest_version(db):
+    assert get_schema_version(db) == MIGRATIONS[-1][0]
+    assert {'file_inode', 'file_mtime', 'thumbnail_key'} <= column_names(db, 'media_items')
+    # Ponowne uruchomienie niczego nie zmienia
+    assert run_migrations(db) == []
+
+
+def test_known_queries_use_indexes(db):
+    # Plany znanych zapytań bez pełnych skanów tabel (to samo co `flask check-query-plans`)
+    assert check_query_plans(db)
+
+
+def test_failed_migration_is_rolled_back(db, monkeypatch):
+    version = MIGRATIONS[-1][0] + 1
+    broken = MIGRATIONS + [(version, 'Przerwana migracja', [
+        'ALTER TABLE media_items ADD COLUMN scratch INTEGER',
+        'CREATE TABLE scratch_items (id INTEGER PRIMARY KEY)',
+        'INSERT INTO no_such_table VALUES (1)',
+    ])]
+    monkeypatch.setattr(migrations, 'MIGRATIONS', broken)
+
+    with pytest.raises(sqlite3.OperationalError):
+        run_migrations(db)
+    assert get_schema_version(db) == version - 1
+    assert 'scratch' not in column_names(db, 'media_items')
+    assert db.execute("SELECT 1 FROM sqlite_master WHERE name = 'scratch_items'").fetchone() is None
+
+    # Po poprawieniu migracja stosuje się od początku (ADD COLUMN nie trafia na istniejącą kolumnę)
+    broken[-1] = (version, 'Poprawiona migracja', broken[-1][2][:2])
+    assert run_migrations(db) == [version]
+    assert 'scratch' in column_names(db, 'media_items')
+
+
+def test_split_sql_script_keeps_trigger_bodies():
+    script = '''-- komentarz
+CREATE TABLE a (id INTEGER);
+CREATE TRIGGER t AFTER INSERT ON a
+BEGIN
+    UPDATE a SET id = id;
+END;
+'''
+    statements = split_sql_script(script)
+    assert len(statements) == 2
+    assert statements[1].startswith('CREATE TRIGGER') and statements[1].endswith('END;')
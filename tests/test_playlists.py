@@ -0,0 +1,76 @@
+# tests/test_playlists.py
+import pytest
+
+from playlist_helpers import (POSITION_GAP, add_playlist_items, move_playlist_item, position_between,
+                              positions_between, remove_playlist_items)
+
+
+@pytest.fixture
+def playlist(db):
+    media_ids = [db.execute('INSERT INTO media_items (title, file_path, media_type) VALUES (?, ?, ?)',
+                            (f'Song {i}', f'/media/song{i}.mp3', 'audio')).lastrowid for i in range(5)]
+    playlist_id = db.execute("INSERT INTO playlists (name, user_id) VALUES ('Lista', 1)").lastrowid
+    add_playlist_items(db, playlist_id, media_ids)
+    return playlist_id, media_ids
+
+
+def order(db, playlist_id):
+    return [row[0] for row in db.execute(
+        'SELECT media_id FROM playlist_items WHERE playlist_id = ? ORDER BY position', (playlist_id,)
+    )]
+
+
+def test_positions_between():
+    assert position_between(None, None) == POSITION_GAP
+    assert position_between(1.0, 2.0) == 1.5
+    assert position_between(1.0, 1.0 + 1e-9) is None
+    assert positions_between(None, 2048.0, 2) == [0.0, 1024.0]
+    assert positions_between(0.0, 3.0, 2) == [1.0, 2.0]
+
+
+def test_add_skips_duplicates_and_inserts_after_item(db, playlist):
+    playlist_id, ids = playlist
+    assert add_playlist_items(db, playlist_id, ids[:2]) == []
+
+    remove_playlist_items(db, playlist_id, [ids[4]])
+    assert add_playlist_items(db, playlist_id, [ids[4]], after_media_id=ids[0]) == [ids[4]]
+    assert order(db, playlist_id) == [ids[0], ids[4], ids[1], ids[2], ids[3]]
+
+
+def test_move_writes_one_row(db, playlist):
+    playlist_id, ids = playlist
+    before = dict(db.execute('SELECT media_id, position FROM playlist_items').fetchall())
+
+    position, rebalanced = move_playlist_item(db, playlist_id, ids[4], before_media_id=ids[0])
+    assert not rebalanced
+    assert order(db, playlist_id) == [ids[4], ids[0], ids[1], ids[2], ids[3]]
+    after = dict(db.execute('SELECT media_id, position FROM playlist_items').fetchall())
+    assert [m for m in ids if before[m] != after[m]] == [ids[4]]
+
+
+def test_move_rebalances_when_gap_is_exhausted(db, playlist):
+    playlist_id, ids = playlist
+    # Wielokrotne wstawianie w to samo miejsce dzieli odstęp na pół, aż zabraknie precyzji
+    rebalanced = False
+    for _ in range(80):
+        _, rebalanced = move_playlist_item(db, playlist_id, ids[2], after_media_id=ids[0])
+        if rebalanced:
+            break
+        _, rebalanced = move_playlist_item(db, playlist_id, ids[1], after_media_id=ids[0])
+        if rebalanced:
+            break
+    assert rebalanced
+
+    positions = [row[0] for row in db.execute(
+        'SELECT position FROM playlist_items WHERE playlist_id = ? ORDER BY position', (playlist_id,)
+    )]
+    assert len(set(positions)) == len(ids)
+    assert order(db, playlist_id)[0] == ids[0]
+
+
+def test_move_relative_to_itself_is_rejected(db, playlist):
+    playlist_id, ids = playlist
+    with pytest.raises(ValueError):
+        move_playlist_item(db, playlist_id, ids[0], after_media_id=ids[0])
+    with pytest.raises(KeyError):
+        move_playlist_item(db, playlist_id, ids[0], after_media_id=-1)
@@ -0,0 +1,76 @@
+# tests/test_query_budget.py
+import pytest
+
+pytest.importorskip('flask')
+
+from db_helpers import get_db
+from search_helpers import index_media_items
+from trace_helpers import query_budget
+
+MEDIA_COUNT = 30
+
+
+# Biblioteka z plikami audio i wideo oraz playlista z wszystkimi elementami
+@pytest.fixture
+def library(app, client):
+    with app.app_context():
+        db = get_db()
+        ids = []
+        for i in range(MEDIA_COUNT):
+            media_type = 'audio' if i % 2 else 'video'
+            cursor = db.execute(
+                'INSERT INTO media_items (title, file_path, media_type, format, created_at) '
+                "VALUES (?, ?, ?, ?, '2024-01-01 00:00:00')",
+                (f'Love Song {i:02d}', f'/media/love_song_{i:02d}.{media_type}', media_type,
+                 'mp3' if media_type == 'audio' else 'mp4')
+            )
+            ids.append(cursor.lastrowid)
+            if media_type == 'audio':
+                db.execute('INSERT INTO audio_metadata (media_id, artist, album) VALUES (?, ?, ?)',
+                           (cursor.lastrowid, f'Artist {i % 3}', 'Album'))
+            else:
+                db.execute('INSERT INTO video_metadata (media_id, resolution) VALUES (?, ?)',
+                           (cursor.lastrowid, '1920x1080'))
+        index_media_items(db.cursor(), ids)
+        db.commit()
+
+    response = client.post('/api/media/playlists', json={'name': 'Wszystko', 'items': ids})
+    assert response.status_code == 201
+    return {'ids': ids, 'playlist_id': response.get_json()['id']}
+
+
+def test_media_list_query_budget(client, library):
+    with query_budget(2) as traces:
+        response = client.get('/api/media/list?limit=50')
+    assert response.status_code == 200
+    assert len(response.get_json()['items']) == MEDIA_COUNT
+    assert len(traces) == 1
+    assert 'db;dur=' in response.headers['Server-Timing']
+
+
+def test_media_list_pages_with_metadata_query_budget(client, library):
+    # Kolejne strony i filtr typu nie dokładają zapytań o metadane dla każdego wiersza
+    with query_budget(2):
+        first = client.get('/api/media/list?type=audio&limit=5&fields=title,artist').get_json()
+        cursor = first['next']
+        second = client.get(f"/api/media/list?type=audio&limit=5&fields=title,artist"
+                            f"&after_title={cursor['after_title']}&after_id={cursor['after_id']}").get_json()
+    titles = [item['title'] for item in first['items'] + second['items']]
+    assert titles == sorted(titles) and len(set(titles)) == 10
+    assert all(item['metadata']['artist'] for item in second['items'])
+
+
+def test_media_search_query_budget(client, library):
+    with query_budget(3):
+        response = client.get('/api/media/search?q=love&type=video')
+    assert response.status_code == 200
+    items = response.get_json()['items']
+    assert len(items) == MEDIA_COUNT // 2
+    assert all(item['media_type'] == 'video' for item in items)
+
+
+def test_playlist_items_query_budget(client, library):
+    with query_budget(2):
+        response = client.get(f"/api/media/playlists/{library['playlist_id']}/items?limit=100")
+    assert response.status_code == 200
+    assert [item['id'] for item in response.get_json()['items']] == library['ids']
@@ -0,0 +1,17 @@
+# tests/test_scan_api.py
+import pytest
+
+pytest.importorskip('flask')
+
+
+def test_scan_endpoints_require_admin(user_client):
+    assert user_client.post('/api/media/scan', json={}).status_code == 403
+    assert user_client.get('/api/media/scan/status/abc').status_code == 403
+    assert user_client.post('/api/media/scan/abc/cancel').status_code == 403
+
+
+def test_admin_can_start_scan(client, tmp_path):
+    response = client.post('/api/media/scan', json={'directory': str(tmp_path), 'generate_thumbnails': False})
+    assert response.status_code in (202, 409)
+    task_id = response.get_json()['task_id']
+    assert client.get(f'/api/media/scan/status/{task_id}').status_code == 200
@@ -0,0 +1,61 @@
+# tests/test_search.py
+import search_helpers
+from search_helpers import build_match_query, index_media_items, search_media
+
+
+def add_items(db, items):
+    ids = []
+    for title, media_type in items:
+        cursor = db.execute(
+            'INSERT INTO media_items (title, file_path, media_type) VALUES (?, ?, ?)',
+            (title, f'/media/{len(ids)}_{media_type}.bin', media_type)
+        )
+        ids.append(cursor.lastrowid)
+    index_media_items(db.cursor(), ids)
+    db.commit()
+    return ids
+
+
+def test_build_match_query_ignores_fts_syntax():
+    assert build_match_query('beat rev') == '"beat"* AND "rev"*'
+    assert build_match_query('a OR "x') == '"a" AND "OR"* AND "x"'
+    assert build_match_query('  -*()  ') is None
+
+
+def test_search_matches_prefixes_without_diacritics(db):
+    song, other = add_items(db, [('Pieśń o miłości', 'audio'), ('Film', 'video')])
+
+    assert [media_id for media_id, _ in search_media(db, 'piesn mi')] == [song]
+    assert search_media(db, 'zzz') == []
+
+
+def test_title_outranks_file_name(db):
+    db.execute("INSERT INTO media_items (title, file_path, media_type) VALUES ('Inny', '/media/sunset.mp4', 'video')")
+    by_file = db.execute('SELECT last_insert_rowid()').fetchone()[0]
+    by_title = add_items(db, [('Sunset', 'video')])[0]
+    index_media_items(db.cursor(), [by_file])
+
+    assert [media_id for media_id, _ in search_media(db, 'sunset')] == [by_title, by_file]
+
+
+def test_ranking_cap_applies_after_type_filter(db, monkeypatch):
+    monkeypatch.setattr(search_helpers, 'MAX_RANKED_MATCHES', 100)
+    # Stare filmy przykryte dużą liczbą nowszych dopasowań innego typu
+    videos = add_items(db, [(f'love song {i}', 'video') for i in range(50)])
+    add_items(db, [(f'lost track {i}', 'audio') for i in range(1000)])
+
+    results = search_media(db, 'lo', 'video', limit=100)
+    assert sorted(media_id for media_id, _ in results) == videos
+
+    # Bez filtra ranking obejmuje tylko najnowsze dopasowania
+    assert len(search_media(db, 'lo', limit=200)) == 100
+
+
+def test_changed_media_type_moves_item_between_type_indexes(db):
+    media_id = add_items(db, [('Night drive', 'video')])[0]
+    db.execute("UPDATE media_items SET media_type = 'audio' WHERE id = ?", (media_id,))
+    index_media_items(db.cursor(), [media_id])
+
+    assert search_media(db, 'night', 'video') == []
+    assert [found for found, _ in search_media(db, 'night', 'audio')] == [media_id]
+    assert [found for found, _ in search_media(db, 'night')] == [media_id]
@@ -0,0 +1,53 @@
+# tests/test_settings.py
+import threading
+
+import pytest
+
+pytest.importorskip('flask')
+
+from db_helpers import get_db
+from settings_helpers import load_user_settings, settings_cache
+
+
+def settings_rows(app):
+    with app.app_context():
+        return get_db().execute('SELECT COUNT(*) FROM user_settings').fetchone()[0]
+
+
+def test_page_render_does_not_write_settings(app, client):
+    assert client.get('/admin').status_code == 200
+    assert client.get('/dashboard').status_code == 200
+    assert settings_rows(app) == 0
+
+
+def test_settings_api_creates_defaults_once(app, client):
+    # Motyw z pamięci podręcznej (same wartości domyślne) nie blokuje utworzenia wiersza
+    client.get('/dashboard')
+    response = client.get('/api/user/settings')
+    assert response.status_code == 200
+    assert response.get_json()['default_city'] == 'Warsaw'
+    assert '_stored' not in response.get_json()
+    assert settings_rows(app) == 1
+
+
+def test_concurrent_first_load_creates_one_row(app):
+    with app.app_context():
+        user_id = get_db().execute("SELECT id FROM users WHERE username = 'admin'").fetchone()['id']
+    errors = []
+
+    def load():
+        try:
+            with app.app_context():
+                load_user_settings(user_id, create=True)
+        except Exception as e:
+            errors.append(e)
+
+    for _ in range(5):
+        settings_cache.clear()
+        threads = [threading.Thread(target=load) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert errors == []
+    assert settings_rows(app) == 1
@@ -0,0 +1,65 @@
+# tests/test_stream_api.py
+import pytest
+
+pytest.importorskip('flask')
+
+import counter_helpers
+from counter_helpers import PlaySessions, counter_buffer
+from db_helpers import get_db
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def media(app, tmp_path):
+    source = tmp_path / 'track.mp3'
+    source.write_bytes(CONTENT)
+    with app.app_context():
+        db = get_db()
+        media_id = db.execute(
+            "INSERT INTO media_items (title, file_path, media_type) VALUES ('Track', ?, 'audio')", (str(source),)
+        ).lastrowid
+        db.commit()
+    return media_id
+
+
+@pytest.fixture
+def plays(monkeypatch):
+    """Odtworzenia policzone przez endpoint (bez zapisu do bazy)"""
+    monkeypatch.setattr(counter_helpers, 'play_sessions', PlaySessions())
+    counted = []
+    monkeypatch.setattr(counter_buffer, 'increment',
+                        lambda table, key_column, key, counter_column, *args, **kwargs: counted.append(key))
+    return counted
+
+
+def test_range_returns_partial_content(client, media, plays):
+    response = client.get(f'/api/media/stream/{media}', headers={'Range': 'bytes=100-199'})
+
+    assert response.status_code == 206
+    assert response.data == CONTENT[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+
+
+def test_matching_etag_returns_not_modified(client, media, plays):
+    etag = client.get(f'/api/media/stream/{media}').headers['ETag']
+
+    response = client.get(f'/api/media/stream/{media}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_play_counted_once_per_session_from_file_start(client, media, plays):
+    client.get(f'/api/media/stream/{media}', headers={'Range': 'bytes=0-'})
+    client.get(f'/api/media/stream/{media}', headers={'Range': 'bytes=0-'})
+    client.get(f'/api/media/stream/{media}')
+
+    assert plays == [media]
+
+
+def test_seek_range_does_not_count_play(client, media, plays):
+    client.get(f'/api/media/stream/{media}', headers={'Range': 'bytes=5000-'})
+    assert plays == []
+
+    client.get(f'/api/media/stream/{media}', headers={'Range': 'bytes=0-'})
+    assert plays == [media]
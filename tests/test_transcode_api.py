@@ -0,0 +1,70 @@
+# tests/test_transcode_api.py
+import pytest
+
+pytest.importorskip('flask')
+
+from conftest import wait_for
+from db_helpers import get_db
+from transcode_helpers import transcode_cache, transcode_queue
+
+
+@pytest.fixture
+def media(app, tmp_path, monkeypatch, fake_transcode):
+    monkeypatch.setattr(transcode_cache, 'root', str(tmp_path / 'transcoded'))
+    source = tmp_path / 'movie.mkv'
+    source.write_bytes(b'source')
+    fake_transcode.hold(str(source))
+    with app.app_context():
+        db = get_db()
+        media_id = db.execute(
+            "INSERT INTO media_items (title, file_path, media_type, duration) VALUES ('Movie', ?, 'video', 60)",
+            (str(source),)
+        ).lastrowid
+        db.commit()
+    yield media_id
+    # Kolejka jest globalna - kolejny test nie może połączyć się z zadaniem z tego testu
+    fake_transcode.open()
+    wait_for(lambda: not transcode_queue.status()['active'])
+
+
+def start(client, media_id):
+    response = client.get(f'/api/media/transcode/{media_id}?format=mp4&resolution=480p')
+    assert response.status_code == 202
+    return response.get_json()['job_id']
+
+
+def test_status_is_visible_only_to_requesters_and_admin(client, make_user_client, media):
+    owner, stranger = make_user_client('owner'), make_user_client('stranger')
+    job_id = start(owner, media)
+
+    assert owner.get(f'/api/media/transcode/status/{job_id}').status_code == 200
+    assert client.get(f'/api/media/transcode/status/{job_id}').status_code == 200
+    assert stranger.get(f'/api/media/transcode/status/{job_id}').status_code == 404
+    assert stranger.post(f'/api/media/transcode/{job_id}/cancel').status_code == 404
+    assert transcode_queue.get(job_id).active
+
+
+def test_cancel_of_shared_job_only_drops_the_callers_request(make_user_client, media):
+    first, second = make_user_client('first'), make_user_client('second')
+    job_id = start(first, media)
+    assert start(second, media) == job_id
+
+    response = first.post(f'/api/media/transcode/{job_id}/cancel')
+    assert response.status_code == 200
+    assert response.get_json()['requests'] == 1
+    job = transcode_queue.get(job_id)
+    assert job.active and not job.cancel_event.is_set()
+    assert first.get(f'/api/media/transcode/status/{job_id}').status_code == 404
+
+    # Ostatni zgłaszający anuluje zadanie
+    assert second.post(f'/api/media/transcode/{job_id}/cancel').status_code == 200
+    wait_for(lambda: job.status == 'cancelled')
+
+
+def test_admin_cancels_shared_job(client, make_user_client, media):
+    job_id = start(make_user_client('first'), media)
+    start(make_user_client('second'), media)
+
+    assert client.post(f'/api/media/transcode/{job_id}/cancel').status_code == 200
+    job = transcode_queue.get(job_id)
+    wait_for(lambda: job.status == 'cancelled')
@@ -0,0 +1,85 @@
+# tests/test_transcode_cache.py
+import os
+
+import pytest
+
+from transcode_helpers import TranscodeCache
+
+
+def write_file(path, size, mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TranscodeCache()
+    cache.root = str(tmp_path / 'transcoded')
+    return cache
+
+
+@pytest.fixture
+def source(tmp_path):
+    return write_file(str(tmp_path / 'media' / 'film.mkv'), 100, mtime=1_000_000)
+
+
+def test_lookup_counts_hits_and_saved_bytes(cache, source):
+    path, hit = cache.lookup(1, source, 'mp4', '720p')
+    assert not hit
+    write_file(path, 300)
+
+    assert cache.lookup(1, source, 'mp4', '720p') == (path, True)
+    metrics = cache.metrics()
+    assert (metrics['hits'], metrics['misses'], metrics['bytes_saved']) == (1, 1, 300)
+    assert metrics['hit_rate'] == 0.5
+    assert (metrics['files'], metrics['bytes']) == (1, 300)
+
+
+def test_changed_source_invalidates_old_outputs(cache, source):
+    old_path, _ = cache.lookup(1, source, 'mp4', '720p')
+    write_file(old_path, 300)
+    os.utime(source, (2_000_000, 2_000_000))
+
+    path, hit = cache.lookup(1, source, 'mp4', '720p')
+    assert not hit and path != old_path
+    assert not os.path.exists(os.path.dirname(old_path))
+    assert cache.stats['invalidated'] == 1
+
+
+def test_invalidate_keeps_directory_with_part_file(cache, source):
+    old_path, _ = cache.lookup(1, source, 'mp4', '720p')
+    write_file(old_path + '.part', 50)
+    os.utime(source, (2_000_000, 2_000_000))
+
+    cache.lookup(1, source, 'mp4', '720p')
+    assert os.path.exists(old_path + '.part')
+    assert cache.invalidate(1) == 0
+
+
+def test_record_output_evicts_least_recently_used(cache, source):
+    cache.max_bytes = 1000
+    oldest = write_file(os.path.join(cache.root, '1', 'a', 'old_720p.mp4'), 400, mtime=1_000)
+    recent = write_file(os.path.join(cache.root, '2', 'b', 'recent_720p.mp4'), 400, mtime=3_000)
+    # Segmenty HLS mają osobny budżet i nie są liczone
+    hls = write_file(os.path.join(cache.root, 'hls', '3', '00000.ts'), 5000, mtime=500)
+    new = write_file(os.path.join(cache.root, '4', 'c', 'new_720p.mp4'), 400, mtime=5_000)
+
+    cache.record_output(new)
+
+    assert not os.path.exists(oldest)
+    assert os.path.exists(recent) and os.path.exists(new) and os.path.exists(hls)
+    assert (cache.stats['stored'], cache.stats['evicted'], cache.stats['evicted_bytes']) == (1, 1, 400)
+
+
+def test_record_output_below_budget_keeps_files(cache):
+    cache.max_bytes = 1000
+    first = write_file(os.path.join(cache.root, '1', 'a', 'first_720p.mp4'), 50, mtime=1_000)
+
+    cache.record_output(first)
+
+    assert os.path.exists(first)
+    assert cache.stats['evicted'] == 0
@@ -0,0 +1,100 @@
+# tests/test_transcode_queue.py
+import pytest
+
+from conftest import wait_for
+from transcode_helpers import TranscodeQueue, DEFAULT_LOW_PRIORITY_NICENESS
+
+
+@pytest.fixture
+def queue(fake_transcode):
+    queue = TranscodeQueue()
+    queue.workers = queue.low_priority_workers = 1
+    yield queue
+    fake_transcode.open()
+    for executor in (queue._executor, queue._low_executor):
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    paths = []
+    for name in ('a.mkv', 'b.mkv', 'c.mkv'):
+        path = tmp_path / name
+        path.write_bytes(b'source')
+        paths.append(str(path))
+    return paths
+
+
+def submit(queue, tmp_path, source, media_id, **kwargs):
+    return queue.submit(media_id, source, str(tmp_path / 'out' / f'{media_id}.mp4'), 'mp4', '480p', 60, **kwargs)
+
+
+def test_identical_requests_are_merged(queue, fake_transcode, sources, tmp_path):
+    fake_transcode.hold(sources[0])
+    job, created = submit(queue, tmp_path, sources[0], 1, user_id=1)
+    same, merged = submit(queue, tmp_path, sources[0], 1, user_id=2)
+
+    assert created and not merged and same is job
+    assert job.requests == 2 and job.requested_by(1) and job.requested_by(2)
+    fake_transcode.open()
+    wait_for(lambda: job.status == 'complete')
+    assert len(fake_transcode.calls) == 1
+
+
+def test_promoted_job_runs_once(queue, fake_transcode, sources, tmp_path):
+    # Pula niskiego priorytetu zajęta - zadanie b czeka w jej kolejce
+    fake_transcode.hold(sources[0])
+    blocker, _ = submit(queue, tmp_path, sources[0], 1, priority='low')
+    wait_for(lambda: blocker.status == 'running')
+    job, _ = submit(queue, tmp_path, sources[1], 2, priority='low')
+
+    same, created = submit(queue, tmp_path, sources[1], 2)
+    assert same is job and not created
+    wait_for(lambda: job.status == 'complete')
+    assert job.priority == 'normal' and queue.stats['promoted'] == 1
+
+    # Pula niskiego priorytetu też wywoła _run dla b - zadanie nie może zostać przejęte drugi raz
+    fake_transcode.open()
+    wait_for(lambda: blocker.status == 'complete')
+    queue._low_executor.shutdown(wait=True)
+    assert [call for call in fake_transcode.calls if call[0] == sources[1]] == [(sources[1], None)]
+    assert (sources[0], DEFAULT_LOW_PRIORITY_NICENESS) in fake_transcode.calls
+
+
+def test_cancel_queued_job_finishes_it_immediately(queue, fake_transcode, sources, tmp_path):
+    fake_transcode.hold(sources[0])
+    blocker, _ = submit(queue, tmp_path, sources[0], 1)
+    wait_for(lambda: blocker.status == 'running')
+    job, _ = submit(queue, tmp_path, sources[1], 2)
+
+    assert queue.cancel(job.id) is job
+    assert job.status == 'cancelled'
+    fake_transcode.open()
+    queue._executor.shutdown(wait=True)
+    assert sources[1] not in [path for path, _ in fake_transcode.calls]
+
+
+def test_request_after_cancel_gets_fresh_job(queue, fake_transcode, sources, tmp_path):
+    fake_transcode.hold(sources[0])
+    job, _ = submit(queue, tmp_path, sources[0], 1, user_id=1)
+    wait_for(lambda: job.status == 'running')
+
+    queue.cancel(job.id)
+    # Anulowane zadanie jeszcze działa, ale nowe żądanie nie może się z nim połączyć
+    fresh, created = submit(queue, tmp_path, sources[0], 1, user_id=2)
+    assert created and fresh is not job
+    wait_for(lambda: job.status == 'cancelled')
+    assert queue.find(1, 'mp4', '480p') is fresh
+
+
+def test_release_cancels_only_without_other_requesters(queue, fake_transcode, sources, tmp_path):
+    fake_transcode.hold(sources[0])
+    job, _ = submit(queue, tmp_path, sources[0], 1, user_id=1)
+    submit(queue, tmp_path, sources[0], 1, user_id=2)
+
+    assert queue.release(job.id, 3) is None
+    queue.release(job.id, 1)
+    assert job.requests == 1 and not job.cancel_event.is_set()
+    queue.release(job.id, 2)
+    wait_for(lambda: job.status == 'cancelled')
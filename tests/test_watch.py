@@ -0,0 +1,75 @@
+# tests/test_watch.py
+from types import SimpleNamespace
+
+import pytest
+
+import watch_helpers
+from watch_helpers import MediaWatcher
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(watch_helpers, 'time', SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def watcher():
+    watcher = MediaWatcher()
+    watcher.debounce = 2.0
+    watcher.max_delay = 10.0
+    return watcher
+
+
+def add_event(watcher, clock, path):
+    if not watcher._pending:
+        watcher._first_event = clock.now
+    watcher._last_event = clock.now
+    watcher._pending.add(path)
+
+
+def test_no_pending_paths_means_no_timeout(watcher, clock):
+    assert watcher._flush_timeout() is None
+
+
+def test_batch_waits_for_quiet_period(watcher, clock):
+    add_event(watcher, clock, '/media/a.mp3')
+    assert watcher._flush_timeout() == 2.0
+
+    clock.now += 1.5
+    add_event(watcher, clock, '/media/b.mp3')
+    assert watcher._flush_timeout() == 2.0
+
+    clock.now += 2.0
+    assert watcher._flush_timeout() == 0
+
+
+def test_continuous_events_flush_after_max_delay(watcher, clock):
+    add_event(watcher, clock, '/media/0.mp3')
+    for i in range(1, 9):
+        clock.now += 1.0
+        add_event(watcher, clock, f'/media/{i}.mp3')
+    assert watcher._flush_timeout() == 2.0
+
+    clock.now += 1.0
+    add_event(watcher, clock, '/media/9.mp3')
+    assert watcher._flush_timeout() == 1.0
+
+    clock.now += 1.0
+    assert watcher._flush_timeout() == 0
+
+
+def test_full_batch_flushes_immediately(watcher, clock):
+    watcher.max_batch_paths = 3
+    for i in range(3):
+        add_event(watcher, clock, f'/media/{i}.mp3')
+    assert watcher._flush_timeout() == 0
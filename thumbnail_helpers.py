@@ -0,0 +1,228 @@
+# thumbnail_helpers.py
+import hashlib
+import os
+import subprocess
+import threading
+
+from cache_helpers import cache_entries, evict_lru, touch_entry, EVICTION_LOW_WATER
+
+# Pillow jest opcjonalny - bez niego miniatury tworzy ImageMagick (convert)
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+# Domyślne ustawienia magazynu miniatur
+DEFAULT_THUMBNAIL_DIR = '/tmp/homehub/thumbnails'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Rozmiary miniatur (szerokość w pikselach): siatka, karta, pełny ekran
+DEFAULT_RENDITIONS = {'grid': 160, 'card': 320, 'full': 1280}
+DEFAULT_RENDITION = 'card'
+# Czas dostępu (mtime) odświeżamy najwyżej raz na godzinę dla danego pliku
+TOUCH_INTERVAL = 3600
+# Rozmiar próbek pliku używanych w odcisku zawartości
+FINGERPRINT_SAMPLE = 64 * 1024
+
+# Odcisk zawartości pliku (rozmiar + próbki z początku, środka i końca)
+def content_fingerprint(file_path):
+    """
+    Klucz miniatury niezależny od ścieżki - przeniesiony lub zduplikowany plik
+    dostaje ten sam klucz. Czytamy najwyżej 3 x FINGERPRINT_SAMPLE bajtów.
+    """
+    size = os.path.getsize(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(size).encode())
+    with open(file_path, 'rb') as f:
+        if size <= FINGERPRINT_SAMPLE * 3:
+            digest.update(f.read())
+        else:
+            for offset in (0, size // 2 - FINGERPRINT_SAMPLE // 2, size - FINGERPRINT_SAMPLE):
+                f.seek(offset)
+                digest.update(f.read(FINGERPRINT_SAMPLE))
+    return digest.hexdigest()
+
+# Magazyn miniatur adresowany odciskiem zawartości
+class ThumbnailStore:
+    """
+    Miniatury zapisywane są jako <katalog>/<ab>/<cd>/<klucz>_<rozmiar>.jpg.
+    Łączny rozmiar jest ograniczony do max_bytes; przy przekroczeniu usuwane są
+    najdawniej używane pliki (czas dostępu przechowywany w mtime).
+    """
+    def __init__(self, root=DEFAULT_THUMBNAIL_DIR, max_bytes=DEFAULT_MAX_BYTES, renditions=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.renditions = dict(renditions or DEFAULT_RENDITIONS)
+        self._lock = threading.Lock()
+        self._bytes_since_evict = 0
+        # Bajty zapisane przez tę instancję - proces roboczy skanera przekazuje je
+        # w wyniku, a proces aplikacji dolicza przez record_written()
+        self.written_bytes = 0
+        self.stats = {'generated': 0, 'reused': 0, 'evicted': 0, 'evicted_bytes': 0}
+
+    @classmethod
+    def from_config(cls, config):
+        store = cls()
+        store.configure(config)
+        return store
+
+    def configure(self, config):
+        if not config:
+            return
+        self.root = config.get('THUMBNAIL_DIR') or DEFAULT_THUMBNAIL_DIR
+        self.max_bytes = config.get('THUMBNAIL_MAX_BYTES') or DEFAULT_MAX_BYTES
+        self.renditions = dict(config.get('THUMBNAIL_RENDITIONS') or DEFAULT_RENDITIONS)
+
+    def init_app(self, app):
+        self.configure(app.config)
+
+    def path(self, key, rendition=DEFAULT_RENDITION):
+        return os.path.join(self.root, key[:2], key[2:4], f'{key}_{rendition}.jpg')
+
+    def has(self, key):
+        return all(os.path.exists(self.path(key, rendition)) for rendition in self.renditions)
+
+    def save(self, key, render):
+        """
+        Tworzy wszystkie rozmiary miniatury. render(ścieżka, szerokość) zapisuje
+        największy rozmiar; mniejsze powstają przez skalowanie tego obrazu.
+        Zwraca słownik rozmiar -> ścieżka; jeśli obrazu nie udało się utworzyć,
+        zgłasza wyjątek (RuntimeError lub błąd funkcji render).
+        """
+        if self.has(key):
+            self.stats['reused'] += 1
+            return {rendition: self.path(key, rendition) for rendition in self.renditions}
+
+        ordered = sorted(self.renditions.items(), key=lambda item: item[1], reverse=True)
+        largest, largest_width = ordered[0]
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+
+        paths = {}
+        written = 0
+        for rendition, width in ordered:
+            path = self.path(key, rendition)
+            # Zapis do pliku tymczasowego i zamiana - czytelnik nigdy nie widzi niepełnej miniatury
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp.jpg'
+            try:
+                if rendition == largest:
+                    render(tmp_path, largest_width)
+                else:
+                    scale_image(paths[largest], tmp_path, width)
+                if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+                    raise RuntimeError(f"Nie utworzono miniatury {rendition}")
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            paths[rendition] = path
+            written += os.path.getsize(path)
+
+        self.record_written(written)
+        with self._lock:
+            self.stats['generated'] += 1
+        return paths
+
+    def record_written(self, nbytes):
+        """Dolicza nowe miniatury do licznika, od którego zależy evict_if_needed()"""
+        with self._lock:
+            self._bytes_since_evict += nbytes
+            self.written_bytes += nbytes
+
+    def touch(self, path):
+        """Odświeża czas ostatniego użycia miniatury (dla LRU)"""
+        touch_entry(path, TOUCH_INTERVAL)
+
+    def usage(self):
+        entries = cache_entries(self.root, ('.jpg',))
+        return {'files': len(entries), 'bytes': sum(size for _, size, _ in entries), 'max_bytes': self.max_bytes}
+
+    def evict(self, max_bytes=None):
+        """
+        Usuwa najdawniej używane miniatury, jeśli magazyn przekracza budżet.
+        Zwraca liczbę usuniętych plików.
+        """
+        max_bytes = max_bytes if max_bytes is not None else self.max_bytes
+        with self._lock:
+            self._bytes_since_evict = 0
+            removed, removed_bytes = evict_lru(self.root, max_bytes, ('.jpg',))
+            self.stats['evicted'] += removed
+            self.stats['evicted_bytes'] += removed_bytes
+            return removed
+
+    def evict_if_needed(self):
+        """Sprzątanie tylko po zapisaniu istotnej ilości nowych miniatur"""
+        if self._bytes_since_evict > self.max_bytes * (1 - EVICTION_LOW_WATER):
+            return self.evict()
+        return 0
+
+# Jakość zapisu miniatur JPEG
+JPEG_QUALITY = 85
+# Orientacje EXIF, przy których obraz jest obrócony o 90 stopni
+EXIF_ROTATED = (5, 6, 7, 8)
+
+# Skalowanie obrazu do zadanej szerokości (tylko zmniejszanie)
+def scale_image(source, destination, width):
+    if Image is not None:
+        try:
+            return scale_image_native(source, destination, width)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Format nieobsługiwany przez Pillow - próbujemy ImageMagick
+            print(f"Pillow nie odczytał {source}, używam convert: {str(e)}")
+    return scale_image_convert(source, destination, width)
+
+# Skalowanie w procesie przez Pillow
+def scale_image_native(source, destination, width):
+    """
+    Dla JPEG dekoder skaluje już przy dekodowaniu (tryb draft, 1/2-1/8 rozdzielczości),
+    więc pełny obraz nigdy nie trafia do pamięci. Orientacja EXIF jest uwzględniana.
+    """
+    with Image.open(source) as image:
+        orientation = image.getexif().get(0x0112, 1)
+        stored_width, stored_height = image.size
+        # Szerokość po obrocie odpowiada wysokości zapisanego obrazu
+        if orientation in EXIF_ROTATED:
+            stored_width, stored_height = stored_height, stored_width
+        target_width = min(width, stored_width)
+        target_height = max(1, round(stored_height * target_width / stored_width))
+        if orientation in EXIF_ROTATED:
+            image.draft('RGB', (target_height, target_width))
+        else:
+            image.draft('RGB', (target_width, target_height))
+
+        thumbnail = ImageOps.exif_transpose(image)
+        thumbnail.thumbnail((target_width, target_height), Image.LANCZOS)
+        if thumbnail.mode != 'RGB':
+            thumbnail = thumbnail.convert('RGB')
+        thumbnail.save(destination, 'JPEG', quality=JPEG_QUALITY)
+
+# Skalowanie przez ImageMagick (osobny proces)
+def scale_image_convert(source, destination, width):
+    subprocess.run([
+        'convert',
+        f'{source}[0]',
+        '-auto-orient',
+        '-thumbnail', f'{width}x>',
+        '-strip',
+        destination
+    ], stderr=subprocess.PIPE, check=True)
+
+# Syntetyczny zestaw zdjęć do testów wydajności miniatur
+def create_synthetic_photos(directory, count, size=(4000, 3000)):
+    """Tworzy count zdjęć JPEG o rozmiarze size (wymaga Pillow)"""
+    if Image is None:
+        raise RuntimeError('Pillow nie jest zainstalowany')
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    base = Image.radial_gradient('L').resize(size)
+    for i in range(count):
+        noise = Image.effect_noise(size, 32 + i % 32)
+        photo = Image.merge('RGB', (base, noise, Image.linear_gradient('L').resize(size)))
+        path = os.path.join(directory, f'photo_{i:04d}.jpg')
+        exif = Image.Exif()
+        # Co czwarte zdjęcie obrócone (orientacja 6 - aparat trzymany pionowo)
+        exif[0x0112] = 6 if i % 4 == 0 else 1
+        photo.save(path, 'JPEG', quality=90, exif=exif)
+        paths.append(path)
+    return paths
+
+# Globalny magazyn miniatur
+thumbnail_store = ThumbnailStore()
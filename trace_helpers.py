@@ -0,0 +1,162 @@
+# trace_helpers.py
+from flask import g, request
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Domyślne ustawienia śledzenia zapytań
+DEFAULT_SLOWEST_KEPT = 5
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+DEFAULT_RECENT_KEPT = 100
+
+# Ślad zapytań SQL wykonanych w ramach jednego żądania
+class QueryTrace:
+    def __init__(self, endpoint=None, path=None, slowest_kept=DEFAULT_SLOWEST_KEPT,
+                 n_plus_one_threshold=DEFAULT_N_PLUS_ONE_THRESHOLD):
+        self.endpoint = endpoint
+        self.path = path
+        self.slowest_kept = slowest_kept
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.count = 0
+        self.total_ms = 0.0
+        self.fetch_ms = 0.0
+        self.statements = {}
+        self.slowest = []
+
+    def record(self, sql, duration_ms):
+        self.count += 1
+        self.total_ms += duration_ms
+
+        stats = self.statements.get(sql)
+        if stats is None:
+            stats = self.statements[sql] = {'count': 0, 'total_ms': 0.0}
+        stats['count'] += 1
+        stats['total_ms'] += duration_ms
+
+        # Lista najwolniejszych zapytań (niewielka, sortowana przy wstawianiu)
+        if len(self.slowest) < self.slowest_kept or duration_ms > self.slowest[-1][0]:
+            self.slowest.append((duration_ms, sql))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.slowest_kept:]
+
+    def record_fetch(self, sql, duration_ms):
+        """Czas pobierania wierszy doliczany do zapytania (bez zwiększania liczby zapytań)"""
+        self.total_ms += duration_ms
+        self.fetch_ms += duration_ms
+        stats = self.statements.get(sql)
+        if stats is not None:
+            stats['total_ms'] += duration_ms
+
+    def repeated_statements(self):
+        """Zapytania powtórzone w żądaniu co najmniej n_plus_one_threshold razy (podejrzenie N+1)"""
+        return [
+            {'sql': sql, 'count': stats['count'], 'total_ms': round(stats['total_ms'], 3)}
+            for sql, stats in self.statements.items()
+            if stats['count'] >= self.n_plus_one_threshold
+        ]
+
+    def server_timing(self):
+        return (f'db;dur={self.total_ms:.2f};desc="{self.count} queries", '
+                f'db-fetch;dur={self.fetch_ms:.2f}')
+
+    def to_dict(self):
+        return {
+            'endpoint': self.endpoint,
+            'path': self.path,
+            'query_count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'fetch_ms': round(self.fetch_ms, 3),
+            'slowest': [{'sql': sql, 'ms': round(ms, 3)} for ms, sql in self.slowest],
+            'n_plus_one': self.repeated_statements(),
+        }
+
+# Ostatnie ślady i statystyki per endpoint
+_recent = deque(maxlen=DEFAULT_RECENT_KEPT)
+_endpoint_stats = {}
+_listeners = []
+_lock = threading.Lock()
+
+def _begin_trace():
+    from flask import current_app
+    g._sql_trace = QueryTrace(
+        endpoint=request.endpoint,
+        path=request.path,
+        slowest_kept=current_app.config.get('SQL_TRACE_SLOWEST', DEFAULT_SLOWEST_KEPT),
+        n_plus_one_threshold=current_app.config.get('SQL_N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD),
+    )
+
+def _finish_trace(response):
+    trace = getattr(g, '_sql_trace', None)
+    if trace is None:
+        return response
+
+    if trace.count:
+        response.headers.add('Server-Timing', trace.server_timing())
+
+    repeated = trace.repeated_statements()
+    if repeated:
+        from flask import current_app
+        for item in repeated:
+            current_app.logger.warning(
+                f"Możliwy wzorzec N+1 w {trace.endpoint}: {item['count']}x {item['sql'][:120]}"
+            )
+
+    with _lock:
+        _recent.append(trace.to_dict())
+        stats = _endpoint_stats.setdefault(trace.endpoint, {
+            'requests': 0, 'queries': 0, 'total_ms': 0.0, 'max_queries': 0, 'n_plus_one_requests': 0
+        })
+        stats['requests'] += 1
+        stats['queries'] += trace.count
+        stats['total_ms'] += trace.total_ms
+        stats['max_queries'] = max(stats['max_queries'], trace.count)
+        if repeated:
+            stats['n_plus_one_requests'] += 1
+        listeners = list(_listeners)
+
+    for listener in listeners:
+        listener(trace)
+    return response
+
+# Rejestracja śledzenia w aplikacji
+def init_app(app):
+    if not app.config.get('SQL_TRACE_ENABLED', True):
+        return
+    app.before_request(_begin_trace)
+    app.after_request(_finish_trace)
+
+# Dane dla panelu administratora
+def trace_report():
+    with _lock:
+        endpoints = {}
+        for endpoint, stats in _endpoint_stats.items():
+            endpoints[endpoint] = dict(stats)
+            endpoints[endpoint]['avg_queries'] = round(stats['queries'] / stats['requests'], 2)
+            endpoints[endpoint]['total_ms'] = round(stats['total_ms'], 3)
+        return {'endpoints': endpoints, 'recent': list(_recent)}
+
+# Pomocnik do testów - budżet zapytań dla endpointu
+@contextmanager
+def query_budget(max_queries, allow_n_plus_one=False):
+    """
+    Sprawdza, czy żądania wykonane wewnątrz bloku mieszczą się w budżecie zapytań:
+
+        with query_budget(3):
+            client.get('/api/media/list')
+    """
+    traces = []
+    with _lock:
+        _listeners.append(traces.append)
+    try:
+        yield traces
+    finally:
+        with _lock:
+            _listeners.remove(traces.append)
+
+    for trace in traces:
+        assert trace.count <= max_queries, (
+            f"{trace.endpoint}: {trace.count} zapytań, budżet {max_queries}"
+        )
+        if not allow_n_plus_one:
+            repeated = trace.repeated_statements()
+            assert not repeated, f"{trace.endpoint}: możliwy wzorzec N+1: {repeated}"
@@ -0,0 +1,463 @@
+# transcode_helpers.py
+import concurrent.futures
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from media_helpers import (transcode_media, TranscodeCancelled, TRANSCODE_FORMATS, TRANSCODE_RESOLUTIONS,
+                           LiveTranscode, build_live_audio_command, DEFAULT_LIVE_CHUNK_BYTES,
+                           DEFAULT_LIVE_PIPE_BYTES)
+from cache_helpers import cache_entries, evict_lru, touch_entry, source_fingerprint, EVICTION_LOW_WATER
+
+# Liczba zakończonych zadań przechowywanych do odczytu statusu
+MAX_FINISHED_JOBS = 100
+# Zadania o niskim priorytecie (wyprzedzające) - osobna pula i obniżony priorytet FFmpeg
+DEFAULT_LOW_PRIORITY_WORKERS = 1
+DEFAULT_LOW_PRIORITY_NICENESS = 10
+# Domyślny limit równoczesnych strumieni transkodowanych na żywo
+DEFAULT_LIVE_MAX_STREAMS = 8
+# Domyślny budżet dyskowy plików transkodowanych
+DEFAULT_CACHE_MAX_BYTES = 20 * 1024 * 1024 * 1024
+
+# Pamięć podręczna plików transkodowanych
+class TranscodeCache:
+    """
+    Pliki zapisywane są jako <TRANSCODE_DIR>/<media_id>/<odcisk źródła>/<nazwa>_<rozdzielczość>.<format>.
+    Odcisk (rozmiar, mtime) pliku źródłowego jest częścią ścieżki, więc zmiana źródła
+    unieważnia stare wyniki. Czas ostatniego użycia przechowywany jest w mtime, a łączny
+    rozmiar ograniczony do TRANSCODE_CACHE_MAX_BYTES (LRU). Segmenty HLS (katalog hls)
+    mają własny budżet.
+    """
+    def __init__(self):
+        self.root = None
+        self.max_bytes = DEFAULT_CACHE_MAX_BYTES
+        self._lock = threading.Lock()
+        self._bytes_since_evict = 0
+        self.stats = {'hits': 0, 'misses': 0, 'bytes_saved': 0, 'stored': 0,
+                      'invalidated': 0, 'evicted': 0, 'evicted_bytes': 0}
+
+    def init_app(self, app):
+        self.root = app.config['TRANSCODE_DIR']
+        self.max_bytes = app.config.get('TRANSCODE_CACHE_MAX_BYTES') or DEFAULT_CACHE_MAX_BYTES
+
+    @property
+    def suffixes(self):
+        return tuple(f'.{format}' for format in TRANSCODE_FORMATS)
+
+    def output_path(self, media_id, file_path, format, resolution, fingerprint=None):
+        fingerprint = fingerprint or source_fingerprint(file_path)
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(self.root, str(media_id), fingerprint, f"{base_name}_{resolution}.{format}")
+
+    def lookup(self, media_id, file_path, format, resolution):
+        """
+        Zwraca (ścieżka, trafienie). Przy trafieniu ścieżka wskazuje gotowy plik;
+        przy chybieniu - miejsce, w którym powinien powstać. Wyniki dla
+        poprzednich wersji pliku źródłowego są przy okazji usuwane.
+        """
+        fingerprint = source_fingerprint(file_path)
+        path = self.output_path(media_id, file_path, format, resolution, fingerprint)
+        self.invalidate(media_id, keep_fingerprint=fingerprint)
+
+        with self._lock:
+            if os.path.exists(path):
+                self.stats['hits'] += 1
+                self.stats['bytes_saved'] += os.path.getsize(path)
+                touch_entry(path)
+                return path, True
+            self.stats['misses'] += 1
+            return path, False
+
+    def invalidate(self, media_id, keep_fingerprint=None):
+        """Usuwa wyniki dla innych wersji pliku źródłowego niż keep_fingerprint"""
+        media_dir = os.path.join(self.root, str(media_id))
+        if not os.path.isdir(media_dir):
+            return 0
+        removed = 0
+        for fingerprint in os.listdir(media_dir):
+            path = os.path.join(media_dir, fingerprint)
+            if fingerprint == keep_fingerprint or not os.path.isdir(path):
+                continue
+            # Pliki .part należą do trwającego zadania - jego katalog zostaje
+            if any(name.endswith('.part') for name in os.listdir(path)):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        if removed:
+            with self._lock:
+                self.stats['invalidated'] += removed
+        return removed
+
+    def record_output(self, path):
+        """Rejestruje nowy plik wynikowy; przy istotnym przyroście uruchamia sprzątanie"""
+        size = os.path.getsize(path)
+        with self._lock:
+            self.stats['stored'] += 1
+            self._bytes_since_evict += size
+            needs_evict = self._bytes_since_evict > self.max_bytes * (1 - EVICTION_LOW_WATER)
+        if needs_evict:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            self._bytes_since_evict = 0
+        # Katalog hls ma osobny budżet (hls_helpers) - liczymy tylko pliki w formatach transkodowania
+        removed, removed_bytes = evict_lru(self.root, self.max_bytes, self.suffixes)
+        with self._lock:
+            self.stats['evicted'] += removed
+            self.stats['evicted_bytes'] += removed_bytes
+        return removed
+
+    def metrics(self):
+        entries = cache_entries(self.root, self.suffixes) if self.root and os.path.isdir(self.root) else []
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        stats['files'] = len(entries)
+        stats['bytes'] = sum(size for _, size, _ in entries)
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+# Globalna pamięć podręczna plików transkodowanych
+transcode_cache = TranscodeCache()
+
+# Zadanie transkodowania jednego pliku do jednego formatu i rozdzielczości
+class TranscodeJob:
+    def __init__(self, media_id, input_file, output_file, format, resolution, duration=None,
+                 priority='normal'):
+        self.id = uuid.uuid4().hex
+        self.media_id = media_id
+        self.input_file = input_file
+        self.output_file = output_file
+        self.format = format
+        self.resolution = resolution
+        self.duration = duration or 0
+        self.priority = priority
+        self.status = 'queued'
+        self.error = None
+        self.position = 0.0
+        self.requests = 1
+        # Liczba żądań według użytkownika (None - zadania systemowe, np. polecenia CLI)
+        self.requesters = Counter()
+        self.cancel_event = threading.Event()
+        self.created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.started = None
+        self.finished = None
+
+    @property
+    def key(self):
+        return (self.media_id, self.format, self.resolution)
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def requested_by(self, user_id):
+        return self.requesters[user_id] > 0
+
+    def progress(self):
+        if self.status == 'complete':
+            return 100
+        if not self.duration:
+            return 0
+        return min(int(self.position * 100 / self.duration), 99)
+
+    def speed(self):
+        """Prędkość transkodowania względem czasu odtwarzania (np. 2.5 = 2,5x szybciej)"""
+        if not self.started or not self.position:
+            return 0
+        elapsed = (self.finished or time.time()) - self.started
+        return round(self.position / elapsed, 2) if elapsed else 0
+
+    def eta_seconds(self):
+        speed = self.speed()
+        if not self.active or not speed or not self.duration:
+            return None
+        return round(max(self.duration - self.position, 0) / speed, 1)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'media_id': self.media_id,
+            'format': self.format,
+            'resolution': self.resolution,
+            'priority': self.priority,
+            'status': self.status,
+            'progress': self.progress(),
+            'position': round(self.position, 2),
+            'duration': self.duration,
+            'speed': self.speed(),
+            'eta_seconds': self.eta_seconds(),
+            'requests': self.requests,
+            'error': self.error,
+            'created_at': self.created_at,
+        }
+
+# Kolejka transkodowania z ograniczeniem liczby równoczesnych procesów FFmpeg
+class TranscodeQueue:
+    """
+    Identyczne żądania (ten sam plik, format i rozdzielczość) łączone są w jedno
+    zadanie. Liczba równolegle działających procesów FFmpeg wynosi TRANSCODE_WORKERS
+    (domyślnie połowa rdzeni), a każdy proces dostaje swoją część rdzeni przez -threads.
+
+    Zadania o niskim priorytecie (priority='low', np. wyprzedzające transkodowanie
+    następnego utworu) trafiają do osobnej puli TRANSCODE_LOW_PRIORITY_WORKERS
+    i działają z obniżonym priorytetem procesu, więc nie opóźniają żądań użytkowników.
+    """
+    def __init__(self):
+        self._config = None
+        self._executor = None
+        self._low_executor = None
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self.workers = 1
+        self.low_priority_workers = DEFAULT_LOW_PRIORITY_WORKERS
+        self.low_priority_niceness = DEFAULT_LOW_PRIORITY_NICENESS
+        self.threads_per_job = None
+        self.stats = {'submitted': 0, 'merged': 0, 'completed': 0, 'failed': 0, 'cancelled': 0,
+                      'released': 0, 'low_priority': 0, 'promoted': 0}
+
+    def init_app(self, app):
+        self._config = app.config
+        cores = os.cpu_count() or 2
+        self.workers = app.config.get('TRANSCODE_WORKERS') or max(1, cores // 2)
+        self.threads_per_job = max(1, cores // self.workers)
+        self.low_priority_workers = (app.config.get('TRANSCODE_LOW_PRIORITY_WORKERS')
+                                     or DEFAULT_LOW_PRIORITY_WORKERS)
+        self.low_priority_niceness = app.config.get('TRANSCODE_LOW_PRIORITY_NICENESS',
+                                                    DEFAULT_LOW_PRIORITY_NICENESS)
+
+    def _get_executor(self, priority='normal'):
+        if priority == 'low':
+            if self._low_executor is None:
+                self._low_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.low_priority_workers, thread_name_prefix='transcode-low'
+                )
+            return self._low_executor
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='transcode'
+            )
+        return self._executor
+
+    def submit(self, media_id, input_file, output_file, format='mp4', resolution='720p', duration=None,
+               priority='normal', user_id=None):
+        """
+        Dodaje zadanie do kolejki. Zwraca (zadanie, utworzono) - jeśli identyczne
+        zadanie już czeka lub trwa, zwracane jest istniejące i False. Czekające
+        zadanie o niskim priorytecie, o które poprosi użytkownik, przechodzi do
+        zwykłej puli. user_id zapisywany jest wśród zgłaszających zadanie.
+        """
+        if format not in TRANSCODE_FORMATS or resolution not in TRANSCODE_RESOLUTIONS:
+            raise ValueError(f"Nieobsługiwany format lub rozdzielczość: {format} {resolution}")
+
+        created = promote = False
+        with self._lock:
+            job = self._active.get((media_id, format, resolution))
+            # Anulowane zadanie jeszcze się kończy - nowe żądanie dostaje świeże zadanie
+            if job is not None and not job.cancel_event.is_set():
+                job.requests += 1
+                job.requesters[user_id] += 1
+                self.stats['merged'] += 1
+                if priority == 'normal' and job.priority == 'low':
+                    job.priority = 'normal'
+                    # Uruchomione zadanie kończy się w puli niskiego priorytetu
+                    promote = job.status == 'queued'
+                    self.stats['promoted'] += 1
+            else:
+                job = TranscodeJob(media_id, input_file, output_file, format, resolution, duration, priority)
+                job.requesters[user_id] += 1
+                self._jobs[job.id] = job
+                self._active[job.key] = job
+                self.stats['submitted'] += 1
+                if priority == 'low':
+                    self.stats['low_priority'] += 1
+                self._trim()
+                created = promote = True
+
+        if promote:
+            # Po awansie zadanie jest w obu pulach - uruchomi je ta, która zrobi to pierwsza (_claim)
+            self._get_executor(job.priority).submit(self._run, job)
+        return job, created
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find(self, media_id, format, resolution):
+        with self._lock:
+            return self._active.get((media_id, format, resolution))
+
+    def cancel(self, job_id):
+        """Anuluje zadanie niezależnie od liczby zgłaszających (administrator, przygotowanie z wyprzedzeniem)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            cancelled = job.active
+            if cancelled:
+                job.cancel_event.set()
+        if cancelled:
+            self._stop_queued(job)
+        return job
+
+    def release(self, job_id, user_id):
+        """
+        Wycofuje żądania użytkownika. Zadanie jest anulowane tylko wtedy, gdy nikt inny
+        na nie nie czeka - w przeciwnym razie zmniejsza się jedynie liczba żądań.
+        Zwraca zadanie albo None, jeśli użytkownik o nie nie prosił.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.requested_by(user_id):
+                return None
+            if not job.active:
+                return job
+            own = job.requesters.pop(user_id)
+            if job.requests > own:
+                job.requests -= own
+                self.stats['released'] += 1
+                return job
+            # Flaga ustawiana pod blokadą - równoległe submit() nie połączy się już z tym zadaniem
+            job.cancel_event.set()
+        self._stop_queued(job)
+        return job
+
+    def _stop_queued(self, job):
+        # Czekające zadanie kończymy od razu; uruchomione zakończy transcode_media po cancel_event
+        if self._claim(job):
+            self._finish(job, 'cancelled')
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _trim(self):
+        finished = [job for job in self._jobs.values() if not job.active]
+        for job in finished[:-MAX_FINISHED_JOBS]:
+            del self._jobs[job.id]
+
+    def _claim(self, job):
+        with self._lock:
+            if job.status != 'queued':
+                return False
+            job.status = 'running'
+            job.started = time.time()
+            return True
+
+    def _run(self, job):
+        if not self._claim(job):
+            return
+        if job.cancel_event.is_set():
+            self._finish(job, 'cancelled')
+            return
+
+        try:
+            os.makedirs(os.path.dirname(job.output_file), exist_ok=True)
+
+            def progress(position):
+                job.position = position
+
+            transcode_media(job.input_file, job.output_file, job.format, job.resolution,
+                            progress=progress, cancel_event=job.cancel_event,
+                            threads=self.threads_per_job,
+                            niceness=self.low_priority_niceness if job.priority == 'low' else None)
+            self._finish(job, 'complete')
+            transcode_cache.record_output(job.output_file)
+        except TranscodeCancelled:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, 'error')
+            print(f"Błąd transkodowania {job.input_file}: {str(e)}")
+
+    def _finish(self, job, status):
+        with self._lock:
+            job.status = status
+            job.finished = time.time()
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+            self.stats[{'complete': 'completed', 'error': 'failed', 'cancelled': 'cancelled'}[status]] += 1
+
+    def status(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'threads_per_job': self.threads_per_job,
+                'active': [job.to_dict() for job in self._active.values()],
+                'stats': dict(self.stats),
+            }
+
+# Globalna kolejka transkodowania
+transcode_queue = TranscodeQueue()
+
+# Transkodowanie audio na żywo (potok FFmpeg -> odpowiedź HTTP, bez plików na dysku)
+class LiveTranscoder:
+    """
+    Ogranicza liczbę równoczesnych procesów FFmpeg (LIVE_TRANSCODE_MAX_STREAMS) i zbiera
+    statystyki: czas do pierwszego bajtu, przesłane bajty, strumienie przerwane przez klienta.
+    """
+    def __init__(self):
+        self.max_streams = DEFAULT_LIVE_MAX_STREAMS
+        self.chunk_size = DEFAULT_LIVE_CHUNK_BYTES
+        self.pipe_bytes = DEFAULT_LIVE_PIPE_BYTES
+        self._active = set()
+        self._lock = threading.Lock()
+        self.stats = {'started': 0, 'completed': 0, 'disconnected': 0, 'failed': 0, 'rejected': 0,
+                      'bytes': 0, 'ttfb_ms_total': 0.0, 'ttfb_ms_max': 0.0}
+
+    def init_app(self, app):
+        config = app.config
+        self.max_streams = config.get('LIVE_TRANSCODE_MAX_STREAMS') or DEFAULT_LIVE_MAX_STREAMS
+        self.chunk_size = config.get('LIVE_TRANSCODE_CHUNK_BYTES') or DEFAULT_LIVE_CHUNK_BYTES
+        self.pipe_bytes = config.get('LIVE_TRANSCODE_PIPE_BYTES') or DEFAULT_LIVE_PIPE_BYTES
+
+    def open(self, input_file, format='opus', bitrate=None, start=0):
+        """
+        Uruchamia transkodowanie i zwraca LiveTranscode z gotowym pierwszym fragmentem
+        albo None, gdy osiągnięto limit strumieni. Błąd FFmpeg zgłaszany jest wyjątkiem.
+        """
+        with self._lock:
+            if len(self._active) >= self.max_streams:
+                self.stats['rejected'] += 1
+                return None
+            stream = LiveTranscode(build_live_audio_command(input_file, format, bitrate, start),
+                                   self.chunk_size, self.pipe_bytes, on_close=self._finished)
+            self._active.add(stream)
+        try:
+            stream.start()
+        except Exception:
+            with self._lock:
+                self.stats['failed'] += 1
+            raise
+        with self._lock:
+            self.stats['started'] += 1
+            self.stats['ttfb_ms_total'] += stream.ttfb_ms
+            self.stats['ttfb_ms_max'] = max(self.stats['ttfb_ms_max'], stream.ttfb_ms)
+        return stream
+
+    def _finished(self, stream):
+        with self._lock:
+            self._active.discard(stream)
+            if stream.ttfb_ms is None:
+                return
+            self.stats['bytes'] += stream.bytes_sent
+            self.stats['completed' if stream.completed else 'disconnected'] += 1
+
+    def status(self):
+        with self._lock:
+            stats = dict(self.stats)
+            active = len(self._active)
+        ttfb_total = stats.pop('ttfb_ms_total')
+        stats['ttfb_ms_avg'] = round(ttfb_total / stats['started'], 3) if stats['started'] else None
+        stats['ttfb_ms_max'] = round(stats['ttfb_ms_max'], 3)
+        return dict(stats, active=active, max_streams=self.max_streams)
+
+# Globalny mechanizm transkodowania na żywo
+live_transcoder = LiveTranscoder()
@@ -0,0 +1,279 @@
+# watch_helpers.py
+import atexit
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+from db_helpers import get_pool
+from media_helpers import ingest_media_paths, ScanStats
+from thumbnail_helpers import thumbnail_store
+
+# Flagi inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# Zdarzenia obserwowane w katalogach mediów. Plik jest zgłaszany dopiero po zamknięciu
+# (IN_CLOSE_WRITE) lub przeniesieniu - kopiowany plik nie jest analizowany w połowie.
+# IN_CREATE potrzebne jest tylko dla nowych katalogów (dodanie obserwacji).
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+# Nagłówek struct inotify_event: wd, mask, cookie, len
+EVENT_HEADER = struct.Struct('iIII')
+READ_BUFFER_SIZE = 64 * 1024
+
+# Domyślne ustawienia obserwatora
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_MAX_DELAY = 10.0
+DEFAULT_MAX_BATCH_PATHS = 1000
+
+# Dostęp do inotify przez libc (None na systemach bez inotify)
+def load_inotify():
+    if not hasattr(os, 'O_CLOEXEC'):
+        return None
+    libc_name = ctypes.util.find_library('c')
+    if not libc_name:
+        return None
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+# Obserwator katalogów mediów (inotify)
+class MediaWatcher:
+    """
+    Obserwuje rekurencyjnie katalogi MEDIA_DIRS i przekazuje zmienione ścieżki do
+    ingest_media_paths - nowe pliki trafiają do bazy i indeksu wyszukiwania po kilku
+    sekundach, bez pełnego skanowania.
+
+    Zdarzenia są zbierane w partie: partia jest przetwarzana po MEDIA_WATCH_DEBOUNCE
+    sekundach bez nowych zdarzeń (np. po skopiowaniu całego albumu), ale nie później niż
+    MEDIA_WATCH_MAX_DELAY sekund od pierwszego zdarzenia. Przepełnienie kolejki
+    zdarzeń jądra (IN_Q_OVERFLOW) kończy się przyrostowym przejrzeniem katalogów głównych.
+    """
+    def __init__(self):
+        self._config = None
+        self.enabled = True
+        self.directories = []
+        self.debounce = DEFAULT_DEBOUNCE
+        self.max_delay = DEFAULT_MAX_DELAY
+        self.max_batch_paths = DEFAULT_MAX_BATCH_PATHS
+        self.generate_thumbnails = True
+        self._libc = None
+        self._fd = None
+        self._watches = {}
+        self._pending = set()
+        self._first_event = None
+        self._last_event = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.stats = {'events': 0, 'batches': 0, 'paths': 0, 'added': 0, 'updated': 0, 'renamed': 0,
+                      'removed': 0, 'failed': 0, 'overflows': 0, 'watch_errors': 0,
+                      'last_batch_ms': None, 'last_latency_ms': None}
+
+    def init_app(self, app):
+        self._config = app.config
+        self.enabled = app.config.get('MEDIA_WATCH_ENABLED', True)
+        self.directories = [os.path.realpath(directory) for directory in app.config.get('MEDIA_DIRS', [])]
+        self.debounce = app.config.get('MEDIA_WATCH_DEBOUNCE', DEFAULT_DEBOUNCE)
+        self.max_delay = app.config.get('MEDIA_WATCH_MAX_DELAY', DEFAULT_MAX_DELAY)
+        self.generate_thumbnails = app.config.get('MEDIA_WATCH_THUMBNAILS', True)
+
+    def start(self):
+        """Uruchamia wątek obserwatora (po migracjach bazy). Zwraca False, jeśli nie jest dostępny."""
+        if not self.enabled or self._thread is not None:
+            return self._thread is not None
+        self._libc = load_inotify()
+        if self._libc is None:
+            print("Obserwator katalogów mediów niedostępny (brak inotify)")
+            return False
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            print(f"Błąd inicjalizacji inotify: {os.strerror(ctypes.get_errno())}")
+            return False
+        self._fd = fd
+        for directory in self.directories:
+            if os.path.isdir(directory):
+                self._watch_tree(directory)
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='media-watcher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return True
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._watches.clear()
+
+    def _watch_tree(self, directory):
+        """Dodaje obserwację katalogu i wszystkich podkatalogów"""
+        for root, dirs, _ in os.walk(directory):
+            if not self._add_watch(root):
+                dirs[:] = []
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            # ENOSPC - wyczerpany limit fs.inotify.max_user_watches
+            self.stats['watch_errors'] += 1
+            print(f"Nie można obserwować katalogu {path}: {os.strerror(ctypes.get_errno())}")
+            return False
+        self._watches[wd] = path
+        return True
+
+    def _unwatch_tree(self, directory):
+        """Usuwa obserwacje katalogu przeniesionego lub usuniętego (wraz z podkatalogami)"""
+        prefix = os.path.join(directory, '')
+        for wd, path in list(self._watches.items()):
+            if path == directory or path.startswith(prefix):
+                del self._watches[wd]
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _run(self):
+        poller = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        while not self._stopped.is_set():
+            with self._lock:
+                timeout = self._flush_timeout()
+            # Budzenie co sekundę, żeby stop() nie czekał na zdarzenie
+            timeout = 1.0 if timeout is None else min(timeout, 1.0)
+            try:
+                if poller.poll(timeout * 1000):
+                    self._read_events()
+            except Exception as e:
+                print(f"Błąd odczytu zdarzeń inotify: {str(e)}")
+
+            with self._lock:
+                due = self._flush_timeout() == 0
+            if due:
+                self.flush()
+
+    def _flush_timeout(self):
+        """Sekundy do przetworzenia bieżącej partii (None - brak oczekujących zmian)"""
+        if not self._pending:
+            return None
+        now = time.time()
+        if len(self._pending) >= self.max_batch_paths:
+            return 0
+        remaining = min(self._last_event + self.debounce, self._first_event + self.max_delay) - now
+        return max(remaining, 0)
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, READ_BUFFER_SIZE)
+        except BlockingIOError:
+            return
+        offset = 0
+        paths = set()
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            self.stats['events'] += 1
+
+            if mask & IN_Q_OVERFLOW:
+                # Utracone zdarzenia - przeglądamy ponownie katalogi główne
+                self.stats['overflows'] += 1
+                paths.update(self.directories)
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_MOVED_FROM | IN_DELETE):
+                    self._unwatch_tree(path)
+                    paths.add(path)
+                elif mask & (IN_CREATE | IN_MOVED_TO):
+                    # Pliki skopiowane przed dodaniem obserwacji znajdzie przejrzenie katalogu
+                    self._watch_tree(path)
+                    paths.add(path)
+            elif not mask & IN_CREATE:
+                paths.add(path)
+
+        if paths:
+            now = time.time()
+            with self._lock:
+                if not self._pending:
+                    self._first_event = now
+                self._last_event = now
+                self._pending.update(paths)
+
+    def flush(self):
+        """Przetwarza oczekujące ścieżki jedną partią"""
+        with self._lock:
+            paths = self._pending
+            first_event = self._first_event
+            self._pending = set()
+        if not paths or self._config is None:
+            return 0
+
+        start = time.perf_counter()
+        stats = ScanStats()
+        pool = get_pool(self._config)
+        db = pool.acquire()
+        try:
+            ingest_media_paths(paths, db, self.generate_thumbnails, self._config, stats)
+        except Exception as e:
+            db.rollback()
+            self.stats['failed'] += len(paths)
+            print(f"Błąd aktualizacji mediów po zmianach w katalogach: {str(e)}")
+            return 0
+        finally:
+            pool.release(db)
+
+        self.stats['batches'] += 1
+        self.stats['paths'] += len(paths)
+        for key in ('added', 'updated', 'renamed', 'removed', 'failed'):
+            self.stats[key] += getattr(stats, key)
+        self.stats['last_batch_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        if first_event is not None:
+            self.stats['last_latency_ms'] = round((time.time() - first_event) * 1000, 3)
+
+        # Nowe miniatury - sprzątanie dopiero po zapisaniu istotnej ilości danych,
+        # bez przeglądania całego magazynu po każdej partii zdarzeń
+        if stats.thumbnailed:
+            try:
+                thumbnail_store.evict_if_needed()
+            except Exception as e:
+                print(f"Błąd porządkowania miniatur: {str(e)}")
+        return len(paths)
+
+    def status(self):
+        with self._lock:
+            pending = len(self._pending)
+        return dict(self.stats, running=self._thread is not None, watches=len(self._watches),
+                    pending=pending, directories=self.directories)
+
+# Globalny obserwator katalogów mediów
+media_watcher = MediaWatcher()